@@ -0,0 +1,511 @@
+import os
+import json
+import math
+import asyncio
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from result_parser import RESULT_SCHEMA
+from process_local import ProcessLocal
+from cassette_store import CassetteStore, CassetteMissError, cassette_key, load_response
+
+# Load environment variables
+load_dotenv()
+
+# Which backend analyze_website_content talks to: "gemini", "stub", "record" or "replay"
+ANALYSIS_BACKEND = os.getenv('ANALYSIS_BACKEND', 'gemini').lower()
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# Ask Gemini for JSON constrained to the result schema. Gemini 2.0 can't combine a JSON
+# response schema with Google Search, so grounding is dropped unless explicitly kept
+GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'False').lower() == 'true'
+GEMINI_STRUCTURED_GROUNDING = os.getenv('GEMINI_STRUCTURED_GROUNDING', 'False').lower() == 'true'
+
+# Stub backend configuration
+STUB_LATENCY_DIST = os.getenv('STUB_LATENCY_DIST', 'lognormal').lower()  # fixed, uniform, normal, lognormal, exponential
+STUB_LATENCY_MS = float(os.getenv('STUB_LATENCY_MS', 1500))  # Median latency
+STUB_LATENCY_SPREAD_MS = float(os.getenv('STUB_LATENCY_SPREAD_MS', 500))  # Standard deviation / half-range
+STUB_ERROR_RATE = float(os.getenv('STUB_ERROR_RATE', 0))  # Fraction of calls that fail, 0-1
+STUB_SEED = os.getenv('STUB_SEED')
+
+# Replay backend: multiplier of the recorded latency (0 answers at once), and whether prompts that
+# were never recorded get a recording picked by their hash ("any") instead of failing ("exact")
+REPLAY_LATENCY_SCALE = float(os.getenv('REPLAY_LATENCY_SCALE', 0))
+REPLAY_MATCH = os.getenv('REPLAY_MATCH', 'exact').lower()
+
+
+class AnalysisBackend:
+    """
+    Interface for the model behind analyze_website_content.
+
+    Backends turn a prompt into the model's text answer plus the grounding
+    sources it used. Parsing the answer into the result schema is shared and
+    happens in gemini_service.
+    """
+
+    name = None
+
+    def generate(self, prompt):
+        """
+        Generate a complete answer.
+
+        Returns:
+            tuple: (text, sources) where sources is a list of {'url', 'title'} dicts
+        """
+        raise NotImplementedError
+
+    def generate_stream(self, prompt):
+        """Generate an answer incrementally, yielding (text_delta, sources) tuples."""
+        text, sources = self.generate(prompt)
+        yield text, sources
+
+    async def agenerate(self, prompt):
+        """Like `generate`, without blocking the event loop; runs `generate` in a thread unless overridden."""
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def agenerate_stream(self, prompt):
+        """Like `generate_stream`, as an async iterator; yields the whole `agenerate` answer unless overridden."""
+        text, sources = await self.agenerate(prompt)
+        yield text, sources
+
+    def warm_up(self):
+        """Create clients ahead of the first request."""
+
+
+class GeminiBackend(AnalysisBackend):
+    """Gemini with Google Search grounding. The client is created on first use."""
+
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model=None, structured=None, structured_grounding=None):
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self.model = model or GEMINI_MODEL
+        self.structured = GEMINI_STRUCTURED_OUTPUT if structured is None else structured
+        self.structured_grounding = (GEMINI_STRUCTURED_GROUNDING if structured_grounding is None
+                                     else structured_grounding)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The genai client, created on first access."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not self.api_key:
+                        raise ValueError("GEMINI_API_KEY environment variable is not set")
+                    from google import genai
+                    self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def warm_up(self):
+        # Without a key the first analysis reports the missing key instead
+        if self.api_key:
+            self.client
+
+    def generation_config(self):
+        """
+        Generation config with Google Search grounding.
+
+        In structured mode the answer is constrained to RESULT_SCHEMA instead,
+        with grounding only if GEMINI_STRUCTURED_GROUNDING is set.
+        """
+        from google.genai.types import Tool, GoogleSearch, GenerateContentConfig
+
+        # Set up the Google Search tool
+        google_search_tool = Tool(
+            google_search=GoogleSearch()
+        )
+        if self.structured:
+            return GenerateContentConfig(
+                tools=[google_search_tool] if self.structured_grounding else None,
+                response_mime_type='application/json',
+                response_schema=RESULT_SCHEMA,
+            )
+        return GenerateContentConfig(
+            tools=[google_search_tool],
+            response_modalities=["TEXT"],
+        )
+
+    def generate_response(self, prompt):
+        """Call the model and return the raw Gemini response."""
+        # Generate content with Google Search grounding using the recommended approach
+        return self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self.generation_config()
+        )
+
+    async def agenerate_response(self, prompt):
+        """Like `generate_response`, with the async client."""
+        # The async client shares the connection pool of the event loop instead of holding a thread
+        return await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self.generation_config()
+        )
+
+    def generate_response_stream(self, prompt):
+        """Call the model with streaming, yielding the raw response chunks."""
+        yield from self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self.generation_config()
+        )
+
+    async def agenerate_response_stream(self, prompt):
+        """Like `generate_response_stream`, with the async client."""
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self.generation_config()
+        ):
+            yield chunk
+
+    def generate(self, prompt):
+        response = self.generate_response(prompt)
+        return extract_text(response), extract_sources(response)
+
+    async def agenerate(self, prompt):
+        response = await self.agenerate_response(prompt)
+        return extract_text(response), extract_sources(response)
+
+    def generate_stream(self, prompt):
+        for chunk in self.generate_response_stream(prompt):
+            yield extract_text(chunk), extract_sources(chunk)
+
+    async def agenerate_stream(self, prompt):
+        async for chunk in self.agenerate_response_stream(prompt):
+            yield extract_text(chunk), extract_sources(chunk)
+
+    def cassette_key(self, prompt):
+        """Key of this backend's request for a prompt in the cassette store."""
+        return cassette_key(self.model, self.structured, self.structured_grounding, prompt)
+
+
+class StubBackendError(Exception):
+    """Simulated upstream failure raised by the stub backend."""
+
+    code = 503  # Looks like a transient upstream error, so it is retried
+
+
+class StubBackend(AnalysisBackend):
+    """
+    Local, offline stand-in for Gemini for load testing and development.
+
+    Answers are schema-valid JSON derived deterministically from a hash of the
+    prompt, so the same page always gets the same analysis. Latency is drawn
+    from a configurable distribution and a configurable fraction of calls
+    fail, both from a seedable random generator.
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency_dist=None, latency_ms=None, spread_ms=None, error_rate=None, seed=None):
+        self.latency_dist = latency_dist or STUB_LATENCY_DIST
+        self.latency_ms = STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.spread_ms = STUB_LATENCY_SPREAD_MS if spread_ms is None else spread_ms
+        self.error_rate = STUB_ERROR_RATE if error_rate is None else error_rate
+        seed = STUB_SEED if seed is None else seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        """Draw one call latency in seconds from the configured distribution."""
+        with self._lock:
+            rng = self._random
+            if self.latency_dist == 'fixed':
+                ms = self.latency_ms
+            elif self.latency_dist == 'uniform':
+                ms = rng.uniform(self.latency_ms - self.spread_ms, self.latency_ms + self.spread_ms)
+            elif self.latency_dist == 'normal':
+                ms = rng.gauss(self.latency_ms, self.spread_ms)
+            elif self.latency_dist == 'exponential':
+                ms = rng.expovariate(1 / self.latency_ms) if self.latency_ms > 0 else 0
+            else:
+                # Lognormal with the configured median; the spread sets the shape
+                sigma = math.log1p(self.spread_ms / self.latency_ms) if self.latency_ms > 0 else 0
+                ms = self.latency_ms * math.exp(rng.gauss(0, sigma))
+        return max(ms, 0) / 1000
+
+    def should_fail(self):
+        """Decide whether this call simulates an upstream error."""
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def answer(self, prompt):
+        """Build the deterministic answer text and sources for a prompt."""
+        digest = hashlib.sha256(prompt.encode('utf-8', 'replace')).hexdigest()
+        score = int(digest[:8], 16) % 11
+        # The page text sits between the excerpt label and the instructions that follow it (see _build_prompt)
+        excerpt = prompt.split('CONTENT EXCERPT', 1)[-1].split('\n', 1)[-1]
+        excerpt = excerpt.rsplit('Please analyze this content', 1)[0].split()
+        sources = [
+            {'url': f"https://example.org/fact-check/{digest[i:i + 8]}", 'title': f"Stub source {n}"}
+            for n, i in enumerate((0, 8, 16), 1)
+        ]
+        text = json.dumps({
+            "summary": " ".join(excerpt[:30]) or "Empty page",
+            "misinformation_detected": score >= 5,
+            "misinformation_score": score,
+            "report": f"Stub analysis {digest[:12]}. " + " ".join(excerpt[:200]),
+            "additional_context": "Generated by the local stub backend.",
+            "sources": [s['url'] for s in sources]
+        })
+        return f"```json\n{text}\n```", sources
+
+    def generate(self, prompt):
+        time.sleep(self.sample_latency())
+        if self.should_fail():
+            raise StubBackendError("Simulated upstream error")
+        return self.answer(prompt)
+
+    async def agenerate(self, prompt):
+        await asyncio.sleep(self.sample_latency())
+        if self.should_fail():
+            raise StubBackendError("Simulated upstream error")
+        return self.answer(prompt)
+
+    def generate_stream(self, prompt):
+        latency = self.sample_latency()
+        fail = self.should_fail()
+        text, sources = self.answer(prompt)
+
+        # Spread the latency over the stream, with a larger time to first token
+        pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+        time.sleep(latency / 2)
+        for n, piece in enumerate(pieces, 1):
+            if fail and n > len(pieces) // 2:
+                raise StubBackendError("Simulated upstream error")
+            time.sleep(latency / 2 / len(pieces))
+            yield piece, sources if n == len(pieces) else []
+
+    async def agenerate_stream(self, prompt):
+        latency = self.sample_latency()
+        fail = self.should_fail()
+        text, sources = self.answer(prompt)
+
+        pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+        await asyncio.sleep(latency / 2)
+        for n, piece in enumerate(pieces, 1):
+            if fail and n > len(pieces) // 2:
+                raise StubBackendError("Simulated upstream error")
+            await asyncio.sleep(latency / 2 / len(pieces))
+            yield piece, sources if n == len(pieces) else []
+
+
+class RecordingBackend(GeminiBackend):
+    """
+    Gemini, recording every successful call into a cassette store for ReplayBackend.
+
+    The raw responses are recorded, grounding metadata included, so replay
+    goes through the same text and source extraction as a live call.
+    Failed calls are not recorded.
+    """
+
+    name = 'record'
+
+    def __init__(self, store=None, **kwargs):
+        super().__init__(**kwargs)
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = CassetteStore()
+        return self._store
+
+    def warm_up(self):
+        super().warm_up()
+        self.store.get_connection()
+
+    def generate_response(self, prompt):
+        start = time.perf_counter()
+        response = super().generate_response(prompt)
+        self.store.record(self.cassette_key(prompt), 'generate', self.model, prompt, [response],
+                          time.perf_counter() - start)
+        return response
+
+    async def agenerate_response(self, prompt):
+        start = time.perf_counter()
+        response = await super().agenerate_response(prompt)
+        await asyncio.to_thread(self.store.record, self.cassette_key(prompt), 'generate', self.model, prompt,
+                                [response], time.perf_counter() - start)
+        return response
+
+    def generate_response_stream(self, prompt):
+        start = time.perf_counter()
+        chunks = []
+        offsets = []
+        for chunk in super().generate_response_stream(prompt):
+            chunks.append(chunk)
+            offsets.append(time.perf_counter() - start)
+            yield chunk
+        self.store.record(self.cassette_key(prompt), 'stream', self.model, prompt, chunks,
+                          offsets[-1] if offsets else 0, chunk_offsets=offsets)
+
+    async def agenerate_response_stream(self, prompt):
+        start = time.perf_counter()
+        chunks = []
+        offsets = []
+        async for chunk in super().agenerate_response_stream(prompt):
+            chunks.append(chunk)
+            offsets.append(time.perf_counter() - start)
+            yield chunk
+        await asyncio.to_thread(self.store.record, self.cassette_key(prompt), 'stream', self.model, prompt, chunks,
+                                offsets[-1] if offsets else 0, chunk_offsets=offsets)
+
+
+class ReplayBackend(GeminiBackend):
+    """
+    Serves Gemini responses recorded by RecordingBackend, offline and deterministically.
+
+    A prompt is answered with the recording of the same prompt and model
+    settings. With `match='any'`, a prompt that was never recorded gets one
+    of the recordings picked by a hash of the prompt instead, so load tests
+    with generated pages still run on real response shapes. The recorded
+    latency is replayed, scaled by `latency_scale` (0 answers at once); a
+    recorded stream replays its chunks at their recorded offsets.
+    """
+
+    name = 'replay'
+
+    def __init__(self, store=None, latency_scale=None, match=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_scale = REPLAY_LATENCY_SCALE if latency_scale is None else latency_scale
+        self.match = match or REPLAY_MATCH
+        self._store = store
+        self._keys = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = CassetteStore()
+        return self._store
+
+    def warm_up(self):
+        if self.match == 'any':
+            self._keys = self.store.keys()
+        else:
+            self.store.get_connection()
+
+    def lookup(self, prompt, kind='generate'):
+        """
+        The recording that answers a prompt.
+
+        Raises:
+            CassetteMissError: If nothing answers it
+        """
+        recording = self.store.get(self.cassette_key(prompt), kind)
+        if recording is None and self.match == 'any':
+            if self._keys is None:
+                self._keys = self.store.keys()
+            if self._keys:
+                digest = hashlib.sha256(prompt.encode('utf-8', 'replace')).digest()
+                recording = self.store.get(self._keys[int.from_bytes(digest[:8], 'big') % len(self._keys)], kind)
+        if recording is None:
+            raise CassetteMissError(f"No recorded response for this prompt in {self.store.db_path}")
+        return recording
+
+    def generate_response(self, prompt):
+        recording = self.lookup(prompt)
+        time.sleep(recording['latency'] * self.latency_scale)
+        return _whole_response(recording)
+
+    async def agenerate_response(self, prompt):
+        recording = await asyncio.to_thread(self.lookup, prompt)
+        await asyncio.sleep(recording['latency'] * self.latency_scale)
+        return _whole_response(recording)
+
+    def generate_response_stream(self, prompt):
+        recording = self.lookup(prompt, 'stream')
+        offsets = recording['chunk_offsets'] or [recording['latency']]
+        elapsed = 0
+        for chunk, offset in zip(recording['responses'], offsets):
+            time.sleep(max(offset - elapsed, 0) * self.latency_scale)
+            elapsed = offset
+            yield load_response(chunk)
+
+    async def agenerate_response_stream(self, prompt):
+        recording = await asyncio.to_thread(self.lookup, prompt, 'stream')
+        offsets = recording['chunk_offsets'] or [recording['latency']]
+        elapsed = 0
+        for chunk, offset in zip(recording['responses'], offsets):
+            await asyncio.sleep(max(offset - elapsed, 0) * self.latency_scale)
+            elapsed = offset
+            yield load_response(chunk)
+
+
+def _whole_response(recording):
+    """The recorded response of a call; for a recorded stream, its chunks merged into one response."""
+    if recording['kind'] == 'generate':
+        return load_response(recording['responses'][0])
+    chunks = [load_response(chunk) for chunk in recording['responses']]
+    # Grounding metadata comes with the last chunks of a stream
+    grounding_metadata = next((chunk.candidates[0].grounding_metadata for chunk in reversed(chunks)
+                               if getattr(chunk, 'candidates', None)
+                               and getattr(chunk.candidates[0], 'grounding_metadata', None)), None)
+    content = SimpleNamespace(parts=[SimpleNamespace(text=''.join(extract_text(chunk) for chunk in chunks))])
+    return SimpleNamespace(candidates=[SimpleNamespace(content=content, grounding_metadata=grounding_metadata)])
+
+
+def extract_text(response):
+    """Concatenate the text parts of a Gemini response (or of one streamed chunk)."""
+    text_response = ""
+    if getattr(response, 'candidates', None):
+        content = getattr(response.candidates[0], 'content', None)
+        for part in getattr(content, 'parts', None) or []:
+            if getattr(part, 'text', None):
+                text_response += part.text
+    return text_response
+
+
+def extract_sources(response):
+    """Extract grounding sources from a Gemini response (or from one streamed chunk)."""
+    sources = []
+    try:
+        if getattr(response, 'candidates', None):
+            grounding_metadata = getattr(response.candidates[0], 'grounding_metadata', None)
+
+            # The SDK exposes groundingChunks as grounding_chunks
+            chunks = getattr(grounding_metadata, 'grounding_chunks', None) or \
+                getattr(grounding_metadata, 'groundingChunks', None) or []
+            for chunk in chunks:
+                if hasattr(chunk, 'web') and hasattr(chunk.web, 'uri'):
+                    title = chunk.web.title if getattr(chunk.web, 'title', None) else "Source"
+                    sources.append({
+                        'url': chunk.web.uri,
+                        'title': title
+                    })
+    except Exception as e:
+        print(f"Error extracting sources from grounding metadata: {str(e)}")
+    return sources
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'stub': StubBackend,
+    'record': RecordingBackend,
+    'replay': ReplayBackend,
+}
+
+def _create_backend():
+    if ANALYSIS_BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown ANALYSIS_BACKEND '{ANALYSIS_BACKEND}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[ANALYSIS_BACKEND]()
+
+
+_backend = ProcessLocal(_create_backend)
+
+
+def get_backend():
+    """Return the backend selected by ANALYSIS_BACKEND, created once per process."""
+    return _backend.get()
+
+
+def set_backend(backend):
+    """Replace the active backend, e.g. with a configured StubBackend."""
+    _backend.set(backend)
@@ -1,11 +1,35 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template, redirect, url_for
+from flask import (Flask, Blueprint, current_app, request, jsonify, send_file, render_template, redirect, url_for,
+                   Response, stream_with_context, g)
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
 from flask_cors import CORS
 import os
+import gzip
+import json
+import time
+import math
+import datetime
+import hashlib
+import functools
 import traceback
-from gemini_service import analyze_website_content
-from db_service import ReportDatabase
+import gemini_service
+from gemini_service import analyze_website_content, stream_website_analysis, get_cached_analysis
+from db_service import ReportDatabase, DATABASE_PATH, REPORTS_DIR
+from cache_service import CACHE_PATH
+from near_duplicate_index import NEAR_DUPLICATE_PATH
+from job_service import JobManager, QueueFullError, FINISHED_STATUSES, JOBS_PATH
+from batch_service import BatchAnalyzer, parse_ndjson
+from process_local import ProcessLocal
+from quota_scheduler import UpstreamUnavailableError
+from metrics_service import REQUEST_LATENCY, render_metrics
 from dotenv import load_dotenv
 
+# brotli is optional; without it JSON responses are gzip-compressed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Load environment variables
 load_dotenv()
 
@@ -14,19 +38,162 @@ SERVER_HOST = '0.0.0.0'  # Listen on all interfaces
 SERVER_PORT = 8080
 SERVER_URL = os.getenv('SERVER_URL', 'http://172.105.18.148:8080')  # External URL for absolute references
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'  # Default to False for production
+WARM_UP = os.getenv('APP_WARM_UP', 'True').lower() == 'true'  # Open databases and prime caches before serving
 
-# The static folder path should be absolute to ensure it finds the correct directory
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+# Compression of JSON responses for clients that accept it (brotli if installed, otherwise gzip)
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'True').lower() == 'true'
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
 
 # Configure CORS to allow requests from extension and browser
-CORS(app, resources={
-    r"/api/*": {"origins": ["chrome-extension://*", "http://172.105.18.148:8080"]}
-})
+CORS_ORIGINS = ["chrome-extension://*", "http://172.105.18.148:8080"]
+
+bp = Blueprint('pinocchio', __name__)
+
+
+class AppServices:
+    """The report database and analysis pools behind the routes, created on first use in each process."""
+
+    def __init__(self, config):
+        self._db = ProcessLocal(lambda: ReportDatabase(config['DATABASE_PATH'], reports_dir=config['REPORTS_DIR']))
+        self._jobs = ProcessLocal(lambda: JobManager(analyze_website_content, db_path=config['ANALYSIS_JOBS_PATH']))
+        self._batches = ProcessLocal(lambda: BatchAnalyzer(
+            functools.partial(analyze_website_content, priority='batch'), lookup_fn=get_cached_analysis))
+
+    @property
+    def db(self):
+        """Report database"""
+        return self._db.get()
+
+    @property
+    def jobs(self):
+        """Background pool for asynchronous analysis jobs"""
+        return self._jobs.get()
+
+    @property
+    def batches(self):
+        """Bounded pool for batch analyses"""
+        return self._batches.get()
+
+
+def create_app(config=None):
+    """
+    Create the Flask app.
+
+    Nothing is opened or started here: the report database, the job and batch
+    pools, the analysis cache and the model client are created on first use
+    in each process. The app can therefore be created before gunicorn forks
+    its workers (--preload) without the workers sharing connections, sockets
+    or threads. `warm_up` creates them ahead of the first request.
+
+    Args:
+        config (dict): Settings overriding the environment, e.g. DATABASE_PATH, REPORTS_DIR,
+            ANALYSIS_CACHE_PATH, ANALYSIS_JOBS_PATH, NEAR_DUPLICATE_PATH or WARM_UP
+
+    Returns:
+        Flask: The configured app
+    """
+    # The static folder path should be absolute to ensure it finds the correct directory
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    app.config.update(
+        DATABASE_PATH=DATABASE_PATH,
+        REPORTS_DIR=REPORTS_DIR,
+        ANALYSIS_CACHE_PATH=CACHE_PATH,
+        ANALYSIS_JOBS_PATH=JOBS_PATH,
+        NEAR_DUPLICATE_PATH=NEAR_DUPLICATE_PATH,
+        WARM_UP=WARM_UP,
+    )
+    app.config.update(config or {})
+
+    CORS(app, resources={
+        r"/api/*": {"origins": CORS_ORIGINS}
+    })
+    app.register_blueprint(bp)
+    app.extensions['pinocchio'] = AppServices(app.config)
+
+    # The analysis pipeline is shared by the whole process
+    gemini_service.configure(cache_path=app.config['ANALYSIS_CACHE_PATH'],
+                             near_duplicate_path=app.config['NEAR_DUPLICATE_PATH'])
+    return app
+
+
+def warm_up(app):
+    """
+    Create this process's services before it accepts traffic.
+
+    Opens the report, job, cache and near-duplicate databases (running their
+    schema checks), loads recently used analyses into the in-memory cache,
+    reads the newest reports so their pages are in the SQLite cache, and
+    creates the model client.
+
+    Returns:
+        float: Seconds taken
+    """
+    started = time.perf_counter()
+    services = app.extensions['pinocchio']
+    services.db.get_reports_page(100, 0)
+    services.jobs.get_connection()
+    services.batches
+    gemini_service.warm_up()
+    return time.perf_counter() - started
+
+
+# The current app's services, so routes can use them like module globals
+db = LocalProxy(lambda: current_app.extensions['pinocchio'].db)
+jobs = LocalProxy(lambda: current_app.extensions['pinocchio'].jobs)
+batches = LocalProxy(lambda: current_app.extensions['pinocchio'].batches)
 
-# Initialize database service
-db = ReportDatabase()
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
 
-@app.route('/api/analyze', methods=['POST'])
+@bp.after_app_request
+def record_request_latency(response):
+    """Record time to response per route; streamed bodies are timed until their headers are sent"""
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(time.perf_counter() - start)
+    return response
+
+@bp.after_app_request
+def compress_json(response):
+    """Compress JSON bodies with brotli or gzip, whichever the client prefers"""
+    if (not RESPONSE_COMPRESSION or response.mimetype != 'application/json' or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if len(data) < RESPONSE_COMPRESSION_MIN_BYTES or not encoding:
+        return response
+
+    response.set_data(brotli.compress(data, quality=4) if encoding == 'br' else gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body differs byte for byte, so its ETag can only be weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    """Metrics in the Prometheus text format, aggregated across workers in multiprocess mode"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+def wants_cache(data=None):
+    """
+    Whether an analysis request may be answered from the analysis cache.
+
+    Clients force a fresh analysis with {"refresh": true} in the body, ?cache=0 or Cache-Control: no-cache.
+    """
+    return not (
+        (isinstance(data, dict) and data.get('refresh') is True)
+        or request.args.get('cache') == '0'
+        or 'no-cache' in request.headers.get('Cache-Control', '')
+    )
+
+@bp.route('/api/analyze', methods=['POST'])
 def analyze():
     try:
         data = request.json
@@ -36,9 +203,29 @@ def analyze():
         url = data['url']
         content = data['content']
 
+        use_cache = wants_cache(data)
+
+        # Clients can ask for a job ID instead of waiting on the analysis with ?async=1
+        if request.args.get('async') in ('1', 'true'):
+            try:
+                job_id = jobs.submit(url, content, use_cache=use_cache)
+            except QueueFullError as e:
+                return jsonify({"error": str(e)}), 503, {'Retry-After': '5'}
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "events_url": f"/api/jobs/{job_id}/events"
+            }), 202
+
         try:
-            result = analyze_website_content(url, content)
+            result = analyze_website_content(url, content, use_cache=use_cache)
             return jsonify(result)
+        except UpstreamUnavailableError as e:
+            # Rate limited or down upstream: tell the client to retry rather than inventing a score
+            print(f"Analysis service unavailable: {str(e)}")
+            retry_after = math.ceil(e.retry_after or 5)
+            return jsonify({"error": str(e), "retry_after": retry_after}), 503, {'Retry-After': str(retry_after)}
         except Exception as e:
             print(f"Error in analyze_website_content: {str(e)}")
             print(traceback.format_exc())
@@ -56,7 +243,103 @@ def analyze():
         print(traceback.format_exc())
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-@app.route('/api/reports', methods=['POST'])
+@bp.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Analyze content and stream progress as Server-Sent Events"""
+    data = request.get_json(silent=True)
+    if not data or 'url' not in data or 'content' not in data:
+        return jsonify({"error": "Missing required parameters. Please provide 'url' and 'content'."}), 400
+
+    use_cache = wants_cache(data)
+
+    def generate():
+        try:
+            for event, payload in stream_website_analysis(data['url'], data['content'], use_cache=use_cache):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            print(f"Error in stream_website_analysis: {str(e)}")
+            print(traceback.format_exc())
+            yield f"event: error\ndata: {json.dumps({'error': f'Server error analyzing content: {str(e)}'})}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many pages, streaming one NDJSON line per page as each completes"""
+    concurrency = request.args.get('concurrency', type=int)
+    use_cache = wants_cache()
+
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        # Read items as they arrive instead of buffering the whole body
+        items = parse_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            if concurrency is None and isinstance(data.get('concurrency'), int):
+                concurrency = data['concurrency']
+            use_cache = wants_cache(data)
+            data = data.get('items')
+        if not isinstance(data, list):
+            return jsonify({
+                "error": "Please provide an array of {'url', 'content'} items, {'items': [...]}, or an NDJSON body."
+            }), 400
+        items = data
+
+    def generate():
+        try:
+            for outcome in batches.run(items, concurrency=concurrency, use_cache=use_cache):
+                yield json.dumps(outcome) + "\n"
+        except Exception as e:
+            print(f"Error in batch analysis: {str(e)}")
+            print(traceback.format_exc())
+            yield json.dumps({"done": True, "error": f"Server error analyzing batch: {str(e)}"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of an asynchronous analysis job"""
+    try:
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        print(f"Error retrieving job: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@bp.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream status changes of an analysis job as Server-Sent Events"""
+    if not jobs.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        last_status = None
+        last_sent = 0
+        while True:
+            job = jobs.get(job_id)
+            if not job:
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                last_sent = time.time()
+                event = 'result' if last_status in FINISHED_STATUSES else 'status'
+                yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+                if event == 'result':
+                    return
+            elif time.time() - last_sent > 15:
+                # Keep proxies from closing an idle connection
+                last_sent = time.time()
+                yield ": keep-alive\n\n"
+            time.sleep(0.5)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/reports', methods=['POST'])
 def save_report():
     try:
         data = request.json
@@ -83,19 +366,117 @@ def save_report():
         print(traceback.format_exc())
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-@app.route('/api/reports', methods=['GET'])
+@bp.route('/api/reports/bulk', methods=['POST'])
+def save_reports_bulk():
+    """Save many reports at once, one transaction per batch"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        # Ingest reports as they arrive instead of buffering the whole body
+        reports = (json.loads(line) for line in request.stream if line.strip())
+    else:
+        data = request.get_json(silent=True)
+        reports = data.get('reports') if isinstance(data, dict) else data
+        if not isinstance(reports, list):
+            return jsonify({
+                "error": "Please provide an array of reports, {'reports': [...]}, or an NDJSON body."
+            }), 400
+
+    report_ids = []
+    try:
+        for batch in db.ingest_reports(reports):
+            report_ids.extend(saved['report_id'] for saved in batch)
+    except ValueError as e:
+        # Batches before the invalid report are already saved
+        return jsonify({"error": str(e), "report_ids": report_ids, "count": len(report_ids)}), 400
+    except Exception as e:
+        print(f"Error saving reports: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": f"Server error: {str(e)}", "report_ids": report_ids, "count": len(report_ids)}), 500
+
+    return jsonify({"success": True, "report_ids": report_ids, "count": len(report_ids)})
+
+@bp.route('/api/reports', methods=['GET'])
 def list_reports():
     """Get a list of all reports"""
     try:
-        limit = request.args.get('limit', default=100, type=int)
+        limit = min(max(request.args.get('limit', default=100, type=int), 1), 1000)
         offset = request.args.get('offset', default=0, type=int)
-        reports = db.get_reports(limit, offset)
-        return jsonify({"reports": reports})
+        after = request.args.get('after')
+        fields = request.args.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        try:
+            reports, next_cursor = db.get_reports_page(limit, offset, after=after, fields=fields)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"reports": reports, "next_cursor": next_cursor})
     except Exception as e:
         print(f"Error retrieving reports: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-@app.route('/api/reports/<report_id>', methods=['GET'])
+@bp.route('/api/reports/summary', methods=['GET'])
+def report_feed():
+    """Compact report feed for the dashboard: a snapshot, or only the reports saved or deleted since a cursor"""
+    try:
+        since = request.args.get('since') or None
+        limit = min(max(request.args.get('limit', default=1000, type=int), 1), 10000)
+        fields = request.args.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+        # The feed only changes when a report is saved or deleted, so its position in the change log versions it
+        etag = hashlib.sha256(json.dumps([db.feed_position(), since, limit, fields]).encode()).hexdigest()[:32]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            try:
+                response = jsonify(db.get_report_feed(since, limit, fields))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        return response
+    except Exception as e:
+        print(f"Error retrieving report feed: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@bp.route('/api/reports/search', methods=['GET'])
+def search_reports():
+    """Full-text search over report titles, URLs, domains and content"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Missing required parameter 'q'"}), 400
+        limit = min(max(request.args.get('limit', default=20, type=int), 1), 100)
+        offset = max(request.args.get('offset', default=0, type=int), 0)
+
+        results, has_more = db.search_reports(query, limit, offset)
+        return jsonify({"query": query, "results": results, "has_more": has_more})
+    except Exception as e:
+        print(f"Error searching reports: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@bp.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Aggregate report statistics per domain and/or time bucket"""
+    try:
+        limit = request.args.get('limit', type=int)
+        try:
+            stats = db.get_stats(
+                group_by=request.args.get('group_by', 'domain,bucket'),
+                interval=request.args.get('interval', 'day'),
+                domain=request.args.get('domain'),
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                order_by=request.args.get('order_by'),
+                min_count=max(request.args.get('min_count', default=1, type=int), 1),
+                limit=min(max(limit, 1), 10000) if limit else None
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"stats": stats})
+    except Exception as e:
+        print(f"Error retrieving stats: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@bp.route('/api/reports/<report_id>', methods=['GET'])
 def get_report(report_id):
     """Get a specific report by ID"""
     try:
@@ -107,14 +488,48 @@ def get_report(report_id):
         print(f"Error retrieving report: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-@app.route('/api/reports/<report_id>/html', methods=['GET'])
+# Reports never change once written, so clients and proxies may cache them for a year
+REPORT_MAX_AGE = 365 * 24 * 60 * 60
+
+def send_report_file(file_path):
+    """
+    Serve a stored report file with strong ETags, Last-Modified and 304 handling.
+
+    Compressed files are sent from disk as-is (sendfile where the server
+    supports it) to clients that accept their Content-Encoding, and streamed
+    through a decompressor for clients that don't.
+    """
+    encoding = db.store.encoding_of(file_path)
+    etag = db.store.etag_of(file_path)
+    last_modified = datetime.datetime.fromtimestamp(os.path.getmtime(file_path), datetime.timezone.utc)
+
+    if not encoding or request.accept_encodings[encoding]:
+        response = send_file(file_path, mimetype='text/html', conditional=True,
+                             download_name=os.path.basename(file_path).split('.', 1)[0] + '.html',
+                             etag=f"{etag}-{encoding}" if encoding else etag,
+                             last_modified=last_modified, max_age=REPORT_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    else:
+        response = Response(db.store.iter_text(file_path), mimetype='text/html')
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response = response.make_conditional(request)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = REPORT_MAX_AGE
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/api/reports/<report_id>/html', methods=['GET'])
 def get_report_html(report_id):
     """Get the HTML content of a report"""
     try:
-        html = db.get_report_html(report_id)
-        if not html:
+        report_file = db.get_report_file(report_id)
+        if not report_file:
             return jsonify({"error": "Report not found"}), 404
-        return html, 200, {'Content-Type': 'text/html'}
+        return send_report_file(report_file[0])
     except Exception as e:
         print(f"Error retrieving report HTML: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -124,27 +539,30 @@ def get_absolute_url(path):
     """Generate absolute URL from a relative path"""
     return f"{SERVER_URL}{path}"
 
-@app.context_processor
+@bp.app_context_processor
 def utility_processor():
     """Make utility functions available to templates"""
     return dict(get_absolute_url=get_absolute_url)
 
-@app.route('/reports/<path:filename>')
+@bp.route('/reports/<path:filename>')
 def serve_report(filename):
     """Serve static report files"""
     # Make sure we're using the correct reports directory
     try:
-        return send_from_directory(db.reports_dir, filename)
+        file_path = safe_join(db.reports_dir, filename)
+        if not file_path or not os.path.isfile(file_path):
+            return jsonify({"error": "Report not found"}), 404
+        return send_report_file(file_path)
     except Exception as e:
         print(f"Error serving report file: {str(e)}")
         return jsonify({"error": f"Error serving file: {str(e)}"}), 500
 
-@app.route('/reports')
+@bp.route('/reports')
 def reports_page():
     """Render the reports dashboard page"""
     return render_template('reports.html')
 
-@app.route('/reports/test')
+@bp.route('/reports/test')
 def test_reports_api():
     """Test endpoint to verify API functionality"""
     try:
@@ -162,12 +580,17 @@ def test_reports_api():
             "traceback": traceback.format_exc()
         }), 500
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Serve the homepage"""
     return render_template('index.html')
 
+# Entry point for `gunicorn app:app`, `flask run` and asgi.py
+app = create_app()
+
 if __name__ == '__main__':
+    if app.config['WARM_UP']:
+        print(f"Warmed up in {warm_up(app):.3f}s")
     print(f"Starting server at {SERVER_HOST}:{SERVER_PORT}")
     print(f"Server will be externally accessible at {SERVER_URL}")
     app.run(host=SERVER_HOST, port=SERVER_PORT, debug=DEBUG_MODE)
\ No newline at end of file
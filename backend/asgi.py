@@ -0,0 +1,363 @@
+"""
+Asynchronous serving mode for the Pinocchio backend.
+
+The analysis routes (`POST /api/analyze`, `POST /api/analyze/stream` and
+`POST /api/analyze/batch`) are served natively on the event loop with the
+async Gemini client, so a request waiting on the model holds no thread.
+Every other route of app.py is served by the Flask app itself through a
+small WSGI bridge. Blocking work runs in one bounded thread pool per
+worker: `ReportDatabase` and cache queries, content reduction and the
+Flask routes.
+
+Usage:
+    uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 8080
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import math
+import time
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+from app import app as flask_app, warm_up, CORS_ORIGINS
+from batch_service import AsyncBatchAnalyzer, parse_ndjson
+from gemini_service import analyze_website_content_async, stream_website_analysis_async, get_cached_analysis
+from quota_scheduler import UpstreamUnavailableError
+from metrics_service import REQUEST_LATENCY
+
+# Load environment variables
+load_dotenv()
+
+# Threads per worker for blocking work (database, caches, content reduction and the Flask routes)
+BLOCKING_THREADS = int(os.getenv('ASGI_BLOCKING_THREADS', 32))
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonl')
+
+
+class FlaskBridge:
+    """
+    Serves a WSGI app over ASGI, running each request in the bounded pool.
+
+    The request body is read in full, then the app runs in a pool thread and
+    its response is sent through the event loop as it is iterated, so
+    streamed responses (SSE, NDJSON) go out piece by piece.
+    """
+
+    def __init__(self, wsgi_application, executor):
+        self.wsgi_application = wsgi_application
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError(f"The WSGI app can't serve '{scope['type']}' connections")
+        body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.run_wsgi_app, wsgi_environ(scope, body), loop, send)
+
+    def run_wsgi_app(self, environ, loop, send):
+        """Run the app in a pool thread, so start_response is called in the thread that iterates the response."""
+        response_start = {}
+
+        def sync_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response_start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start.update(status=int(status.split(' ', 1)[0]), headers=[
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ], content_length=next((int(value) for name, value in headers
+                                    if name.lower() == 'content-length' and value.isdigit()), None))
+            return write
+
+        def send_start():
+            if not response_start.get('sent'):
+                response_start['sent'] = True
+                sync_send({'type': 'http.response.start', 'status': response_start['status'],
+                           'headers': response_start['headers']})
+
+        def write(data):
+            send_start()
+            if data:
+                sync_send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        response = self.wsgi_application(environ, start_response)
+        try:
+            bytes_sent = 0
+            for output in response:
+                # Never send more than the Content-Length the app declared
+                content_length = response_start['content_length']
+                if content_length is not None:
+                    output = output[:content_length - bytes_sent]
+                write(output)
+                bytes_sent += len(output)
+                if bytes_sent == content_length:
+                    break
+        finally:
+            # Lets streamed responses (SSE, NDJSON) clean up when the client goes away
+            if hasattr(response, 'close'):
+                response.close()
+        send_start()
+        sync_send({'type': 'http.response.body'})
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ (PEP 3333) of an ASGI HTTP request whose body has been read."""
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        # The body was read in full, so the app may read to the end without a Content-Length
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        if name in ('content-type', 'content-length'):
+            key = name.upper().replace('-', '_')
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    return environ
+
+
+class Request:
+    """The parts of an ASGI HTTP request the native routes need."""
+
+    def __init__(self, scope, body=b''):
+        self.scope = scope
+        self.body = body
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+    @property
+    def mimetype(self):
+        return self.headers.get('content-type', '').split(';', 1)[0].strip().lower()
+
+    def get_json(self):
+        """The body parsed as JSON, or None if it isn't valid JSON."""
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class AsyncApp:
+    """
+    ASGI application: native async handlers for the analysis routes, Flask for the rest.
+    """
+
+    def __init__(self, wsgi_app, blocking_threads=None):
+        self.executor = ThreadPoolExecutor(max_workers=blocking_threads or BLOCKING_THREADS,
+                                           thread_name_prefix='asgi-blocking')
+        self.wsgi_app = wsgi_app
+        self.flask = FlaskBridge(wsgi_app, self.executor)
+        self.batches = AsyncBatchAnalyzer(analyze_website_content_async, lookup_fn=get_cached_analysis)
+        self.routes = {
+            ('POST', '/api/analyze'): self.analyze,
+            ('POST', '/api/analyze/stream'): self.analyze_stream,
+            ('POST', '/api/analyze/batch'): self.analyze_batch,
+        }
+        self._loop = None
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # run_in_executor(None, ...) in the analysis pipeline uses the bounded pool too
+            loop.set_default_executor(self.executor)
+            self._loop = loop
+
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        handler = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        request = Request(scope) if handler else None
+        # Async jobs run in JobManager's thread pool, so Flask serves them
+        if handler is None or request.args.get('async') in ('1', 'true'):
+            await self.flask(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request.body = await read_body(receive)
+        status = await handler(request, send)
+        REQUEST_LATENCY.labels(request.method, request.path, status).observe(time.perf_counter() - start)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.wsgi_app.config['WARM_UP']:
+                    seconds = await asyncio.get_running_loop().run_in_executor(None, warm_up, self.wsgi_app)
+                    print(f"Warmed up in {seconds:.3f}s")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def analyze(self, request, send):
+        """Same contract as `POST /api/analyze` in app.py."""
+        data = request.get_json()
+        if not isinstance(data, dict) or 'url' not in data or 'content' not in data:
+            return await send_json(request, send, 400, {
+                "error": "Missing required parameters. Please provide 'url' and 'content'."})
+
+        use_cache = wants_cache(request, data)
+        try:
+            result = await analyze_website_content_async(data['url'], data['content'], use_cache=use_cache)
+            return await send_json(request, send, 200, result)
+        except UpstreamUnavailableError as e:
+            print(f"Analysis service unavailable: {str(e)}")
+            retry_after = math.ceil(e.retry_after or 5)
+            return await send_json(request, send, 503, {"error": str(e), "retry_after": retry_after},
+                                   headers=[(b'retry-after', str(retry_after).encode())])
+        except Exception as e:
+            print(f"Error in analyze_website_content_async: {str(e)}")
+            print(traceback.format_exc())
+            return await send_json(request, send, 500, {
+                "error": f"Server error analyzing content: {str(e)}",
+                "summary": "Could not analyze the content",
+                "misinformation_detected": None,
+                "misinformation_score": 5,  # Neutral score
+                "report": "The system encountered an error while analyzing this content. Please try again later.",
+                "additional_context": "Error processing the content",
+                "sources": []
+            })
+
+    async def analyze_stream(self, request, send):
+        """Same contract as `POST /api/analyze/stream` in app.py: Server-Sent Events as the analysis progresses."""
+        data = request.get_json()
+        if not isinstance(data, dict) or 'url' not in data or 'content' not in data:
+            return await send_json(request, send, 400, {
+                "error": "Missing required parameters. Please provide 'url' and 'content'."})
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': cors_headers(request) + [
+            (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]})
+        try:
+            async for event, payload in stream_website_analysis_async(data['url'], data['content'],
+                                                                      use_cache=wants_cache(request, data)):
+                await send({'type': 'http.response.body', 'body': sse_event(event, payload), 'more_body': True})
+        except Exception as e:
+            print(f"Error in stream_website_analysis_async: {str(e)}")
+            print(traceback.format_exc())
+            error = {'error': f'Server error analyzing content: {str(e)}'}
+            await send({'type': 'http.response.body', 'body': sse_event('error', error), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+        return 200
+
+    async def analyze_batch(self, request, send):
+        """Same contract as `POST /api/analyze/batch` in app.py: one NDJSON line per page as each completes."""
+        try:
+            concurrency = int(request.args['concurrency'])
+        except (KeyError, ValueError):
+            concurrency = None
+        use_cache = wants_cache(request)
+
+        if request.mimetype in NDJSON_TYPES:
+            items = parse_ndjson(request.body.decode('utf-8', 'replace').splitlines())
+        else:
+            data = request.get_json()
+            if isinstance(data, dict):
+                if concurrency is None and isinstance(data.get('concurrency'), int):
+                    concurrency = data['concurrency']
+                use_cache = wants_cache(request, data)
+                data = data.get('items')
+            if not isinstance(data, list):
+                return await send_json(request, send, 400, {
+                    "error": "Please provide an array of {'url', 'content'} items, {'items': [...]}, or an NDJSON body."
+                })
+            items = data
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': cors_headers(request) + [
+            (b'content-type', b'application/x-ndjson'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')
+        ]})
+        try:
+            async for outcome in self.batches.run(items, concurrency=concurrency, use_cache=use_cache):
+                await send({'type': 'http.response.body', 'body': (json.dumps(outcome) + "\n").encode(),
+                            'more_body': True})
+        except Exception as e:
+            print(f"Error in batch analysis: {str(e)}")
+            print(traceback.format_exc())
+            line = json.dumps({"done": True, "error": f"Server error analyzing batch: {str(e)}"}) + "\n"
+            await send({'type': 'http.response.body', 'body': line.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+        return 200
+
+
+async def read_body(receive):
+    """Read the whole request body."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def wants_cache(request, data=None):
+    """Whether an analysis request may be answered from the analysis cache, as `wants_cache` in app.py."""
+    return not (
+        (isinstance(data, dict) and data.get('refresh') is True)
+        or request.args.get('cache') == '0'
+        or 'no-cache' in request.headers.get('cache-control', '')
+    )
+
+
+def sse_event(event, payload):
+    """One Server-Sent Event, as app.py's stream route writes it."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+def cors_headers(request):
+    """CORS headers for the origins app.py allows, if the request comes from one of them."""
+    origin = request.headers.get('origin')
+    if origin and any(re.fullmatch(re.escape(allowed).replace(r'\*', '.*'), origin) for allowed in CORS_ORIGINS):
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    return []
+
+
+async def send_json(request, send, status, payload, headers=()):
+    """Send a complete JSON response and return its status."""
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': cors_headers(request) + [
+        (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())
+    ] + list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+
+app = AsyncApp(flask_app)
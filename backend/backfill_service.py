@@ -0,0 +1,380 @@
+import os
+import sys
+import csv
+import json
+import html
+import time
+import itertools
+import functools
+from dotenv import load_dotenv
+from batch_service import BatchAnalyzer, BatchItemError
+from gemini_service import analyze_website_content, get_cached_analysis, services
+from html_text import extract_html
+
+# Load environment variables
+load_dotenv()
+
+# Checkpoint entries between fsyncs; a crash loses at most this many, which are then analyzed again
+CHECKPOINT_SYNC_EVERY = int(os.getenv('BACKFILL_CHECKPOINT_SYNC_EVERY', 100))
+
+HTML_EXTENSIONS = ('.html', '.htm')
+
+
+def detect_format(path):
+    """The input format of a path: 'html' for a directory, 'csv' for a .csv file, otherwise 'jsonl'."""
+    if os.path.isdir(path):
+        return 'html'
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_corpus(path, fmt=None, url_field='url', content_field='content', base_url=None):
+    """
+    Read the pages of a corpus lazily.
+
+    Every page has a key that stays the same across runs over the same input
+    (the line or row number, or the path of the file in the directory), so a
+    checkpoint can record which pages were done.
+
+    Args:
+        path (str): A JSON Lines or CSV file, or a directory of HTML files
+        fmt (str): 'jsonl', 'csv' or 'html', or None to detect it from the path
+        url_field (str): Field of the URL in JSON Lines and CSV records
+        content_field (str): Field of the page text in JSON Lines and CSV records
+        base_url (str): URL HTML files are relative to, or None for file:// URLs
+
+    Yields:
+        tuple: (key, item) where item is a dict with url, content and title, or a BatchItemError
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == 'html':
+        yield from _read_html_dir(path, base_url)
+        return
+
+    with open(path, encoding='utf-8', newline='' if fmt == 'csv' else None) as f:
+        if fmt == 'csv':
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            records = enumerate(csv.DictReader(f), 2)  # Row 1 is the header
+        else:
+            # Number records by line, so blank lines don't shift the keys
+            records = ((number, _parse_json_line(number, line)) for number, line in enumerate(f, 1) if line.strip())
+        for number, record in records:
+            if isinstance(record, BatchItemError):
+                yield str(number), record
+            elif not isinstance(record, dict):
+                yield str(number), BatchItemError("Each item must be an object with 'url' and 'content'")
+            else:
+                yield str(number), {'url': record.get(url_field), 'content': record.get(content_field),
+                                    'title': record.get('title')}
+
+
+def _parse_json_line(number, line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return BatchItemError(f"Invalid JSON on line {number}: {str(e)}")
+
+
+def _read_html_dir(path, base_url):
+    """Yield the pages of a directory of HTML files, in a stable order."""
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        files.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith(HTML_EXTENSIONS))
+
+    for file_path in files:
+        key = os.path.relpath(file_path, path).replace(os.sep, '/')
+        try:
+            with open(file_path, encoding='utf-8', errors='replace') as f:
+                title, text = extract_html(f.read())
+        except OSError as e:
+            yield key, BatchItemError(f"Could not read {key}: {str(e)}")
+            continue
+        url = base_url.rstrip('/') + '/' + key if base_url else 'file://' + os.path.abspath(file_path)
+        yield key, {'url': url, 'content': text, 'title': title}
+
+
+class Checkpoint:
+    """
+    Keys of the pages a backfill has finished, for resuming it.
+
+    The file starts with a header naming the input, followed by one
+    `{"key", "status"}` line per finished page, appended and flushed as
+    each page completes. With `retry_errors`, pages that failed count as
+    unfinished. An append-only log never has to be rewritten, so
+    it stays cheap for hundreds of thousands of pages, and a write cut off by
+    a crash leaves at most one incomplete last line, which is ignored.
+    """
+
+    def __init__(self, path, source, retry_errors=False):
+        self.path = path
+        self.done = {}
+        self._unsynced = 0
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                lines = iter(f)
+                header = _load_line(next(lines, ''))
+                if header is not None and header.get('source') != source:
+                    raise ValueError(f"Checkpoint {path} is for {header.get('source')}, not {source}")
+                for line in lines:
+                    entry = _load_line(line)
+                    if entry is None:
+                        continue
+                    if retry_errors and entry['status'] != 'ok':
+                        self.done.pop(entry['key'], None)
+                    else:
+                        self.done[entry['key']] = entry['status']
+
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() == 0:
+            self._write({'source': source})
+        elif not _ends_with_newline(path):
+            self._file.write('\n')
+
+    def is_done(self, key):
+        """Whether a page was finished."""
+        return key in self.done
+
+    def mark(self, key, status):
+        """Record a finished page."""
+        self.done[key] = status
+        self._write({'key': key, 'status': status})
+        self._unsynced += 1
+        if self._unsynced >= CHECKPOINT_SYNC_EVERY:
+            self.sync()
+
+    def sync(self):
+        """Make the recorded pages durable."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+
+def _load_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def score_style(score):
+    """Color, background, label and icon of a score, as in the extension's reports."""
+    if score <= 3:
+        return '#4CAF50', 'rgba(76, 175, 80, 0.1)', 'Generally Reliable', '✓'
+    if score <= 7:
+        return '#FFC107', 'rgba(255, 193, 7, 0.1)', 'Potentially Misleading', '⚠'
+    return '#F44336', 'rgba(244, 67, 54, 0.1)', 'Likely Unreliable', '✗'
+
+
+def render_report_html(url, title, result):
+    """
+    Render an analysis as a report page in the extension's layout.
+
+    Returns:
+        str: The report HTML
+    """
+    score = result['misinformation_score']
+    color, background, description, icon = score_style(score)
+    e = lambda value: html.escape(str(value or ''))
+    sources = ''.join(f'<li><a href="{e(source)}" target="_blank">{e(source)}</a></li>'
+                      for source in result.get('sources') or []) or '<li>No sources available</li>'
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <title>Pinocchio Report - {e(title)}</title>
+  <style>
+    body {{ font-family: 'Nunito', Arial, sans-serif; color: #5b4b33; margin: 0; padding: 20px; background-color: #f9f4e8; }}
+    .container {{ max-width: 800px; margin: 0 auto; background: linear-gradient(135deg, #f7f0e1 0%, #eadfc5 100%); padding: 30px; border-radius: 10px; box-shadow: 0 5px 20px rgba(91, 75, 51, 0.15); }}
+    h1 {{ color: #854a11; font-size: 28px; text-align: center; margin-bottom: 5px; }}
+    h2 {{ color: #714012; font-size: 18px; border-bottom: 1px solid #c4a77d; padding-bottom: 5px; margin-top: 25px; }}
+    .subtitle {{ text-align: center; color: #7d6843; font-size: 16px; margin-bottom: 30px; }}
+    .score-container {{ text-align: center; margin: 20px 0; padding: 20px; border-radius: 10px; background-color: {background}; border: 1px solid {color}; }}
+    .score-value {{ font-size: 28px; font-weight: bold; color: {color}; margin: 10px 0; }}
+    .score-description {{ font-size: 16px; color: {color}; margin: 5px 0; }}
+    .score-badge {{ display: inline-block; width: 30px; height: 30px; line-height: 30px; text-align: center; border-radius: 50%; background-color: {color}; color: white; font-size: 16px; font-weight: bold; margin-right: 10px; }}
+    .section {{ background-color: #faf6eb; padding: 15px; margin: 15px 0; border-radius: 8px; }}
+    .url {{ font-size: 12px; color: #7d6843; text-align: center; margin-bottom: 20px; word-break: break-all; }}
+    .sources {{ list-style-type: none; padding-left: 20px; }}
+    .sources li {{ margin-bottom: 8px; word-break: break-all; }}
+    a {{ color: #854a11; text-decoration: none; }}
+    a:hover {{ text-decoration: underline; }}
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Pinocchio Report</h1>
+    <p class="subtitle">Fact-Check Analysis</p>
+    <p class="url">URL: {e(url)}</p>
+
+    <div class="score-container">
+      <h2>Misinformation Score</h2>
+      <div class="score-badge">{icon}</div>
+      <div class="score-value">{score}/10</div>
+      <div class="score-description">{description}</div>
+    </div>
+
+    <div class="section">
+      <h2>Summary</h2>
+      <p>{e(result.get('summary'))}</p>
+    </div>
+
+    <div class="section">
+      <h2>Truth Report</h2>
+      <p>{e(result.get('report'))}</p>
+    </div>
+
+    <div class="section">
+      <h2>More Context</h2>
+      <p>{e(result.get('additional_context'))}</p>
+    </div>
+
+    <div class="section">
+      <h2>Sources</h2>
+      <ul class="sources">{sources}</ul>
+    </div>
+  </div>
+</body>
+</html>
+"""
+
+
+class Backfill:
+    """
+    Analyze a crawled corpus offline, resumably.
+
+    Pages go through `analyze_website_content` at batch priority with
+    `BatchAnalyzer`, so they share the analysis cache, near-duplicate index
+    and quota scheduler with the server. Each outcome is appended to a JSON
+    Lines file and/or saved to the reports database before its key is
+    checkpointed, so every page is written at least once: a page finished but
+    not yet checkpointed when the process died is analyzed (from the cache)
+    and written again.
+
+    When the model is out of quota or down, the run stops taking new pages,
+    waits for the scheduler's `retry_after` and goes over the pages that are
+    still unfinished, giving up after `max_pauses` pauses in a row without
+    progress.
+    """
+
+    def __init__(self, checkpoint, output=None, db=None, workers=None, use_cache=True, max_pauses=10,
+                 progress_every=10.0):
+        self.checkpoint = checkpoint
+        self.output = output
+        self.db = db
+        self.use_cache = use_cache
+        self.max_pauses = max_pauses
+        self.progress_every = progress_every
+        self.analyzer = BatchAnalyzer(functools.partial(analyze_website_content, priority='batch'),
+                                      lookup_fn=get_cached_analysis, workers=workers, concurrency=workers,
+                                      max_items=sys.maxsize)
+        self.counts = {'succeeded': 0, 'failed': 0, 'cached': 0, 'skipped': 0, 'saved': 0}
+        self._passes = 0
+
+    def run(self, read_pages):
+        """
+        Analyze every unfinished page.
+
+        Args:
+            read_pages: Callable returning a fresh iterable of (key, item) pages, read once per pass
+
+        Returns:
+            bool: True if every page is finished, False if the model stayed unavailable
+        """
+        # Pages a killed earlier run was analyzing would otherwise wait out its leases
+        released = services().flights.release_orphaned()
+        if released:
+            print(f"Released {released} in-flight analyses of stopped processes", file=sys.stderr)
+
+        pauses = 0
+        while True:
+            finished = self.counts['succeeded'] + self.counts['failed']
+            retry_after = self._run_pass(read_pages())
+            if retry_after is None:
+                return True
+            if self.counts['succeeded'] + self.counts['failed'] > finished:
+                pauses = 0
+            if pauses >= self.max_pauses:
+                return False
+            pauses += 1
+            wait = max(retry_after or 0, 1)
+            print(f"Model unavailable, resuming in {wait:.0f}s ({pauses}/{self.max_pauses})", file=sys.stderr)
+            time.sleep(wait)
+
+    def _run_pass(self, pages):
+        """One pass over the pages; returns the retry delay if it stopped on an unavailable model, else None."""
+        self._passes += 1
+        pending = {}
+        indexes = itertools.count()
+
+        def unfinished():
+            for key, item in pages:
+                if self.checkpoint.is_done(key):
+                    self.counts['skipped'] += self._passes == 1
+                    continue
+                pending[next(indexes)] = (key, item)
+                yield item
+
+        last_progress = time.monotonic()
+        outcomes = self.analyzer.run(unfinished(), use_cache=self.use_cache)
+        try:
+            for outcome in outcomes:
+                if outcome.get('done'):
+                    break
+                key, item = pending.pop(outcome['index'])
+                if 'retry_after' in outcome:
+                    # Leave the page unfinished and stop; the pages in flight are cancelled
+                    return outcome['retry_after'] or 0
+                self._finish(key, item, outcome)
+
+                if time.monotonic() - last_progress >= self.progress_every:
+                    last_progress = time.monotonic()
+                    self.report_progress()
+        finally:
+            outcomes.close()
+        return None
+
+    def _finish(self, key, item, outcome):
+        """Write one outcome, then checkpoint its page."""
+        record = dict(outcome, key=key)
+        del record['index']
+        if outcome['status'] == 'ok':
+            self.counts['succeeded'] += 1
+            self.counts['cached'] += bool(outcome.get('cached'))
+            if self.db is not None:
+                record['report_id'] = self._save_report(item, outcome['result'])
+        else:
+            self.counts['failed'] += 1
+
+        if self.output is not None:
+            self.output.write(json.dumps(record) + '\n')
+            self.output.flush()
+        self.checkpoint.mark(key, outcome['status'])
+
+    def _save_report(self, item, result):
+        """Save an analysis as a report, unless it has no score."""
+        if result.get('misinformation_score') is None:
+            return None
+        title = item.get('title') or result.get('summary') or item['url']
+        saved = self.db.save_report(item['url'], title, result['misinformation_score'],
+                                    render_report_html(item['url'], title, result))
+        self.counts['saved'] += 1
+        return saved['report_id']
+
+    def report_progress(self):
+        print("Analyzed {succeeded} pages ({cached} cached), {failed} failed, {skipped} already done, "
+              "{saved} reports saved".format(**self.counts), file=sys.stderr)
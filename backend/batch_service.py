@@ -0,0 +1,234 @@
+import os
+import json
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from quota_scheduler import UpstreamUnavailableError
+
+# Load environment variables
+load_dotenv()
+
+# Batch configuration
+BATCH_WORKERS = int(os.getenv('ANALYSIS_BATCH_WORKERS', 16))  # Analyses running at once across all batches
+BATCH_CONCURRENCY = int(os.getenv('ANALYSIS_BATCH_CONCURRENCY', 8))  # Default analyses in flight per batch
+BATCH_MAX_ITEMS = int(os.getenv('ANALYSIS_BATCH_MAX_ITEMS', 1000))
+BATCH_ASYNC_WORKERS = int(os.getenv('ANALYSIS_BATCH_ASYNC_WORKERS', 256))  # The same limit for the ASGI server
+
+
+class BatchItemError(Exception):
+    """Raised for a batch item that can't be analyzed, e.g. because a field is missing."""
+
+
+def parse_ndjson(lines):
+    """
+    Parse newline-delimited JSON lazily.
+
+    Yields:
+        dict or BatchItemError: One parsed object, or the error, per non-empty line
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield BatchItemError(f"Invalid JSON on line {number}: {str(e)}")
+
+
+class BatchAnalyzer:
+    """
+    Analyze many pages with bounded concurrency, yielding results as they complete.
+
+    Cached pages are answered immediately without taking a worker. The rest
+    share one process-wide thread pool, and each batch keeps at most
+    `concurrency` of its items in flight, so one large batch can't starve
+    other batches or the rest of the API. Items are read lazily, so an
+    NDJSON request body is consumed only as fast as results are produced.
+    """
+
+    def __init__(self, analyze_fn, lookup_fn=None, workers=None, concurrency=None, max_items=None):
+        self.analyze_fn = analyze_fn
+        self.lookup_fn = lookup_fn
+        self.concurrency = BATCH_CONCURRENCY if concurrency is None else concurrency
+        self.max_items = BATCH_MAX_ITEMS if max_items is None else max_items
+        self.workers = BATCH_WORKERS if workers is None else workers
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis-batch')
+
+    def run(self, items, concurrency=None, use_cache=True):
+        """
+        Analyze a batch of `{url, content}` items.
+
+        Args:
+            items: Iterable of item dicts, or BatchItemError for items that failed to parse
+            concurrency: Maximum analyses in flight for this batch, capped at the pool size
+            use_cache: Whether to read from the analysis cache
+
+        Yields:
+            dict: Per item, `{"index", "url", "status": "ok", "result"}` or
+            `{"index", "url", "status": "error", "error"}` in completion order,
+            then a final `{"done": true, ...}` summary
+        """
+        concurrency = max(1, min(concurrency or self.concurrency, self.workers))
+        pending = {}
+        counts = {'total': 0, 'succeeded': 0, 'failed': 0, 'cached': 0}
+
+        def finish(outcome):
+            counts['succeeded' if outcome['status'] == 'ok' else 'failed'] += 1
+            return outcome
+
+        try:
+            for index, item in enumerate(items):
+                if index >= self.max_items:
+                    # Items past the limit are rejected without being read, so they stay out of the counts
+                    yield self._error(index, None, f"Batch is limited to {self.max_items} items")
+                    break
+                counts['total'] += 1
+
+                try:
+                    url, content = self._validate(item)
+                except BatchItemError as e:
+                    yield finish(self._error(index, _item_url(item), str(e)))
+                    continue
+
+                # Answer cached pages without taking a worker
+                if use_cache and self.lookup_fn:
+                    cached = self.lookup_fn(url, content)
+                    if cached is not None:
+                        counts['cached'] += 1
+                        yield finish({"index": index, "url": url, "status": "ok", "cached": True, "result": cached})
+                        continue
+
+                # Wait for a slot, yielding whatever completes meanwhile
+                while len(pending) >= concurrency:
+                    yield from self._collect(pending, finish)
+
+                future = self._executor.submit(self.analyze_fn, url, content, use_cache=use_cache)
+                pending[future] = (index, url)
+
+            while pending:
+                yield from self._collect(pending, finish)
+        finally:
+            # The client went away: don't start the items it will never read
+            for future in pending:
+                future.cancel()
+
+        yield dict(done=True, **counts)
+
+    def _collect(self, pending, finish):
+        """Wait for at least one in-flight item and yield the outcome of each one that completed."""
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            index, url = pending.pop(future)
+            yield finish(self._outcome(index, url, future))
+
+    def _outcome(self, index, url, future):
+        """The outcome line of a completed item."""
+        try:
+            result = future.result()
+        except UpstreamUnavailableError as e:
+            return dict(self._error(index, url, str(e)), retry_after=e.retry_after)
+        except Exception as e:
+            print(f"Error analyzing batch item {index} ({url}): {str(e)}")
+            print(traceback.format_exc())
+            return self._error(index, url, f"Analysis failed: {str(e)}")
+        if 'error' in result:
+            return self._error(index, url, result['error'])
+        return {"index": index, "url": url, "status": "ok", "result": result}
+
+    @staticmethod
+    def _validate(item):
+        """Return the url and content of an item, or raise BatchItemError."""
+        if isinstance(item, BatchItemError):
+            raise item
+        if not isinstance(item, dict):
+            raise BatchItemError("Each item must be an object with 'url' and 'content'")
+        if not isinstance(item.get('url'), str) or not isinstance(item.get('content'), str):
+            raise BatchItemError("Missing required parameters. Please provide 'url' and 'content'.")
+        return item['url'], item['content']
+
+    @staticmethod
+    def _error(index, url, message):
+        return {"index": index, "url": url, "status": "error", "error": message}
+
+
+class AsyncBatchAnalyzer(BatchAnalyzer):
+    """
+    BatchAnalyzer for the ASGI server.
+
+    `analyze_fn` is a coroutine function and `lookup_fn` a blocking cache
+    lookup, run in the loop's default executor. Analyses of all batches share
+    `workers` slots of a semaphore instead of a thread pool, so a waiting
+    analysis costs a task, not a thread.
+    """
+
+    def __init__(self, analyze_fn, lookup_fn=None, workers=None, concurrency=None, max_items=None):
+        self.analyze_fn = analyze_fn
+        self.lookup_fn = lookup_fn
+        self.concurrency = BATCH_CONCURRENCY if concurrency is None else concurrency
+        self.max_items = BATCH_MAX_ITEMS if max_items is None else max_items
+        self.workers = BATCH_ASYNC_WORKERS if workers is None else workers
+        self._slots = None  # Created on first use, in the server's event loop
+
+    async def run(self, items, concurrency=None, use_cache=True):
+        """Like `BatchAnalyzer.run`, as an async generator."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        concurrency = max(1, min(concurrency or self.concurrency, self.workers))
+        pending = {}
+        counts = {'total': 0, 'succeeded': 0, 'failed': 0, 'cached': 0}
+
+        def finish(outcome):
+            counts['succeeded' if outcome['status'] == 'ok' else 'failed'] += 1
+            return outcome
+
+        try:
+            for index, item in enumerate(items):
+                if index >= self.max_items:
+                    # Items past the limit are rejected without being read, so they stay out of the counts
+                    yield self._error(index, None, f"Batch is limited to {self.max_items} items")
+                    break
+                counts['total'] += 1
+
+                try:
+                    url, content = self._validate(item)
+                except BatchItemError as e:
+                    yield finish(self._error(index, _item_url(item), str(e)))
+                    continue
+
+                if use_cache and self.lookup_fn:
+                    cached = await loop.run_in_executor(None, self.lookup_fn, url, content)
+                    if cached is not None:
+                        counts['cached'] += 1
+                        yield finish({"index": index, "url": url, "status": "ok", "cached": True, "result": cached})
+                        continue
+
+                while len(pending) >= concurrency:
+                    for outcome in await self._acollect(pending):
+                        yield finish(outcome)
+
+                pending[asyncio.ensure_future(self._analyze(url, content, use_cache))] = (index, url)
+
+            while pending:
+                for outcome in await self._acollect(pending):
+                    yield finish(outcome)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        yield dict(done=True, **counts)
+
+    async def _analyze(self, url, content, use_cache):
+        async with self._slots:
+            return await self.analyze_fn(url, content, use_cache=use_cache)
+
+    async def _acollect(self, pending):
+        """Wait for at least one in-flight item and return the outcomes of those that completed."""
+        done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+        return [self._outcome(*pending.pop(task), task) for task in done]
+
+
+def _item_url(item):
+    return item.get('url') if isinstance(item, dict) else None
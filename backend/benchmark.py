@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite for the Pinocchio API.
+
+Seeds a throwaway database with N reports, measures how long a worker takes
+to start, starts the Flask app against the offline stub analysis backend
+and drives each route at the requested concurrency levels, reporting
+throughput and p50/p95/p99 latency. With `--cassettes`, the analysis routes
+are answered from recorded Gemini responses instead of the stub, and
+`parse_responses` times text, source and JSON extraction of each recording.
+Results can be saved as a JSON baseline and compared against a previous run
+so regressions show up before a deploy.
+
+Examples:
+    python benchmark.py --reports 1000 --concurrency 1,8,32
+    python benchmark.py --reports 100000 --save-baseline baseline.json
+    python benchmark.py --reports 100000 --compare baseline.json --max-regression 15
+    python benchmark.py --url http://127.0.0.1:8080 --scenarios list_reports,report_html
+    python benchmark.py --cassettes cassettes.db --scenarios analyze,parse_responses
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ['analyze', 'analyze_cached', 'save_report', 'list_reports', 'list_reports_cursor', 'report_feed', 'report_html',
+             'dashboard', 'parse_responses']
+
+SAMPLE_PARAGRAPH = (
+    "Officials said on Tuesday that the new policy would take effect next month. "
+    "Critics argued the figures cited in the announcement were misleading and that "
+    "independent analysts had reached different conclusions about its likely impact. "
+)
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Pinocchio Report - {title}</title></head>
+<body><h1>{title}</h1><p>Score: {score}/10</p><p>{body}</p></body></html>"""
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def seed_database(db_path, count, html_files=1000):
+    """
+    Insert `count` reports directly into a fresh database.
+
+    Rows point at a pool of at most `html_files` report files so that seeding
+    millions of rows does not create millions of files.
+
+    Returns:
+        tuple: (report_ids, cursors) samples for the read scenarios
+    """
+    from db_service import ReportDatabase, encode_cursor
+
+    db = ReportDatabase(db_path)
+
+    file_paths = []
+    for i in range(min(count, html_files) or 1):
+        html = REPORT_TEMPLATE.format(title=f"Seed report {i}", score=i % 11, body=SAMPLE_PARAGRAPH * 20)
+        file_paths.append(db.store.put(html))
+
+    start = datetime.datetime(2025, 1, 1)
+    sample = []
+    cursors = []
+
+    def rows():
+        for i in range(count):
+            report_id = str(uuid.uuid4())
+            timestamp = (start + datetime.timedelta(seconds=30 * i)).isoformat()
+            if i % max(count // 1000, 1) == 0:
+                sample.append(report_id)
+                cursors.append(encode_cursor(timestamp, report_id))
+            yield (
+                report_id,
+                timestamp,
+                f"https://news{i % 500}.example.com/articles/{i}",
+                f"Seed report {i}",
+                float(i % 11),
+                file_paths[i % len(file_paths)]
+            )
+
+    conn = sqlite3.connect(db.db_path)
+    conn.executemany(
+        "INSERT INTO reports (id, timestamp, url, title, score, file_path) VALUES (?, ?, ?, ?, ?, ?)",
+        rows()
+    )
+    conn.commit()
+    conn.close()
+    return sample, cursors
+
+
+# Run in a fresh interpreter by `measure_startup`; prints timings in ms as JSON
+STARTUP_SCRIPT = """
+import sys, json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+if sys.argv[1] == 'warm':
+    app.warm_up(application)
+warmed = time.perf_counter()
+application.test_client().get('/api/reports?limit=10')
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'warm_up_ms': (warmed - created) * 1000, 'first_request_ms': (done - warmed) * 1000}))
+"""
+
+
+def measure_startup(runs=3):
+    """
+    Time worker startup in fresh interpreters, with and without warm-up.
+
+    Measures importing app.py, `create_app`, `warm_up` and the first request.
+    Uses the environment of the benchmark, so the same databases.
+
+    Returns:
+        dict: Median timings in ms; `first_request_cold_ms` is the first request without warm-up
+    """
+    def median_run(mode):
+        samples = []
+        for _ in range(runs):
+            output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT, mode],
+                                             cwd=os.path.dirname(os.path.abspath(__file__)))
+            samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+        return {key: round(sorted(s[key] for s in samples)[len(samples) // 2], 2) for key in samples[0]}
+
+    startup = median_run('warm')
+    startup['first_request_cold_ms'] = median_run('cold')['first_request_ms']
+    return startup
+
+
+def start_server(app):
+    """Serve the app on a free local port in a background thread."""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def make_request(base_url, scenario, n, report_ids, cursors, report_count):
+    """Build (method, path, body) for the n-th request of a scenario."""
+    if scenario == 'analyze':
+        content = f"Request {n} {uuid.uuid4()}. " + SAMPLE_PARAGRAPH * 10
+        return 'POST', '/api/analyze', {"url": f"https://bench.example.com/{uuid.uuid4()}", "content": content}
+    if scenario == 'analyze_cached':
+        return 'POST', '/api/analyze', {"url": "https://bench.example.com/popular", "content": SAMPLE_PARAGRAPH * 10}
+    if scenario == 'save_report':
+        html = REPORT_TEMPLATE.format(title=f"Bench {n}", score=n % 11, body=SAMPLE_PARAGRAPH * 20)
+        return 'POST', '/api/reports', {"url": f"https://bench.example.com/{n}", "title": f"Bench {n}",
+                                        "score": n % 11, "html": html}
+    if scenario == 'list_reports':
+        offset = random.randrange(max(report_count - 100, 1))
+        return 'GET', f"/api/reports?limit=100&offset={offset}", None
+    if scenario == 'list_reports_cursor':
+        return 'GET', f"/api/reports?limit=100&fields=id,timestamp,title,score&after={random.choice(cursors)}", None
+    if scenario == 'report_feed':
+        return 'GET', '/api/reports/summary', None
+    if scenario == 'report_html':
+        return 'GET', f"/api/reports/{random.choice(report_ids)}/html", None
+    if scenario == 'dashboard':
+        return 'GET', '/reports', None
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def run_scenario(base_url, scenario, concurrency, requests, report_ids, cursors, report_count, timeout=60):
+    """
+    Drive one scenario at a fixed concurrency.
+
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles in ms
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            method, path, body = make_request(base_url, scenario, n, report_ids, cursors, report_count)
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            req = urllib.request.Request(base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+            started = time.perf_counter()
+            ok = True
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": round(percentile(latencies, 50), 2) if latencies else None,
+            "p95": round(percentile(latencies, 95), 2) if latencies else None,
+            "p99": round(percentile(latencies, 99), 2) if latencies else None,
+            "max": round(latencies[-1], 2) if latencies else None,
+        }
+    }
+
+
+def run_parse_scenario(cassette_path, requests):
+    """
+    Time the handling of recorded model responses, without HTTP or model latency.
+
+    Each request rebuilds one recording's response and runs it through text
+    and source extraction and result parsing, as `analyze_website_content`
+    does with a live answer.
+
+    Returns:
+        dict: The same fields as `run_scenario`, at concurrency 1
+    """
+    from cassette_store import CassetteStore
+    from analysis_backends import extract_text, extract_sources, _whole_response
+    from gemini_service import _parse_result
+
+    recordings = list(CassetteStore(cassette_path))
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for n in range(requests if recordings else 0):
+        call_started = time.perf_counter()
+        response = _whole_response(recordings[n % len(recordings)])
+        result = _parse_result(extract_text(response), extract_sources(response))
+        latencies.append((time.perf_counter() - call_started) * 1000)
+        errors += bool(result.get('parse_failed'))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": 'parse_responses',
+        "concurrency": 1,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": round(percentile(latencies, 50), 4) if latencies else None,
+            "p95": round(percentile(latencies, 95), 4) if latencies else None,
+            "p99": round(percentile(latencies, 99), 4) if latencies else None,
+            "max": round(latencies[-1], 4) if latencies else None,
+        }
+    }
+
+
+def compare(results, baseline, max_regression):
+    """
+    Compare results against a baseline run.
+
+    Returns:
+        list: Human-readable descriptions of regressions beyond `max_regression` percent
+    """
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result['scenario'], result['concurrency']))
+        if not before:
+            continue
+        name = f"{result['scenario']} @ {result['concurrency']}"
+        if before['latency_ms']['p95'] and result['latency_ms']['p95']:
+            change = (result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1) * 100
+            if change > max_regression:
+                regressions.append(f"{name}: p95 {before['latency_ms']['p95']}ms -> {result['latency_ms']['p95']}ms (+{change:.1f}%)")
+        if before['throughput_rps'] and result['throughput_rps']:
+            change = (1 - result['throughput_rps'] / before['throughput_rps']) * 100
+            if change > max_regression:
+                regressions.append(f"{name}: throughput {before['throughput_rps']} -> {result['throughput_rps']} rps (-{change:.1f}%)")
+    return regressions
+
+
+def git_revision():
+    """The current git commit, if available."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    """Print results as an aligned table."""
+    print(f"\n{'scenario':<20}{'conc':>6}{'reqs':>7}{'errs':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for r in results:
+        lat = r['latency_ms']
+        print(f"{r['scenario']:<20}{r['concurrency']:>6}{r['requests']:>7}{r['errors']:>6}"
+              f"{r['throughput_rps'] or 0:>10.1f}{lat['p50'] or 0:>10.2f}{lat['p95'] or 0:>10.2f}{lat['p99'] or 0:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Pinocchio API against a stubbed analysis backend.")
+    parser.add_argument('--reports', type=int, default=1000, help="Number of reports to seed (e.g. 1000, 100000, 1000000)")
+    parser.add_argument('--concurrency', default='1,8,32', help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma-separated subset of {SCENARIOS}")
+    parser.add_argument('--stub-latency-ms', type=float, default=50, help="Median latency of the stub analysis backend")
+    parser.add_argument('--stub-latency-spread-ms', type=float, help="Latency spread of the stub backend (default: half the median)")
+    parser.add_argument('--stub-error-rate', type=float, default=0, help="Error rate of the stub analysis backend")
+    parser.add_argument('--cassettes', help="Answer analyses from responses recorded with ANALYSIS_BACKEND=record "
+                                            "instead of the stub backend")
+    parser.add_argument('--replay-latency-scale', type=float, default=1,
+                        help="Multiplier of the recorded model latency when replaying (0 for none)")
+    parser.add_argument('--url', help="Benchmark an already running server instead of an in-process one (no seeding)")
+    parser.add_argument('--data-dir', help="Directory for the seeded database (default: a temporary directory)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--save-baseline', help="Write the results as a JSON baseline to this file")
+    parser.add_argument('--compare', help="Compare against a JSON baseline and exit non-zero on regressions")
+    parser.add_argument('--max-regression', type=float, default=20, help="Allowed p95/throughput regression in percent")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    concurrency_levels = [int(c) for c in args.concurrency.split(',')]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"Unknown scenario '{scenario}'")
+
+    if args.stub_latency_spread_ms is None:
+        args.stub_latency_spread_ms = args.stub_latency_ms / 2
+
+    data_dir = None
+    server = None
+    meta = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "reports": args.reports,
+        "requests_per_run": args.requests,
+        "stub_latency_ms": args.stub_latency_ms,
+        "stub_latency_spread_ms": args.stub_latency_spread_ms,
+        "stub_error_rate": args.stub_error_rate,
+    }
+    if args.cassettes:
+        args.cassettes = os.path.abspath(args.cassettes)
+        meta.update(analysis_backend='replay', cassettes=args.cassettes,
+                    replay_latency_scale=args.replay_latency_scale)
+
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+            report_ids, cursors = [], []
+            cursor = ''
+            for _ in range(10):
+                with urllib.request.urlopen(f"{base_url}/api/reports?limit=100&fields=id&after={cursor}") as response:
+                    page = json.load(response)
+                report_ids.extend(r['id'] for r in page['reports'])
+                cursor = page.get('next_cursor')
+                if not cursor:
+                    break
+                cursors.append(cursor)
+            report_count = len(report_ids)
+            meta['target'] = base_url
+        else:
+            data_dir = args.data_dir or tempfile.mkdtemp(prefix='pinocchio-bench-')
+            os.makedirs(data_dir, exist_ok=True)
+
+            # Configure the app before it is imported; all settings are read at import time
+            os.environ.update({
+                'DATABASE_PATH': os.path.join(data_dir, 'reports.db'),
+                'REPORTS_DIR': os.path.join(data_dir, 'reports'),
+                'ANALYSIS_CACHE_PATH': os.path.join(data_dir, 'analysis_cache.db'),
+                'ANALYSIS_JOBS_PATH': os.path.join(data_dir, 'analysis_jobs.db'),
+                'NEAR_DUPLICATE_PATH': os.path.join(data_dir, 'near_duplicates.db'),
+                'ANALYSIS_BACKEND': 'stub',
+                'STUB_LATENCY_DIST': 'lognormal',
+                'STUB_LATENCY_MS': str(args.stub_latency_ms),
+                'STUB_LATENCY_SPREAD_MS': str(args.stub_latency_spread_ms),
+                'STUB_ERROR_RATE': str(args.stub_error_rate),
+                'STUB_SEED': '42',
+                # Generated pages were never recorded, so they get a recording picked by their hash
+                'REPLAY_MATCH': 'any',
+                'REPLAY_LATENCY_SCALE': str(args.replay_latency_scale),
+                # Measure the app, not the quota: the stub has no rate limit to respect
+                'GEMINI_RPM': '0',
+                'GEMINI_TPM': '0',
+            })
+            if args.cassettes:
+                os.environ.update({'ANALYSIS_BACKEND': 'replay', 'CASSETTE_PATH': args.cassettes})
+            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+            print(f"Seeding {args.reports} reports in {data_dir}...")
+            started = time.perf_counter()
+            report_ids, cursors = seed_database(os.environ['DATABASE_PATH'], args.reports)
+            meta['seed_seconds'] = round(time.perf_counter() - started, 3)
+            report_count = args.reports
+
+            print("Measuring startup...")
+            meta['startup'] = measure_startup()
+
+            import app as pinocchio_app
+            server, base_url = start_server(pinocchio_app.app)
+            meta['target'] = 'in-process werkzeug server'
+
+        if not report_ids and 'report_html' in scenarios:
+            scenarios.remove('report_html')
+        if not cursors and 'list_reports_cursor' in scenarios:
+            scenarios.remove('list_reports_cursor')
+        if not args.cassettes and 'parse_responses' in scenarios:
+            scenarios.remove('parse_responses')
+
+        results = []
+        for scenario in scenarios:
+            if scenario == 'parse_responses':
+                print(f"Running {scenario}...")
+                results.append(run_parse_scenario(args.cassettes, args.requests))
+                continue
+            for concurrency in concurrency_levels:
+                print(f"Running {scenario} at concurrency {concurrency}...")
+                results.append(run_scenario(base_url, scenario, concurrency, args.requests,
+                                            report_ids, cursors, report_count))
+
+        print_table(results)
+        if 'startup' in meta:
+            startup = meta['startup']
+            print(f"\nStartup: import {startup['import_ms']:.1f}ms, create_app {startup['create_app_ms']:.1f}ms, "
+                  f"warm-up {startup['warm_up_ms']:.1f}ms, first request {startup['first_request_ms']:.1f}ms "
+                  f"({startup['first_request_cold_ms']:.1f}ms without warm-up)")
+        report = {"meta": meta, "results": results}
+
+        for path in (args.output, args.save_baseline):
+            if path:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2)
+                print(f"Results written to {path}")
+
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                regressions = compare(results, json.load(f), args.max_regression)
+            if regressions:
+                print("\nRegressions against baseline:")
+                for regression in regressions:
+                    print(f"  {regression}")
+                sys.exit(1)
+            print("\nNo regressions against baseline.")
+    finally:
+        if server:
+            server.shutdown()
+        if data_dir and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
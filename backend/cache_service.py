@@ -0,0 +1,557 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from dotenv import load_dotenv
+from db_service import DATABASE_PATH, ThreadLocalConnections
+from metrics_service import CACHE_LOOKUPS
+
+# Load environment variables
+load_dotenv()
+
+# Cache configuration
+CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', 'True').lower() == 'true'
+CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', os.path.join(os.path.dirname(DATABASE_PATH), 'analysis_cache.db'))
+CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', 24 * 60 * 60))  # Seconds
+CACHE_MEMORY_ITEMS = int(os.getenv('ANALYSIS_CACHE_MEMORY_ITEMS', 1024))
+CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 100000))
+# Seconds between updates of an entry's access time; hits in between are read-only
+CACHE_ACCESS_INTERVAL = float(os.getenv('ANALYSIS_CACHE_ACCESS_INTERVAL', 300))
+
+# Single-flight configuration for concurrent identical analyses
+INFLIGHT_LEASE = float(os.getenv('ANALYSIS_INFLIGHT_LEASE', 60))  # Seconds a leader may hold a key
+INFLIGHT_WAIT = float(os.getenv('ANALYSIS_INFLIGHT_WAIT', 90))  # Seconds a follower waits before computing itself
+INFLIGHT_FAILURE_TTL = float(os.getenv('ANALYSIS_INFLIGHT_FAILURE_TTL', 10))  # Seconds a failed result is shared
+
+if not os.path.isabs(CACHE_PATH):
+    CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_PATH)
+
+# Query parameters that never change the content of a page
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'ref', 'ref_src'}
+
+
+def normalize_url(url):
+    """
+    Normalize a URL so that trivially different links to the same page share a cache key.
+
+    Lowercases the scheme and host, drops default ports, fragments and tracking
+    parameters, sorts the remaining query string and strips trailing slashes.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except (AttributeError, ValueError):
+        return url
+
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip('/') or '/'
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
+
+
+def make_cache_key(url, content):
+    """Build the cache key from the normalized URL and a hash of the analyzed content."""
+    content_hash = hashlib.sha256(content.encode('utf-8', 'replace')).hexdigest()
+    url_hash = hashlib.sha256(normalize_url(url).encode('utf-8', 'replace')).hexdigest()
+    return f"{url_hash[:32]}:{content_hash}"
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for analysis results.
+
+    An in-process LRU sits in front of a SQLite store shared by every worker on
+    the host. Entries expire after `ttl` seconds and the SQLite store is trimmed
+    to `max_entries` rows, evicting the least recently used entries first.
+    Access times are only written once per `access_interval` seconds per
+    entry, so most hits don't take the database's write lock.
+    """
+
+    def __init__(self, db_path=None, ttl=None, memory_items=None, max_entries=None, enabled=None,
+                 access_interval=None):
+        self.db_path = db_path or CACHE_PATH
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.memory_items = CACHE_MEMORY_ITEMS if memory_items is None else memory_items
+        self.max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.enabled = CACHE_ENABLED if enabled is None else enabled
+        self.access_interval = CACHE_ACCESS_INTERVAL if access_interval is None else access_interval
+
+        self.connections = ThreadLocalConnections(self.db_path)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+
+        if self.enabled:
+            self.init_db()
+
+    def get_connection(self):
+        """Get this thread's connection to the cache database (reused, do not close)."""
+        return self.connections.get()
+
+    def init_db(self):
+        """Initialize the cache schema if it doesn't exist."""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.connections.enable_wal()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            key TEXT PRIMARY KEY,
+            url TEXT,
+            result TEXT,
+            created_at REAL,
+            accessed_at REAL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache (accessed_at)')
+
+        # Leases held by the worker currently computing a key, and failed results it shared (see SingleFlight)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_inflight (
+            key TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at REAL,
+            result TEXT
+        )
+        ''')
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(analysis_inflight)")}
+        if 'result' not in columns:
+            cursor.execute("ALTER TABLE analysis_inflight ADD COLUMN result TEXT")
+        conn.commit()
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Returns:
+            dict or None: A copy of the cached result, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+
+        # Tier 1: in-process LRU
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    CACHE_LOOKUPS.labels('memory').inc()
+                    return json.loads(payload)
+                del self._memory[key]
+
+        # Tier 2: SQLite store
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT result, created_at, accessed_at FROM analysis_cache WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            if row and row[1] + self.ttl > now:
+                if row[2] is None or row[2] + self.access_interval <= now:
+                    cursor.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+            elif row:
+                cursor.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error reading analysis cache: {str(e)}")
+            CACHE_LOOKUPS.labels('miss').inc()
+            return None
+
+        if not row:
+            CACHE_LOOKUPS.labels('miss').inc()
+            return None
+
+        self._remember(key, row[0], row[1] + self.ttl)
+        CACHE_LOOKUPS.labels('sqlite').inc()
+        return json.loads(row[0])
+
+    def set(self, key, url, result):
+        """Store a result in both cache tiers."""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        payload = json.dumps(result)
+        self._remember(key, payload, now + self.ttl)
+
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, url, result, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, url, payload, now, now)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error writing analysis cache: {str(e)}")
+            return
+
+        with self._lock:
+            self._writes_since_trim += 1
+            trim = self._writes_since_trim >= 100
+            if trim:
+                self._writes_since_trim = 0
+        if trim:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries and trim the store to `max_entries` rows."""
+        now = time.time()
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl,))
+            cursor.execute('''
+            DELETE FROM analysis_cache WHERE key IN (
+                SELECT key FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            ''', (self.max_entries,))
+            conn.commit()
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error evicting analysis cache entries: {str(e)}")
+
+    def prime(self, limit=None):
+        """
+        Load the most recently used results from the SQLite store into the in-process LRU.
+
+        Returns:
+            int: The number of results loaded
+        """
+        if not self.enabled or self.memory_items <= 0:
+            return 0
+        try:
+            rows = self.get_connection().execute(
+                "SELECT key, result, created_at FROM analysis_cache WHERE created_at >= ? "
+                "ORDER BY accessed_at DESC LIMIT ?",
+                (time.time() - self.ttl, self.memory_items if limit is None else limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error priming analysis cache: {str(e)}")
+            return 0
+        # Least recently used first, so the LRU order matches the store's
+        for key, payload, created_at in reversed(rows):
+            self._remember(key, payload, created_at + self.ttl)
+        return len(rows)
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._memory.clear()
+        if not self.enabled:
+            return
+        conn = self.get_connection()
+        conn.execute("DELETE FROM analysis_cache")
+        conn.commit()
+
+    def _remember(self, key, payload, expires_at):
+        """Insert a serialized result into the in-process LRU."""
+        if self.memory_items <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (expires_at, payload)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+
+class _Call:
+    """An in-progress computation that followers in the same process wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent computations of the same key into a single call.
+
+    Within a process, the first caller for a key becomes the leader and every
+    concurrent caller waits for its result. Across processes (e.g. gunicorn
+    workers) the leader also holds a lease row in the cache database; followers
+    in other workers poll the shared cache until the leader's result appears,
+    the lease is released, or `wait_timeout` passes, in which case they compute
+    the result themselves.
+
+    A result the leader didn't cache (an error or unparsed fallback) is kept
+    on its lease row for `failure_ttl` seconds, so followers in other workers
+    return it as soon as the leader is done instead of waiting for a cached
+    result that never comes.
+    """
+
+    def __init__(self, cache, lease=None, wait_timeout=None, failure_ttl=None):
+        self.cache = cache
+        self.lease = INFLIGHT_LEASE if lease is None else lease
+        self.wait_timeout = INFLIGHT_WAIT if wait_timeout is None else wait_timeout
+        self.failure_ttl = INFLIGHT_FAILURE_TTL if failure_ttl is None else failure_ttl
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, fn, lookup):
+        """
+        Run `fn()` once per key among concurrent callers.
+
+        Args:
+            key: The key identifying identical computations
+            fn: Computes the result; expected to store it in the shared cache
+            lookup: Returns the shared cached result for the key, or None
+
+        Returns:
+            The result of `fn()` or of the concurrent call that was joined
+        """
+        return _result_of(self.stream(key, _as_generator(fn), lookup))
+
+    def stream(self, key, fn, lookup):
+        """
+        Like `run`, for a generator function that returns its result when it finishes.
+
+        The leader yields what `fn()` yields; followers yield nothing. Use as
+        `result = yield from flights.stream(key, fn, lookup)`.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if call.event.wait(self.wait_timeout):
+                if call.result is not None:
+                    return json.loads(json.dumps(call.result))
+                if call.error is not None:
+                    # Retrying at once would hit the same failure; share it instead
+                    raise call.error
+            return (yield from fn())
+
+        try:
+            call.result = yield from self._stream_shared(key, fn, lookup)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _stream_shared(self, key, fn, lookup):
+        """Coordinate with other processes through the lease table."""
+        if not self.cache.enabled:
+            return (yield from fn())
+
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.time() + self.wait_timeout
+        delay = 0.05
+
+        while True:
+            if self._acquire(key, owner):
+                result = None
+                try:
+                    result = yield from fn()
+                    return result
+                finally:
+                    self._release(key, owner, result if result is not None and lookup() is None else None)
+
+            # Another worker is computing this key; wait for its result
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+            result = lookup()
+            if result is None:
+                result = self._failed_result(key)
+            if result is not None:
+                return result
+            if time.time() >= deadline:
+                return (yield from fn())
+
+    def _acquire(self, key, owner):
+        """Try to take the lease for a key, replacing an expired lease."""
+        now = time.time()
+        try:
+            conn = self.cache.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM analysis_inflight WHERE key = ? AND expires_at < ?", (key, now))
+            cursor.execute(
+                "INSERT OR IGNORE INTO analysis_inflight (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, owner, now + self.lease)
+            )
+            acquired = cursor.rowcount == 1
+            conn.commit()
+            return acquired
+        except sqlite3.Error as e:
+            self.cache.get_connection().rollback()
+            print(f"Error acquiring in-flight lease: {str(e)}")
+            return True
+
+    def _release(self, key, owner, failed_result=None):
+        """Release a lease held by `owner`, leaving an uncached result behind for followers to share."""
+        try:
+            conn = self.cache.get_connection()
+            if failed_result is None:
+                conn.execute("DELETE FROM analysis_inflight WHERE key = ? AND owner = ?", (key, owner))
+            else:
+                conn.execute(
+                    "UPDATE analysis_inflight SET result = ?, expires_at = ? WHERE key = ? AND owner = ?",
+                    (json.dumps(failed_result), time.time() + self.failure_ttl, key, owner)
+                )
+            conn.commit()
+        except sqlite3.Error as e:
+            self.cache.get_connection().rollback()
+            print(f"Error releasing in-flight lease: {str(e)}")
+
+    def _failed_result(self, key):
+        """The uncached result a leader in another process shared for a key, or None."""
+        try:
+            row = self.cache.get_connection().execute(
+                "SELECT result FROM analysis_inflight WHERE key = ? AND result IS NOT NULL AND expires_at >= ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading in-flight lease: {str(e)}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def release_orphaned(self):
+        """
+        Release the leases of processes on this machine that are no longer running.
+
+        A process killed mid-analysis leaves its leases behind, and until they
+        expire other processes wait on keys nobody is computing.
+
+        Returns:
+            int: The number of leases released
+        """
+        if not self.cache.enabled:
+            return 0
+        try:
+            conn = self.cache.get_connection()
+            owners = [owner for (owner,) in conn.execute("SELECT DISTINCT owner FROM analysis_inflight")]
+            orphaned = [owner for owner in owners if not _process_running(int(owner.split(':', 1)[0]))]
+            conn.executemany("DELETE FROM analysis_inflight WHERE owner = ?", [(owner,) for owner in orphaned])
+            conn.commit()
+            return len(orphaned)
+        except sqlite3.Error as e:
+            self.cache.get_connection().rollback()
+            print(f"Error releasing orphaned in-flight leases: {str(e)}")
+            return 0
+
+
+def _as_generator(fn):
+    """A generator function that yields nothing and returns `fn()`, for `SingleFlight.stream`."""
+    def generate():
+        return fn()
+        yield
+    return generate
+
+
+def _result_of(generator):
+    """Run a generator to completion and return its return value."""
+    try:
+        while True:
+            next(generator)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    SingleFlight for coroutines.
+
+    Concurrent callers in the event loop await the leader's task, and the
+    cross-process lease is polled with `asyncio.sleep`. Lease and cache
+    lookups touch SQLite, so they run in the loop's default executor.
+    """
+
+    async def run(self, key, fn, lookup):
+        """
+        Await `fn()` once per key among concurrent callers.
+
+        Args:
+            key: The key identifying identical computations
+            fn: Coroutine function computing the result; expected to store it in the shared cache
+            lookup: Coroutine function returning the shared cached result for the key, or None
+
+        Returns:
+            The result of `fn()` or of the concurrent call that was joined
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), self.wait_timeout)
+            except asyncio.TimeoutError:
+                return await fn()
+            return json.loads(json.dumps(result))
+
+        # Shielded, so followers still get the result if the leader's request is cancelled
+        task = asyncio.ensure_future(self._run_shared(key, fn, lookup))
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run_shared(self, key, fn, lookup):
+        """Coordinate with other processes through the lease table."""
+        if not self.cache.enabled:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.time() + self.wait_timeout
+        delay = 0.05
+
+        while True:
+            if await loop.run_in_executor(None, self._acquire, key, owner):
+                result = None
+                try:
+                    result = await fn()
+                    return result
+                finally:
+                    failed_result = result if result is not None and await lookup() is None else None
+                    await loop.run_in_executor(None, self._release, key, owner, failed_result)
+
+            # Another worker is computing this key; wait for its result
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+            result = await lookup()
+            if result is None:
+                result = await loop.run_in_executor(None, self._failed_result, key)
+            if result is not None:
+                return result
+            if time.time() >= deadline:
+                return await fn()
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from db_service import DATABASE_PATH, ThreadLocalConnections
+
+# Load environment variables
+load_dotenv()
+
+# Recorded model responses for the record and replay backends
+CASSETTE_PATH = os.getenv('CASSETTE_PATH', os.path.join(os.path.dirname(DATABASE_PATH), 'cassettes.db'))
+
+if not os.path.isabs(CASSETTE_PATH):
+    CASSETTE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), CASSETTE_PATH)
+
+# Response fields that describe the HTTP exchange rather than the answer
+VOLATILE_FIELDS = {'sdk_http_response', 'automatic_function_calling_history'}
+
+
+class CassetteMissError(LookupError):
+    """Raised when the replay backend has no recording for a prompt."""
+
+
+def cassette_key(model, structured, structured_grounding, prompt):
+    """Key of a recording: the prompt and every setting that changes the request sent with it."""
+    request = json.dumps([model, structured, structured_grounding, prompt])
+    return hashlib.sha256(request.encode('utf-8', 'replace')).hexdigest()
+
+
+def dump_response(response):
+    """A Gemini response (or streamed chunk) as plain JSON data, grounding metadata included."""
+    if isinstance(response, dict):
+        return response
+    return response.model_dump(mode='json', exclude_none=True, exclude=VOLATILE_FIELDS)
+
+
+def load_response(data):
+    """
+    Rebuild a response from its JSON data.
+
+    Returns attribute-access objects shaped like the SDK's response types,
+    so replay doesn't need google-genai installed and fields missing from
+    the recording read as absent, as they do on a live response.
+    """
+    if isinstance(data, dict):
+        return SimpleNamespace(**{k: load_response(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return [load_response(v) for v in data]
+    return data
+
+
+class CassetteStore:
+    """
+    On-disk store of recorded model responses.
+
+    Each recording holds the full responses of one model call, as JSON
+    compressed with zlib, with the call's latency and, for streamed calls,
+    when each chunk arrived. Recordings are keyed by `cassette_key` and the
+    kind of call ('generate' or 'stream'); recording a call again replaces
+    the previous recording.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or CASSETTE_PATH
+        self.connections = ThreadLocalConnections(self.db_path)
+        self.init_db()
+
+    def get_connection(self):
+        """Get this thread's connection to the cassette database (reused, do not close)."""
+        return self.connections.get()
+
+    def init_db(self):
+        """Initialize the cassette schema if it doesn't exist."""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.connections.enable_wal()
+        conn = self.get_connection()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS cassettes (
+            key TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            model TEXT,
+            prompt_chars INTEGER,
+            responses BLOB NOT NULL,
+            latency REAL NOT NULL,
+            chunk_offsets TEXT,
+            recorded_at REAL,
+            PRIMARY KEY (key, kind)
+        ) WITHOUT ROWID
+        ''')
+        conn.commit()
+
+    def record(self, key, kind, model, prompt, responses, latency, chunk_offsets=None):
+        """
+        Store the responses of one model call.
+
+        Args:
+            key (str): The cassette key of the call
+            kind (str): 'generate' or 'stream'
+            model (str): The model that answered
+            prompt (str): The prompt (only its length is stored)
+            responses (list): The response, or every streamed chunk, as SDK objects or dumped data
+            latency (float): Seconds the call took
+            chunk_offsets (list): Seconds from the start of the call to each streamed chunk
+        """
+        payload = zlib.compress(json.dumps([dump_response(r) for r in responses]).encode('utf-8'))
+        try:
+            conn = self.get_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cassettes (key, kind, model, prompt_chars, responses, latency, chunk_offsets, "
+                "recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, model, len(prompt), payload, latency,
+                 json.dumps(chunk_offsets) if chunk_offsets is not None else None, time.time())
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error recording cassette: {str(e)}")
+
+    def get(self, key, kind):
+        """
+        Load a recording, falling back to the other kind of call for the same prompt.
+
+        Returns:
+            dict or None: kind, responses (JSON data), latency and chunk_offsets, or None if nothing was recorded
+        """
+        rows = self.get_connection().execute(
+            "SELECT kind, responses, latency, chunk_offsets FROM cassettes WHERE key = ?", (key,)
+        ).fetchall()
+        if not rows:
+            return None
+        row = next((row for row in rows if row[0] == kind), rows[0])
+        return self._recording(row)
+
+    def keys(self):
+        """Keys of every recording, in a stable order."""
+        return [key for (key,) in self.get_connection().execute("SELECT DISTINCT key FROM cassettes ORDER BY key")]
+
+    def __iter__(self):
+        """Every recording, one at a time."""
+        for row in self.get_connection().execute(
+                "SELECT kind, responses, latency, chunk_offsets FROM cassettes ORDER BY key, kind"):
+            yield self._recording(row)
+
+    def __len__(self):
+        return self.get_connection().execute("SELECT COUNT(*) FROM cassettes").fetchone()[0]
+
+    @staticmethod
+    def _recording(row):
+        kind, payload, latency, chunk_offsets = row
+        return {
+            'kind': kind,
+            'responses': json.loads(zlib.decompress(payload)),
+            'latency': latency,
+            'chunk_offsets': json.loads(chunk_offsets) if chunk_offsets else None,
+        }
@@ -0,0 +1,127 @@
+import re
+
+# Rough characters-per-token ratio for English text with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _segments(content, max_chars):
+    """Yield paragraphs, splitting any that exceed `max_chars` on sentences and then hard limits."""
+    for paragraph in PARAGRAPH_BREAK.split(content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                yield sentence[:max_chars]
+                sentence = sentence[max_chars:]
+            if sentence:
+                yield sentence
+
+
+def split_content(content, max_tokens, max_chunks):
+    """
+    Split page content into chunks that each fit a token budget.
+
+    Chunks break on paragraph boundaries where possible, then on sentence
+    boundaries. Content that already fits the budget is returned unchanged as
+    a single chunk.
+
+    Args:
+        content (str): The text content of the page
+        max_tokens (int): Token budget per chunk
+        max_chunks (int): Maximum number of chunks; content beyond them is dropped
+
+    Returns:
+        list: The content chunks, in page order
+    """
+    if estimate_tokens(content) <= max_tokens:
+        return [content]
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = ""
+
+    for segment in _segments(content, max_chars):
+        if current and len(current) + 2 + len(segment) > max_chars:
+            chunks.append(current)
+            current = ""
+            if len(chunks) == max_chunks:
+                return chunks
+        current = f"{current}\n\n{segment}" if current else segment
+
+    if current and len(chunks) < max_chunks:
+        chunks.append(current)
+    return chunks
+
+
+def merge_results(results, weights, parts=None, total=None):
+    """
+    Merge per-chunk analysis results into one result with the same schema.
+
+    The page score blends the length-weighted mean of the chunk scores with
+    the highest chunk score, so that one misleading section is not averaged
+    away by accurate filler. Misinformation is detected if any chunk found it.
+    The summary and additional context come from the first chunk, reports are
+    concatenated per part and sources are de-duplicated in order.
+
+    Args:
+        results (list): Per-chunk result dicts, in page order
+        weights (list): Per-chunk weights, e.g. chunk lengths
+        parts (list): Position of each result's chunk on the page, from 1 (default: 1 to len(results));
+            results of failed chunks may be left out
+        total (int): Number of chunks on the page (default: len(results))
+
+    Returns:
+        dict: The merged analysis result
+    """
+    scored = [(r['misinformation_score'], w) for r, w in zip(results, weights)
+              if isinstance(r.get('misinformation_score'), (int, float))]
+    if scored:
+        mean = sum(score * w for score, w in scored) / (sum(w for _, w in scored) or 1)
+        score = round((mean + max(score for score, _ in scored)) / 2, 1)
+    else:
+        score = None
+
+    detected = [r.get('misinformation_detected') for r in results]
+    if any(d is True for d in detected):
+        misinformation_detected = True
+    elif any(d is False for d in detected):
+        misinformation_detected = False
+    else:
+        misinformation_detected = None
+
+    parts = parts or range(1, len(results) + 1)
+    total = total or len(results)
+    reports = [f"Part {i} of {total}: {r['report']}" for i, r in zip(parts, results) if r.get('report')]
+
+    sources = []
+    source_objects = []
+    for r in results:
+        for source in r.get('sources') or []:
+            if source not in sources:
+                sources.append(source)
+        for source in r.get('source_objects') or []:
+            if all(s['url'] != source['url'] for s in source_objects):
+                source_objects.append(source)
+
+    return {
+        "summary": next((r['summary'] for r in results if r.get('summary')), None),
+        "misinformation_detected": misinformation_detected,
+        "misinformation_score": score,
+        "report": "\n\n".join(reports) if reports else None,
+        "additional_context": next((r['additional_context'] for r in results if r.get('additional_context')), None),
+        "sources": sources,
+        "source_objects": source_objects,
+        "chunks_analyzed": total
+    }
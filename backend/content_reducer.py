@@ -0,0 +1,172 @@
+import re
+import unicodedata
+from content_chunker import CHARS_PER_TOKEN, estimate_tokens
+
+# Invisible characters that pages leave in copied text
+INVISIBLE = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u00ad'))
+
+INLINE_SPACE = re.compile(r'[^\S\n]+')
+BLANK_LINES = re.compile(r'\n{3,}')
+NON_WORD = re.compile(r'\W+')
+
+# Page chrome: a line is boilerplate if every part of it (split on separators such as "|") is one of these
+# phrases, or if it is a fragment of at most BOILERPLATE_MAX_WORDS words mentioning one of the keywords
+BOILERPLATE_PHRASE = re.compile(
+    r'(?:accept(?: all)?(?: cookies)?|reject all|cookies?(?: (?:settings|preferences|policy))?|consent|'
+    r'manage (?:preferences|cookies|consent)|privacy(?: (?:policy|settings))?|terms(?: (?:of (?:use|service)|'
+    r'and conditions))?|all rights reserved|sign (?:in|up|out)|log ?(?:in|out)|register|'
+    r'subscribe(?: (?:now|today))?|(?:sign up for )?(?:our |the )?newsletter|advertisement|sponsored|'
+    r'share(?: (?:this(?: article| story)?|on \w+))?|follow us(?: on \w+)?|skip to (?:main )?content|back to top|'
+    r'related (?:articles|posts|stories)|read more|continue reading)',
+    re.IGNORECASE
+)
+BOILERPLATE_KEYWORD = re.compile(
+    r'\b(?:cookies?|consent|privacy|subscribe|newsletter|advertisement|sign (?:in|up)|log ?in|'
+    r'share (?:this|on)|follow us|read more)\b',
+    re.IGNORECASE
+)
+BOILERPLATE_MAX_WORDS = 3
+BOILERPLATE_SEPARATORS = re.compile(r'\s*(?:[|•·/]|\s[-–—]\s)\s*')
+# Copyright notices, e.g. "© 2025 Example Media. All rights reserved."
+COPYRIGHT = re.compile(r'^(?:©|\(c\)|copyright\s+(?:©\s*)?\d{4}\b)', re.IGNORECASE)
+COPYRIGHT_MAX_CHARS = 200
+
+# A heading that starts the comment section, e.g. "42 Comments" or "Leave a Reply"
+COMMENTS_HEADING = re.compile(
+    r'^(?:\d+\s+)?(?:comments?|responses?|replies|leave a (?:reply|comment)|join the (?:discussion|conversation)|'
+    r'add a comment|reader comments)\s*:?$',
+    re.IGNORECASE
+)
+COMMENTS_MIN_POSITION = 0.3  # Only trust the heading past this fraction of the page
+
+# Navigation menus: runs of at least NAV_MIN_RUN menu terms, i.e. title-case lines of at most NAV_MAX_WORDS
+# words without punctuation or a list bullet ("World", "Sign In", "Health & Science")
+NAV_MAX_WORDS = 3
+NAV_MIN_RUN = 5
+SENTENCE_PUNCTUATION = tuple('.!?:;"\'”)')
+LIST_BULLETS = tuple('-*•–—·▪') + tuple('0123456789')
+
+
+def normalize_whitespace(text):
+    """Normalize Unicode and line endings, collapse runs of spaces and blank lines, and strip every line."""
+    text = unicodedata.normalize('NFKC', text).translate(INVISIBLE)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = '\n'.join(INLINE_SPACE.sub(' ', line).strip() for line in text.split('\n'))
+    return BLANK_LINES.sub('\n\n', text).strip()
+
+
+def _key(text):
+    """Comparison key that ignores case, punctuation and spacing."""
+    return NON_WORD.sub(' ', text.lower()).strip()
+
+
+def _is_boilerplate(line):
+    """Whether a line is page chrome rather than text: a banner, prompt or notice, not a sentence mentioning one."""
+    if len(line) <= COPYRIGHT_MAX_CHARS and COPYRIGHT.match(line):
+        return True
+    if (len(line.split()) <= BOILERPLATE_MAX_WORDS and not line.endswith(SENTENCE_PUNCTUATION)
+            and BOILERPLATE_KEYWORD.search(line)):
+        return True
+    parts = [part.strip(' .!:') for part in BOILERPLATE_SEPARATORS.split(line)]
+    return all(BOILERPLATE_PHRASE.fullmatch(part) for part in parts if part) and any(parts)
+
+
+def _is_nav_line(line):
+    words = line.split()
+    return (0 < len(words) <= NAV_MAX_WORDS and not line.endswith(SENTENCE_PUNCTUATION)
+            and not line.startswith(LIST_BULLETS) and all(word[0].isupper() or not word[0].isalpha() for word in words))
+
+
+def _drop_nav_runs(lines):
+    """Drop runs of menu terms: menus, section lists and link bars."""
+    kept = []
+    run = []
+    for line in lines + ['']:
+        if _is_nav_line(line):
+            run.append(line)
+            continue
+        if len(run) < NAV_MIN_RUN:
+            kept.extend(run)
+        run = []
+        kept.append(line)
+    return kept[:-1]
+
+
+def _cut_comments(lines):
+    """Drop the comment section: everything after a comments heading in the later part of the page."""
+    total = sum(len(line) for line in lines) or 1
+    position = 0
+    for i, line in enumerate(lines):
+        if position / total >= COMMENTS_MIN_POSITION and COMMENTS_HEADING.match(line):
+            return lines[:i]
+        position += len(line)
+    return lines
+
+
+def _fit_budget(text, max_tokens):
+    """Cut text to a token budget, on a paragraph boundary where possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    cut = text.rfind('\n\n', 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars].rstrip()
+
+
+def reduce_content(content, max_tokens=None):
+    """
+    Shrink page text to the part worth sending to the model.
+
+    Whitespace is normalized, a block repeating the block before it and lines
+    repeated within a block are kept once, boilerplate lines
+    (cookie banners, sign-in and share prompts, copyright notices),
+    navigation menus and the comment section are dropped, and the result is
+    cut to `max_tokens` if it still exceeds it.
+
+    Args:
+        content (str): The text content of the page
+        max_tokens (int): Token budget for the reduced text, or None for no limit
+
+    Returns:
+        tuple: (reduced text, stats) where stats holds the original and reduced
+            token estimates, the compression ratio and whether the budget cut text
+    """
+    original_tokens = estimate_tokens(content)
+    text = normalized = normalize_whitespace(content)
+
+    # Repeats are only dropped next to each other: a quote or claim repeated later on the page is kept
+    previous_block = None
+    blocks = []
+    for block in text.split('\n\n'):
+        block_key = _key(block)
+        if not block_key or block_key == previous_block:
+            continue
+        previous_block = block_key
+
+        seen_lines = set()
+        lines = []
+        for line in block.split('\n'):
+            line_key = _key(line)
+            if not line_key or line_key in seen_lines:
+                continue
+            if _is_boilerplate(line):
+                continue
+            seen_lines.add(line_key)
+            lines.append(line)
+        if lines:
+            blocks.append(lines)
+
+    # Paragraph breaks are kept as empty lines so the line-level passes see the whole page
+    lines = [line for block in blocks for line in block + ['']][:-1]
+    lines = _cut_comments(_drop_nav_runs(lines))
+    # Never send an empty page because every line looked like boilerplate
+    text = BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip() or normalized
+
+    truncated = max_tokens is not None and estimate_tokens(text) > max_tokens
+    if truncated:
+        text = _fit_budget(text, max_tokens)
+
+    reduced_tokens = estimate_tokens(text)
+    return text, {
+        'original_tokens': original_tokens,
+        'reduced_tokens': reduced_tokens,
+        'compression_ratio': round(original_tokens / reduced_tokens, 2) if reduced_tokens else 1.0,
+        'truncated': truncated,
+    }
@@ -1,8 +1,20 @@
 import os
+import re
+import json
+import base64
 import sqlite3
 import uuid
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from urllib.parse import urlsplit
+from report_store import ReportStore
+from report_stats import ReportStats
+from report_changes import (ReportChanges, SUMMARY_FIELDS, OPTIONAL_SUMMARY_FIELDS, encode_change_cursor,
+                            decode_since)
+from html_text import html_to_text
+from metrics_service import DB_LATENCY, timed
 
 # Load environment variables
 load_dotenv()
@@ -11,6 +23,16 @@ load_dotenv()
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'reports.db')
 REPORTS_DIR = os.getenv('REPORTS_DIR', 'reports')
 
+# SQLite tuning, applied to every connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# Bulk ingest: reports per transaction and threads writing report files
+INGEST_BATCH_SIZE = int(os.getenv('REPORT_INGEST_BATCH_SIZE', 1000))
+INGEST_WORKERS = int(os.getenv('REPORT_INGEST_WORKERS', 8))
+
 # Ensure paths are absolute
 if not os.path.isabs(DATABASE_PATH):
     DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATABASE_PATH)
@@ -18,18 +40,129 @@ if not os.path.isabs(DATABASE_PATH):
 if not os.path.isabs(REPORTS_DIR):
     REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), REPORTS_DIR)
 
-# Ensure directories exist
-if not os.path.exists(os.path.dirname(DATABASE_PATH)):
-    os.makedirs(os.path.dirname(DATABASE_PATH))
-    
-if not os.path.exists(REPORTS_DIR):
-    os.makedirs(REPORTS_DIR)
+# Columns of the reports table that can be requested with `fields`
+REPORT_FIELDS = ('id', 'timestamp', 'url', 'title', 'domain', 'score', 'file_path')
+
+
+def extract_domain(url):
+    """The host of a URL without a leading "www.", or None if it has none."""
+    try:
+        host = urlsplit(url or '').hostname
+    except ValueError:
+        return None
+    if host and host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+def normalize_timestamp(value):
+    """
+    A report timestamp in the format `save_report` writes: naive server-local time, 'YYYY-MM-DDTHH:MM:SS.ffffff'.
+
+    Pagination cursors and the statistics buckets compare timestamps as text,
+    so ingested timestamps with an offset, a space separator or no time part
+    are rewritten to sort with the rest. Timestamps with an offset are
+    converted to the server's time zone (UTC on the usual deployments).
+
+    Raises:
+        ValueError: If the value isn't an ISO 8601 date or date and time
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"Expected an ISO 8601 string, got {type(value).__name__}")
+    timestamp = datetime.datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp.isoformat(timespec='microseconds')
+
+
+def build_search_query(text):
+    """
+    Turn free text into a safe FTS5 query.
+
+    Every word must match; the last word also matches as a prefix so results
+    update while the user is still typing.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def encode_cursor(timestamp, report_id):
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps([timestamp, report_id]).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        timestamp, report_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError, base64.binascii.Error):
+        raise ValueError("Invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(report_id, str):
+        raise ValueError("Invalid cursor")
+    return timestamp, report_id
+
+
+class ThreadLocalConnections:
+    """
+    Reusable SQLite connections, one per thread.
+
+    Connections are opened on first use in each thread and kept for the life
+    of the thread, so requests served by the same worker thread share one
+    connection. A connection inherited across a fork is never reused; the
+    child process opens its own.
+    """
+
+    def __init__(self, db_path, row_factory=None):
+        self.db_path = db_path
+        self.row_factory = row_factory
+        self._local = threading.local()
+
+    def get(self):
+        """Get this thread's connection, opening it if needed."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            conn.row_factory = self.row_factory
+            conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+            conn.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}")
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enable_wal(self):
+        """Switch the database to write-ahead logging so readers don't block on writers."""
+        self.get().execute("PRAGMA journal_mode = WAL")
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
 
 class ReportDatabase:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, reports_dir=None):
         """Initialize the database connection."""
         self.db_path = db_path or DATABASE_PATH
-        self.reports_dir = REPORTS_DIR  # Add this line to store REPORTS_DIR
+        self.reports_dir = reports_dir or REPORTS_DIR
+        self.connections = ThreadLocalConnections(self.db_path, row_factory=sqlite3.Row)
+        self.store = ReportStore(self.reports_dir)
+        self.stats = ReportStats()
+        self.changes = ReportChanges()
+        self._changes_since_prune = 0
         self.init_db()
     
     @property
@@ -38,11 +171,20 @@ class ReportDatabase:
         return self.reports_dir
         
     def get_connection(self):
-        """Get a database connection."""
-        return sqlite3.connect(self.db_path)
+        """Get this thread's database connection (reused, do not close)."""
+        return self.connections.get()
+
+    def close(self):
+        """Close the current thread's database connection."""
+        self.connections.close()
         
     def init_db(self):
         """Initialize the database schema if it doesn't exist."""
+        for directory in (os.path.dirname(self.db_path), self.reports_dir):
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+        self.connections.enable_wal()
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -57,10 +199,46 @@ class ReportDatabase:
             file_path TEXT
         )
         ''')
+
+        # Indexes for listing newest first (with a unique tie-breaker), and lookups by URL and score
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports (timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_url ON reports (url)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_score ON reports (score)')
+
+        # Stored files are shared between identical reports; this finds the remaining references
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_file_path ON reports (file_path)')
+
+        # Columns added after the original schema
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(reports)")}
+        if 'domain' not in columns:
+            cursor.execute("ALTER TABLE reports ADD COLUMN domain TEXT")
+        if 'search_rowid' not in columns:
+            cursor.execute("ALTER TABLE reports ADD COLUMN search_rowid INTEGER")
+
+        # Full-text index over title, URL, domain and report text (rowid is reports.search_rowid)
+        try:
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+                title, url, domain, body, report_id UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+            ''')
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search is unavailable (SQLite without FTS5): {str(e)}")
+            self.search_enabled = False
+
+        # Log of saved and deleted reports for delta sync of the summary feed
+        self.changes.init_schema(conn)
+
+        # Per-domain, per-day aggregates; built from existing reports the first time
+        if self.stats.init_schema(conn):
+            conn.commit()
+            self.rebuild_stats()
         
         conn.commit()
-        conn.close()
         
+    @timed(DB_LATENCY, operation='save_report')
     def save_report(self, url, title, score, html_content):
         """
         Save a report to the database and file system.
@@ -76,81 +254,445 @@ class ReportDatabase:
         """
         # Generate unique ID for the report
         report_id = str(uuid.uuid4())
-        timestamp = datetime.datetime.now().isoformat()
+        timestamp = datetime.datetime.now().isoformat(timespec='microseconds')
         
-        # Create the file name and save the HTML
-        file_name = f"report_{report_id}.html"
-        file_path = os.path.join(REPORTS_DIR, file_name)
+        # Save the HTML compressed, sharing the file with identical reports
+        file_path = self.store.put(html_content)
         
-        # Save HTML file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        # Save record to database
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO reports (id, timestamp, url, title, score, file_path) VALUES (?, ?, ?, ?, ?, ?)",
-            (report_id, timestamp, url, title, score, file_path)
-        )
-        conn.commit()
-        conn.close()
+        domain = extract_domain(url)
         
+        # Save record to database, along with its search index entry
+        with self.get_connection() as conn:
+            search_rowid = self._index_report(conn, report_id, url, title, domain, html_content)
+            conn.execute(
+                "INSERT INTO reports (id, timestamp, url, title, domain, score, file_path, search_rowid) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (report_id, timestamp, url, title, domain, score, file_path, search_rowid)
+            )
+            self.stats.add(conn, domain, timestamp, score)
+            self.changes.record(conn, [report_id])
+
+            # A concurrent delete of the last identical report may have removed the file
+            if not os.path.exists(file_path):
+                self.store.put(html_content)
+
+        self._count_changes(1)
         return {
             "report_id": report_id,
             "timestamp": timestamp,
             "file_path": file_path
         }
         
+    def ingest_reports(self, reports, batch_size=None, workers=None):
+        """
+        Save many reports, one transaction per batch.
+
+        Report files are written in parallel and rows are inserted with
+        executemany, so a batch costs one commit instead of one per report.
+        Each report is a dict with `url`, `title`, `score` and `html`, and
+        optionally the `id` and `timestamp` of a report being migrated.
+
+        Args:
+            reports: Iterable of report dicts, consumed lazily
+            batch_size: Reports per transaction
+            workers: Threads writing report files
+
+        Yields:
+            list: The saved reports of each committed batch, as returned by save_report
+
+        Raises:
+            ValueError: If a report is missing a field; earlier batches stay committed
+        """
+        batch_size = batch_size or INGEST_BATCH_SIZE
+        with ThreadPoolExecutor(max_workers=workers or INGEST_WORKERS) as executor:
+            batch = []
+            for index, report in enumerate(reports):
+                batch.append(self._prepare_report(index, report))
+                if len(batch) >= batch_size:
+                    yield self._ingest_batch(batch, executor)
+                    batch = []
+            if batch:
+                yield self._ingest_batch(batch, executor)
+
+    def save_reports(self, reports, batch_size=None, workers=None):
+        """
+        Save many reports at once. See ingest_reports.
+
+        Returns:
+            list: Report information including ID, in input order
+        """
+        return [saved for batch in self.ingest_reports(reports, batch_size, workers) for saved in batch]
+
+    @staticmethod
+    def _prepare_report(index, report):
+        """Validate one report for bulk ingest and fill in its ID, timestamp and domain."""
+        if not isinstance(report, dict) or any(field not in report for field in ('url', 'title', 'score', 'html')):
+            raise ValueError(f"Report {index} is missing required fields 'url', 'title', 'score' and 'html'")
+        try:
+            timestamp = normalize_timestamp(report.get('timestamp') or datetime.datetime.now().isoformat())
+        except ValueError:
+            raise ValueError(f"Report {index} has an invalid timestamp, expected ISO 8601")
+        return dict(report, id=str(report.get('id') or uuid.uuid4()), timestamp=timestamp,
+                    domain=extract_domain(report['url']))
+
+    @timed(DB_LATENCY, operation='ingest_batch')
+    def _ingest_batch(self, batch, executor):
+        """Write the files of a batch in parallel, then insert its rows in one transaction."""
+        file_paths = list(executor.map(self.store.put, (report['html'] for report in batch)))
+        bodies = list(executor.map(html_to_text, (report['html'] for report in batch))) if self.search_enabled else None
+
+        conn = self.get_connection()
+        with conn:
+            # Take the write lock up front so the search rowids below stay ours
+            conn.execute("BEGIN IMMEDIATE")
+            search_rowids = [None] * len(batch)
+            if self.search_enabled:
+                first = conn.execute("SELECT IFNULL(MAX(rowid), 0) + 1 FROM reports_fts").fetchone()[0]
+                search_rowids = list(range(first, first + len(batch)))
+                conn.executemany(
+                    "INSERT INTO reports_fts (rowid, title, url, domain, body, report_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(rowid, r['title'], r['url'], r['domain'], body, r['id'])
+                     for rowid, r, body in zip(search_rowids, batch, bodies)]
+                )
+            conn.executemany(
+                "INSERT INTO reports (id, timestamp, url, title, domain, score, file_path, search_rowid) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(r['id'], r['timestamp'], r['url'], r['title'], r['domain'], r['score'], path, rowid)
+                 for r, path, rowid in zip(batch, file_paths, search_rowids)]
+            )
+            self.stats.add_many(conn, [(r['domain'], r['timestamp'], r['score']) for r in batch])
+            self.changes.record(conn, [r['id'] for r in batch])
+
+            # A concurrent delete of the last identical report may have removed a file
+            for report, file_path in zip(batch, file_paths):
+                if not os.path.exists(file_path):
+                    self.store.put(report['html'])
+
+        self._count_changes(len(batch))
+        return [{"report_id": r['id'], "timestamp": r['timestamp'], "file_path": path}
+                for r, path in zip(batch, file_paths)]
+
+    def _index_report(self, conn, report_id, url, title, domain, html_content):
+        """
+        Add a report to the full-text index within the caller's transaction.
+
+        Returns:
+            int or None: The rowid of the index entry
+        """
+        if not self.search_enabled:
+            return None
+        cursor = conn.execute(
+            "INSERT INTO reports_fts (title, url, domain, body, report_id) VALUES (?, ?, ?, ?, ?)",
+            (title, url, domain, html_to_text(html_content), report_id)
+        )
+        return cursor.lastrowid
+
+    @timed(DB_LATENCY, operation='get_report')
     def get_report(self, report_id):
         """Get a report by ID."""
-        conn = self.get_connection()
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM reports WHERE id = ?", (report_id,))
+        cursor = self.get_connection().execute(f"SELECT {', '.join(REPORT_FIELDS)} FROM reports WHERE id = ?", (report_id,))
         report = cursor.fetchone()
-        conn.close()
         
         if report:
             return dict(report)
         return None
         
-    def get_reports(self, limit=100, offset=0):
-        """Get a list of reports."""
+    @timed(DB_LATENCY, operation='get_reports')
+    def get_reports(self, limit=100, offset=0, after=None, fields=None):
+        """
+        Get a list of reports, newest first.
+
+        Args:
+            limit: Maximum number of reports to return
+            offset: Number of reports to skip (ignored when `after` is given)
+            after: Cursor of the last report of the previous page
+            fields: Columns to return (default: all of REPORT_FIELDS)
+
+        Returns:
+            list: Report dicts
+        """
+        return self.get_reports_page(limit, offset, after, fields)[0]
+
+    @timed(DB_LATENCY, operation='get_reports_page')
+    def get_reports_page(self, limit=100, offset=0, after=None, fields=None):
+        """
+        Get a page of reports, newest first, using keyset pagination when `after` is given.
+
+        Seeking from a cursor walks the timestamp index, so every page costs the
+        same regardless of how deep it is.
+
+        Returns:
+            tuple: (reports, next_cursor), where next_cursor is None on the last page
+
+        Raises:
+            ValueError: If `after` or `fields` is invalid
+        """
+        fields = list(fields or REPORT_FIELDS)
+        unknown = [f for f in fields if f not in REPORT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        # The sort key is always selected so the next cursor can be built
+        columns = fields + [c for c in ('timestamp', 'id') if c not in fields]
+        query = f"SELECT {', '.join(columns)} FROM reports"
+        params = []
+        if after:
+            query += " WHERE (timestamp, id) < (?, ?)"
+            params.extend(decode_cursor(after))
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+        if not after and offset:
+            query += " OFFSET ?"
+            params.append(offset)
+
+        rows = self.get_connection().execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) == limit and rows:
+            next_cursor = encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+        return [{f: row[f] for f in fields} for row in rows], next_cursor
+
+    def feed_position(self):
+        """The position of the latest saved or deleted report in the change log; changes whenever the feed does."""
+        return self.changes.position(self.get_connection())
+
+    @timed(DB_LATENCY, operation='get_report_feed')
+    def get_report_feed(self, since=None, limit=1000, fields=None):
+        """
+        Get the summary feed: a snapshot of the newest reports, or the changes since a previous sync.
+
+        Without `since` (or when changes that old were already pruned) the
+        newest `limit` reports are returned with `reset` set, and the client
+        replaces what it has. Otherwise `reports` holds the reports saved and
+        `deleted` the IDs of reports deleted since then, at most `limit`
+        changes per call; `has_more` means the client should fetch again
+        with the new cursor.
+
+        Args:
+            since: A cursor from a previous response, or an ISO 8601 timestamp
+            limit: Maximum number of reports (snapshot) or changes (delta) to return
+            fields: Columns to return (default: SUMMARY_FIELDS; `url` may be added)
+
+        Returns:
+            dict: reports, deleted, cursor, reset and has_more
+
+        Raises:
+            ValueError: If `since` or `fields` is invalid
+        """
+        fields = list(fields or SUMMARY_FIELDS)
+        unknown = [f for f in fields if f not in SUMMARY_FIELDS + OPTIONAL_SUMMARY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+
         conn = self.get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM reports ORDER BY timestamp DESC LIMIT ? OFFSET ?", 
-            (limit, offset)
-        )
-        reports = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return reports
+        # Read the snapshot or changes and the position they're as of in one transaction
+        with conn:
+            conn.execute("BEGIN")
+            position = self.changes.position(conn)
+            start = self.changes.start_of(conn, decode_since(since)) if since else None
+            if start is not None and start <= position:
+                reports, deleted, last_seq, has_more = self.changes.changes(conn, start, fields, limit)
+                return {"reports": reports, "deleted": deleted, "cursor": encode_change_cursor(last_seq),
+                        "reset": False, "has_more": has_more}
+
+            rows = conn.execute(
+                f"SELECT {', '.join(fields)} FROM reports ORDER BY timestamp DESC, id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return {"reports": [dict(row) for row in rows], "deleted": [], "cursor": encode_change_cursor(position),
+                "reset": True, "has_more": False}
+
+    def _count_changes(self, count):
+        """Prune the change log every 1000 logged changes."""
+        self._changes_since_prune += count
+        if self._changes_since_prune >= 1000:
+            self._changes_since_prune = 0
+            with self.get_connection() as conn:
+                self.changes.prune(conn)
+
+    @timed(DB_LATENCY, operation='search_reports')
+    def search_reports(self, query, limit=20, offset=0):
+        """
+        Full-text search over report titles, URLs, domains and report text.
+
+        Results are ranked by BM25, weighting title and domain matches above
+        matches in the report body, and include a highlighted snippet.
+
+        Returns:
+            tuple: (results, has_more)
+        """
+        match = build_search_query(query)
+        if not match or not self.search_enabled:
+            return [], False
+
+        rows = self.get_connection().execute('''
+            SELECT r.id, r.timestamp, r.url, r.title, r.domain, r.score,
+                   snippet(reports_fts, 3, '<mark>', '</mark>', '…', 24) AS snippet,
+                   bm25(reports_fts, 10.0, 2.0, 5.0, 1.0) AS rank
+            FROM reports_fts
+            JOIN reports r ON r.id = reports_fts.report_id
+            WHERE reports_fts MATCH ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        ''', (match, limit + 1, offset)).fetchall()
+
+        return [dict(row) for row in rows[:limit]], len(rows) > limit
+
+    def backfill_search_index(self, batch_size=500):
+        """
+        Index reports saved before full-text search existed and fill in their domain.
+
+        Returns:
+            int: The number of reports indexed
+        """
+        if not self.search_enabled:
+            return 0
+
+        conn = self.get_connection()
+        indexed = 0
+        last_id = ''
+        while True:
+            rows = conn.execute(
+                "SELECT id, url, title, file_path FROM reports WHERE search_rowid IS NULL AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return indexed
+            last_id = rows[-1]['id']
+
+            with conn:
+                for row in rows:
+                    domain = extract_domain(row['url'])
+                    html_content = ''
+                    if row['file_path'] and os.path.exists(row['file_path']):
+                        html_content = self.store.read_text(row['file_path'])
+                    search_rowid = self._index_report(conn, row['id'], row['url'], row['title'], domain, html_content)
+                    conn.execute("UPDATE reports SET domain = ?, search_rowid = ? WHERE id = ?",
+                                 (domain, search_rowid, row['id']))
+            indexed += len(rows)
+
+    @timed(DB_LATENCY, operation='get_stats')
+    def get_stats(self, **kwargs):
+        """
+        Read per-domain and per-period report statistics.
+
+        Accepts the keyword arguments of ReportStats.query.
+
+        Returns:
+            list: One dict per group with count, mean, min, max and a score histogram
+        """
+        return self.stats.query(self.get_connection(), **kwargs)
+
+    def rebuild_stats(self, batch_size=500):
+        """
+        Recompute the statistics tables from every report.
+
+        Reports saved before the domain column existed get their domain first.
+
+        Returns:
+            int: The number of (domain, day) buckets
+        """
+        conn = self.get_connection()
+        last_id = ''
+        while True:
+            rows = conn.execute(
+                "SELECT id, url FROM reports WHERE domain IS NULL AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            with conn:
+                conn.executemany("UPDATE reports SET domain = ? WHERE id = ?",
+                                 [(extract_domain(row['url']), row['id']) for row in rows])
+
+        with conn:
+            return self.stats.rebuild(conn)
+
+    def _get_file_path(self, report_id):
+        """Look up only the file path of a report."""
+        row = self.get_connection().execute("SELECT file_path FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return row['file_path'] if row else None
+        
+    @timed(DB_LATENCY, operation='get_report_file')
+    def get_report_file(self, report_id):
+        """
+        Get the stored file of a report without reading it.
+
+        Returns:
+            tuple or None: (file_path, content_encoding), where content_encoding
+            is the HTTP Content-Encoding of the file ("gzip", "zstd") or None
+        """
+        file_path = self._get_file_path(report_id)
+        if file_path and os.path.exists(file_path):
+            return file_path, self.store.encoding_of(file_path)
+        return None
         
+    @timed(DB_LATENCY, operation='get_report_html')
     def get_report_html(self, report_id):
         """Get the HTML content of a report."""
-        report = self.get_report(report_id)
-        if report and os.path.exists(report['file_path']):
-            with open(report['file_path'], 'r', encoding='utf-8') as f:
-                return f.read()
+        file_path = self._get_file_path(report_id)
+        if file_path and os.path.exists(file_path):
+            return self.store.read_text(file_path)
         return None
         
+    @timed(DB_LATENCY, operation='delete_report')
     def delete_report(self, report_id):
-        """Delete a report and its file."""
-        report = self.get_report(report_id)
-        if not report:
+        """Delete a report, and its file once no other report shares it."""
+        row = self.get_connection().execute(
+            "SELECT timestamp, domain, score, file_path, search_rowid FROM reports WHERE id = ?", (report_id,)
+        ).fetchone()
+        if row is None:
             return False
-            
-        # Delete the file if it exists
-        if os.path.exists(report['file_path']):
-            os.remove(report['file_path'])
-            
-        # Delete from database
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM reports WHERE id = ?", (report_id,))
-        conn.commit()
-        conn.close()
-        
+        file_path = row['file_path']
+
+        # Delete from database and the search index
+        with self.get_connection() as conn:
+            if row['search_rowid'] is not None and self.search_enabled:
+                conn.execute("DELETE FROM reports_fts WHERE rowid = ?", (row['search_rowid'],))
+            conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+            self.stats.remove(conn, row['domain'], row['timestamp'], row['score'])
+            self.changes.record(conn, [report_id], deleted=True)
+
+        # Only once the delete is committed: a rolled back delete would leave a report without its file
+        self._delete_unreferenced_file(file_path)
+        self._count_changes(1)
         return True
+
+    def _delete_unreferenced_file(self, file_path):
+        """Delete a stored file unless a report still references it."""
+        with self.get_connection() as conn:
+            # Saves of the same content check the file exists under the write lock, so hold it too
+            conn.execute("BEGIN IMMEDIATE")
+            if not conn.execute("SELECT 1 FROM reports WHERE file_path = ?", (file_path,)).fetchone():
+                self.store.delete(file_path)
+
+    def migrate_report_files(self, batch_size=500):
+        """
+        Move reports saved as plain `report_<id>.html` files into the compressed store.
+
+        Returns:
+            int: The number of reports migrated
+        """
+        conn = self.get_connection()
+        objects_prefix = os.path.join(self.store.objects_dir, '')
+        migrated = 0
+        last_id = ''
+        while True:
+            rows = conn.execute(
+                "SELECT id, file_path FROM reports WHERE substr(file_path, 1, ?) != ? AND id > ? ORDER BY id LIMIT ?",
+                (len(objects_prefix), objects_prefix, last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return migrated
+            last_id = rows[-1]['id']
+            rows = [row for row in rows if row['file_path'] and os.path.exists(row['file_path'])]
+
+            with conn:
+                for row in rows:
+                    new_path = self.store.put(self.store.read_text(row['file_path']))
+                    conn.execute("UPDATE reports SET file_path = ? WHERE id = ?", (new_path, row['id']))
+            for row in rows:
+                self._delete_unreferenced_file(row['file_path'])
+            migrated += len(rows)
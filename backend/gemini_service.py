@@ -1,51 +1,319 @@
 import os
 import json
 import re
-from google import genai
-from google.genai.types import Tool, GoogleSearch
-from google.genai.types import GenerateContentConfig
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from analysis_backends import get_backend
+from cache_service import AnalysisCache, SingleFlight, AsyncSingleFlight, make_cache_key
+from content_chunker import split_content, merge_results, estimate_tokens
+from content_reducer import reduce_content
+from near_duplicate_index import NearDuplicateIndex, signature
+from process_local import ProcessLocal
+from quota_scheduler import QuotaScheduler, UpstreamUnavailableError
+from result_parser import RESULT_FIELDS, ResultParseError, parse_analysis
+from metrics_service import (MODEL_CALL_LATENCY, PARSE_LATENCY, PARSE_FAILURES, PARSE_RESULTS, FALLBACK_RESPONSES,
+                             CONTENT_COMPRESSION, timed)
 
 # Load environment variables
 load_dotenv()
 
-# Configure the Gemini API client
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable is not set")
+# Content budget per Gemini call (adjust based on Gemini's token limits); longer pages are split into chunks
+CHUNK_TOKENS = int(os.getenv('ANALYSIS_CHUNK_TOKENS', 2500))
+MAX_CHUNKS = int(os.getenv('ANALYSIS_MAX_CHUNKS', 8))
+CHUNK_CONCURRENCY = int(os.getenv('ANALYSIS_CHUNK_CONCURRENCY', 4))
 
-# Initialize the client with API key
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Strip boilerplate and repeated text from pages before they are chunked and sent to the model
+CONTENT_REDUCTION = os.getenv('ANALYSIS_CONTENT_REDUCTION', 'True').lower() == 'true'
 
+# Tokens reserved for the model's answer when charging a call against the quota
+ANSWER_TOKENS = 400
 
-def analyze_website_content(url, content):
+
+class AnalysisServices:
+    """The caches, request coalescing and scheduler behind the analysis functions of one process."""
+
+    def __init__(self, cache_path=None, near_duplicate_path=None):
+        # Cache of previous analyses, keyed on normalized URL and content hash
+        self.cache = AnalysisCache(cache_path)
+
+        # MinHash signatures of analyzed pages, to reuse analyses of syndicated copies of the same text
+        self.near_duplicates = NearDuplicateIndex(near_duplicate_path)
+
+        # Collapses concurrent analyses of the same page into one Gemini call
+        self.flights = SingleFlight(self.cache)
+        self.async_flights = AsyncSingleFlight(self.cache)
+
+        # Rate limits, prioritizes and retries calls to the model
+        self.scheduler = QuotaScheduler()
+
+
+_services = ProcessLocal(AnalysisServices)
+
+
+def services():
+    """This process's `AnalysisServices`, created on first use."""
+    return _services.get()
+
+
+def configure(cache_path=None, near_duplicate_path=None):
     """
-    Analyze website content using Gemini 2.0 with Google Search grounding.
+    Set the databases the analysis services use, instead of the environment.
+
+    Takes effect the next time `services()` is called; nothing is opened here.
+    """
+    _services.factory = functools.partial(AnalysisServices, cache_path=cache_path,
+                                          near_duplicate_path=near_duplicate_path)
+    _services.reset()
+
+
+def warm_up():
+    """Open the cache and near-duplicate databases, load recent analyses into memory and create the backend."""
+    svc = services()
+    svc.cache.prime()
+    if svc.near_duplicates.enabled:
+        svc.near_duplicates.get_connection()
+    get_backend().warm_up()
+
+
+def analyze_website_content(url, content, use_cache=True, priority='interactive'):
+    """
+    Analyze website content using Gemini 2.0 with Google Search grounding, or
+    the backend selected by ANALYSIS_BACKEND.
+
+    Boilerplate and repeated text are stripped from the page first. Pages
+    longer than the per-call token budget are then split into chunks that are
+    analyzed in parallel and merged into a single result. Results are served
+    from the analysis cache when the same URL was analyzed with the same
+    content before, or derived from the analysis of a near-identical page
+    (e.g. the same wire story on another site), unless `use_cache` is False.
+    Concurrent requests for the same page share a single analysis.
 
     Args:
         url (str): The URL of the website
         content (str): The text content of the website
+        use_cache (bool): Whether to read from the analysis cache
+        priority (str): 'interactive' for requests a user is waiting on, 'batch' for bulk work
 
     Returns:
         dict: Analysis results including misinformation report and score
+
+    Raises:
+        UpstreamUnavailableError: If the model is rate limited or down and retries didn't help
     """
-    try:
-        # Truncate content if it's too long
-        max_content_length = 10000  # Adjust based on Gemini's token limits
-        truncated_content = content[:max_content_length] if len(content) > max_content_length else content
+    chunks, reduction = _prepare_content(content)
+    return _analyze_prepared(url, chunks, reduction, use_cache, priority)
+
+
+def _analyze_prepared(url, chunks, reduction, use_cache, priority):
+    """`analyze_website_content` for content already reduced and chunked by `_prepare_content`."""
+    cache_key = make_cache_key(url, "\n\n".join(chunks))
+
+    def analyze_and_cache():
+        page_signature = signature("\n\n".join(chunks)) if services().near_duplicates.enabled else None
+        if use_cache:
+            result = _reuse_near_duplicate(cache_key, url, page_signature, reduction)
+            if result is not None:
+                return result
+
+        CONTENT_COMPRESSION.observe(reduction['compression_ratio'])
+        if len(chunks) == 1:
+            result = _run_analysis(url, chunks[0], priority=priority)
+        else:
+            result = _run_chunked_analysis(url, chunks, priority)
+        result['content_reduction'] = reduction
+        return _store_analysis(cache_key, url, result, page_signature)
+
+    if not use_cache:
+        return analyze_and_cache()
+
+    svc = services()
+    cached = svc.cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return svc.flights.run(cache_key, analyze_and_cache, lookup=lambda: svc.cache.get(cache_key))
+
+
+def get_cached_analysis(url, content):
+    """
+    Look up a page in the analysis cache without analyzing it.
+
+    Returns:
+        dict or None: The cached analysis, or None on a miss
+    """
+    chunks, _ = _prepare_content(content)
+    return services().cache.get(make_cache_key(url, "\n\n".join(chunks)))
+
+
+async def analyze_website_content_async(url, content, use_cache=True, priority='interactive'):
+    """
+    Coroutine version of `analyze_website_content`, for the ASGI server.
+
+    Model calls use the backend's async client and wait for quota on the
+    event loop, so thousands of slow upstream calls hold no threads. Content
+    reduction and every SQLite access (cache, leases, near-duplicate index)
+    run in the loop's default executor.
+
+    Raises:
+        UpstreamUnavailableError: If the model is rate limited or down and retries didn't help
+    """
+    loop = asyncio.get_running_loop()
+    chunks, reduction = await loop.run_in_executor(None, _prepare_content, content)
+    return await _analyze_prepared_async(url, chunks, reduction, use_cache, priority)
+
 
-        # Set up the Google Search tool
-        google_search_tool = Tool(
-            google_search=GoogleSearch()
-        )
+async def _analyze_prepared_async(url, chunks, reduction, use_cache, priority):
+    """`analyze_website_content_async` for content already reduced and chunked by `_prepare_content`."""
+    loop = asyncio.get_running_loop()
+    cache_key = make_cache_key(url, "\n\n".join(chunks))
 
-        # Create the prompt
-        prompt = f"""
+    async def analyze_and_cache():
+        page_signature = None
+        if services().near_duplicates.enabled:
+            page_signature = await loop.run_in_executor(None, signature, "\n\n".join(chunks))
+        if use_cache:
+            result = await loop.run_in_executor(None, _reuse_near_duplicate, cache_key, url, page_signature,
+                                                reduction)
+            if result is not None:
+                return result
+
+        CONTENT_COMPRESSION.observe(reduction['compression_ratio'])
+        if len(chunks) == 1:
+            result = await _run_analysis_async(url, chunks[0], priority=priority)
+        else:
+            result = await _run_chunked_analysis_async(url, chunks, priority)
+        result['content_reduction'] = reduction
+        return await loop.run_in_executor(None, _store_analysis, cache_key, url, result, page_signature)
+
+    if not use_cache:
+        return await analyze_and_cache()
+
+    async def lookup():
+        return await loop.run_in_executor(None, services().cache.get, cache_key)
+
+    cached = await lookup()
+    if cached is not None:
+        return cached
+
+    return await services().async_flights.run(cache_key, analyze_and_cache, lookup=lookup)
+
+
+def _store_analysis(cache_key, url, result, page_signature):
+    """Cache a fresh analysis and index it for near-duplicates; errors and unparsed fallbacks are never cached."""
+    parse_failed = result.pop('parse_failed', False)
+    if 'error' not in result and not parse_failed:
+        svc = services()
+        svc.cache.set(cache_key, url, result)
+        svc.near_duplicates.add(page_signature, cache_key, url)
+    return result
+
+
+def _reuse_near_duplicate(cache_key, url, page_signature, reduction):
+    """Serve, and cache under this page's key, the analysis of a near-identical page if there is one."""
+    result = _find_near_duplicate(page_signature)
+    if result is not None:
+        result['content_reduction'] = reduction
+        services().cache.set(cache_key, url, result)
+    return result
+
+
+def _find_near_duplicate(page_signature):
+    """
+    Reuse the cached analysis of a near-identical page.
+
+    Returns:
+        dict or None: The matching analysis with a `derived_from` annotation, or None
+    """
+    svc = services()
+    for match in svc.near_duplicates.find(page_signature):
+        result = svc.cache.get(match['cache_key'])
+        if result is None:
+            # The analysis expired or was evicted from the cache
+            svc.near_duplicates.remove(match['cache_key'])
+            continue
+        result['derived_from'] = {"url": match['url'], "similarity": match['similarity']}
+        return result
+    return None
+
+
+def _prepare_content(content):
+    """
+    Reduce page content and split it into chunks that fit the per-call budget.
+
+    Returns:
+        tuple: (chunks, reduction stats from `reduce_content`)
+    """
+    if CONTENT_REDUCTION:
+        content, reduction = reduce_content(content, CHUNK_TOKENS * MAX_CHUNKS)
+    else:
+        tokens = estimate_tokens(content)
+        reduction = {'original_tokens': tokens, 'reduced_tokens': tokens, 'compression_ratio': 1.0,
+                     'truncated': False}
+    return split_content(content, CHUNK_TOKENS, MAX_CHUNKS), reduction
+
+
+def _run_chunked_analysis(url, chunks, priority='interactive'):
+    """Analyze chunks of a long page in parallel and merge the results."""
+    def analyze_chunk(part, chunk):
+        try:
+            return _run_analysis(url, chunk, part=(part, len(chunks)), priority=priority)
+        except UpstreamUnavailableError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(CHUNK_CONCURRENCY, len(chunks))) as executor:
+        results = list(executor.map(lambda item: analyze_chunk(*item), enumerate(chunks, 1)))
+    return _merge_chunk_results(chunks, results)
+
+
+async def _run_chunked_analysis_async(url, chunks, priority='interactive'):
+    """Like `_run_chunked_analysis`, with at most CHUNK_CONCURRENCY chunks awaited at once."""
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def analyze_chunk(part, chunk):
+        async with semaphore:
+            try:
+                return await _run_analysis_async(url, chunk, part=(part, len(chunks)), priority=priority)
+            except UpstreamUnavailableError as e:
+                return e
+
+    results = await asyncio.gather(*(analyze_chunk(part, chunk) for part, chunk in enumerate(chunks, 1)))
+    return _merge_chunk_results(chunks, results)
+
+
+def _merge_chunk_results(chunks, results):
+    """Merge per-chunk results (or UpstreamUnavailableError) into the page result."""
+    # Only fail the page if no chunk could be analyzed
+    unavailable = [r for r in results if isinstance(r, UpstreamUnavailableError)]
+    if len(unavailable) == len(results):
+        raise unavailable[0]
+    results = [_error_result(r) if isinstance(r, UpstreamUnavailableError) else r for r in results]
+
+    # Merge the chunks that produced a structured analysis, ignoring failed ones
+    usable = [(part, r, len(c)) for part, (r, c) in enumerate(zip(results, chunks), 1)
+              if 'error' not in r and not r.get('parse_failed')]
+    if not usable:
+        return results[0]
+
+    merged = merge_results([r for _, r, _ in usable], [w for _, _, w in usable],
+                           parts=[part for part, _, _ in usable], total=len(chunks))
+    merged['chunks_analyzed'] = len(chunks)
+    if len(usable) < len(chunks):
+        merged['chunks_failed'] = len(chunks) - len(usable)
+    return merged
+
+
+def _build_prompt(url, truncated_content, part=None):
+    """Create the analysis prompt for a page, or for one part of a long page."""
+    excerpt_label = f"CONTENT EXCERPT (part {part[0]} of {part[1]}):" if part else "CONTENT EXCERPT:"
+    return f"""
         I need to analyze the following website content for potential misinformation.
 
         URL: {url}
 
-        CONTENT EXCERPT:
+        {excerpt_label}
         {truncated_content}
 
         Please analyze this content and:
@@ -68,105 +336,392 @@ def analyze_website_content(url, content):
         Ensure your total response is under 300 words.
         """
 
-        # Generate content with Google Search grounding using the recommended approach
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=GenerateContentConfig(
-                tools=[google_search_tool],
-                response_modalities=["TEXT"],
-            )
-        )
-
-        # Extract text from response
-        text_response = ""
-        if hasattr(response, 'candidates') and len(response.candidates) > 0:
-            if hasattr(response.candidates[0], 'content') and hasattr(response.candidates[0].content, 'parts'):
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, 'text'):
-                        text_response += part.text
-
-        # Extract sources if available
-        sources = []
-        try:
-            if (hasattr(response, 'candidates') and
-                    len(response.candidates) > 0 and
-                    hasattr(response.candidates[0], 'grounding_metadata')):
-
-                grounding_metadata = response.candidates[0].grounding_metadata
-
-                # Try to get sources from groundingChunks
-                if hasattr(grounding_metadata, 'groundingChunks'):
-                    for chunk in grounding_metadata.groundingChunks:
-                        if hasattr(chunk, 'web') and hasattr(chunk.web, 'uri'):
-                            title = chunk.web.title if hasattr(chunk.web, 'title') else "Source"
-                            url = chunk.web.uri
-                            sources.append({
-                                'url': url,
-                                'title': title
-                            })
-        except Exception as e:
-            print(f"Error extracting sources from grounding metadata: {str(e)}")
-
-        # Try to parse JSON from the response text
-        result = {}
-        try:
-            # Try to find JSON in the response
-            json_match = re.search(r'```json\s*(.*?)\s*```', text_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
+
+@timed(PARSE_LATENCY)
+def _parse_result(text_response, sources):
+    """Parse the model's JSON answer into the analysis result schema."""
+    try:
+        result, outcome = parse_analysis(text_response)
+        PARSE_RESULTS.labels(outcome).inc()
+    except ResultParseError as e:
+        print(f"Error parsing JSON from response: {str(e)}")
+        PARSE_RESULTS.labels('failed').inc()
+        PARSE_FAILURES.inc()
+        FALLBACK_RESPONSES.labels('parse_failed').inc()
+        # Create a basic structure if JSON parsing fails
+        result = {
+            "summary": text_response[:100] + "..." if len(text_response) > 100 else text_response,
+            "misinformation_detected": None,
+            "misinformation_score": 5,
+            "report": text_response,
+            "additional_context": "Error parsing structured data from the response.",
+            "sources": [],
+            "parse_failed": True
+        }
+
+    # Add sources to result if they're not already included
+    if 'sources' not in result or not result['sources']:
+        result['sources'] = [s['url'] for s in sources] if sources else []
+
+    # Include full source objects with titles
+    result['source_objects'] = sources
+
+    # Ensure all expected fields are present
+    for field in RESULT_FIELDS:
+        if field not in result:
+            if field == 'sources':
+                result[field] = []
             else:
-                # If no JSON block, try to find the whole JSON structure
-                json_match = re.search(r'({.*})', text_response, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(1)
-                else:
-                    # If still no JSON found, use the whole response
-                    json_str = text_response
-
-            # Clean up the json string to handle potential issues
-            json_str = json_str.strip()
-            result = json.loads(json_str)
-        except Exception as e:
-            print(f"Error parsing JSON from response: {str(e)}")
-            # Create a basic structure if JSON parsing fails
-            result = {
-                "summary": text_response[:100] + "..." if len(text_response) > 100 else text_response,
-                "misinformation_detected": None,
-                "misinformation_score": 5,
-                "report": text_response,
-                "additional_context": "Error parsing structured data from the response.",
-                "sources": []
-            }
-
-        # Add sources to result if they're not already included
-        if 'sources' not in result or not result['sources']:
-            result['sources'] = [s['url'] for s in sources] if sources else []
-
-        # Include full source objects with titles
-        result['source_objects'] = sources
-
-        # Ensure all expected fields are present
-        expected_fields = ['summary', 'misinformation_detected', 'misinformation_score', 'report', 'additional_context',
-                           'sources']
-        for field in expected_fields:
-            if field not in result:
-                if field == 'sources':
-                    result[field] = []
-                else:
-                    result[field] = None
+                result[field] = None
 
-        return result
+    return result
+
+
+def _error_result(e):
+    """Structured response for a failed analysis."""
+    FALLBACK_RESPONSES.labels('error').inc()
+    return {
+        "error": f"Analysis failed: {str(e)}",
+        "summary": "Could not analyze the content",
+        "misinformation_detected": None,
+        "misinformation_score": 5,  # Neutral score
+        "report": "The system encountered an error while analyzing this content. Please try again later.",
+        "additional_context": "Error processing the content",
+        "sources": []
+    }
 
+
+def _run_analysis(url, truncated_content, part=None, priority='interactive'):
+    """Run a single grounded Gemini analysis of content that fits the token budget."""
+    try:
+        # The configured backend (Gemini with Google Search grounding by default)
+        backend = get_backend()
+        prompt = _build_prompt(url, truncated_content, part)
+        text_response, sources = services().scheduler.run(lambda: _call_model(backend, prompt),
+                                               estimate_tokens(prompt) + ANSWER_TOKENS, priority)
+
+        return _parse_result(text_response, sources)
+
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in analyze_website_content: {str(e)}")
         # Return a structured error response
-        return {
-            "error": f"Analysis failed: {str(e)}",
-            "summary": "Could not analyze the content",
-            "misinformation_detected": None,
-            "misinformation_score": 5,  # Neutral score
-            "report": "The system encountered an error while analyzing this content. Please try again later.",
-            "additional_context": "Error processing the content",
-            "sources": []
-        }
\ No newline at end of file
+        return _error_result(e)
+
+
+async def _run_analysis_async(url, truncated_content, part=None, priority='interactive'):
+    """Like `_run_analysis`, awaiting the backend's async client."""
+    try:
+        backend = get_backend()
+        prompt = _build_prompt(url, truncated_content, part)
+        text_response, sources = await services().scheduler.arun(lambda: _acall_model(backend, prompt),
+                                                      estimate_tokens(prompt) + ANSWER_TOKENS, priority)
+
+        return _parse_result(text_response, sources)
+
+    except UpstreamUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in analyze_website_content_async: {str(e)}")
+        return _error_result(e)
+
+
+def _call_model(backend, prompt):
+    """Make one model call, recording its duration and outcome."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        answer = backend.generate(prompt)
+        outcome = 'ok'
+        return answer
+    finally:
+        MODEL_CALL_LATENCY.labels(backend.name, 'generate', outcome).observe(time.perf_counter() - start)
+
+
+async def _acall_model(backend, prompt):
+    """Like `_call_model`, for the backend's async client."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        answer = await backend.agenerate(prompt)
+        outcome = 'ok'
+        return answer
+    finally:
+        MODEL_CALL_LATENCY.labels(backend.name, 'generate', outcome).observe(time.perf_counter() - start)
+
+
+def _stream_model(backend, prompt):
+    """Make one streaming model call, recording its duration (to the last chunk) and outcome."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield from backend.generate_stream(prompt)
+        outcome = 'ok'
+    finally:
+        MODEL_CALL_LATENCY.labels(backend.name, 'stream', outcome).observe(time.perf_counter() - start)
+
+
+async def _astream_model(backend, prompt):
+    """Like `_stream_model`, for the backend's async client."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        async for item in backend.agenerate_stream(prompt):
+            yield item
+        outcome = 'ok'
+    finally:
+        MODEL_CALL_LATENCY.labels(backend.name, 'stream', outcome).observe(time.perf_counter() - start)
+
+
+def _partial_string_field(text, field):
+    """Return a JSON string field from incomplete JSON once its value is complete."""
+    match = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % field, text)
+    if match:
+        try:
+            return json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            return None
+    return None
+
+
+def _partial_value_field(text, field):
+    """Return a JSON number/boolean field from incomplete JSON once its value is complete."""
+    match = re.search(r'"%s"\s*:\s*(true|false|null|-?\d+(?:\.\d+)?)\s*[,}\n]' % field, text)
+    if match:
+        return json.loads(match.group(1))
+    return None
+
+
+def stream_website_analysis(url, content, use_cache=True):
+    """
+    Analyze website content like `analyze_website_content`, yielding progress as it streams.
+
+    Yields `(event, data)` tuples:
+        delta: {"text": ...} for every chunk of model output
+        summary: {"summary": ...} as soon as the summary is complete
+        score: {"misinformation_score": ..., "misinformation_detected": ...} once parseable
+        report: {"report": ..., "additional_context": ...} after generation finishes
+        sources: {"sources": [...], "source_objects": [...]}
+        result: the full result, identical in shape to `analyze_website_content`
+        error: the structured error response if the analysis failed
+
+    Long pages that need chunking cannot be streamed token by token; their
+    events are emitted once the merged analysis is complete. Concurrent
+    requests for the same page share a single analysis: only the first one
+    streams it, the others get their events once its result is in.
+    """
+    chunks, reduction = _prepare_content(content)
+    try:
+        if len(chunks) > 1:
+            result, streamed = _analyze_prepared(url, chunks, reduction, use_cache, 'interactive'), False
+        else:
+            result, streamed = yield from _stream_prepared(url, chunks[0], reduction, use_cache)
+    except UpstreamUnavailableError as e:
+        print(f"Analysis service unavailable in stream_website_analysis: {str(e)}")
+        yield 'error', {"error": str(e), "retry_after": e.retry_after}
+        return
+    if 'error' in result:
+        yield 'error', result
+        return
+
+    yield from _result_events(result, streamed)
+
+
+def _stream_prepared(url, truncated_content, reduction, use_cache):
+    """
+    Stream the analysis of content that fits one call, sharing it with concurrent identical requests.
+
+    Returns:
+        tuple: (result, whether its progress events were streamed by this call)
+    """
+    svc = services()
+    cache_key = make_cache_key(url, truncated_content)
+    page_signature = signature(truncated_content) if svc.near_duplicates.enabled else None
+    if use_cache:
+        result = svc.cache.get(cache_key)
+        if result is None:
+            result = _reuse_near_duplicate(cache_key, url, page_signature, reduction)
+        if result is not None:
+            return result, False
+
+    streamed = False
+
+    def stream_and_cache():
+        nonlocal streamed
+        streamed = True
+        CONTENT_COMPRESSION.observe(reduction['compression_ratio'])
+        result = yield from _stream_analysis(url, truncated_content)
+        result['content_reduction'] = reduction
+        return _store_analysis(cache_key, url, result, page_signature)
+
+    if use_cache:
+        result = yield from svc.flights.stream(cache_key, stream_and_cache, lookup=lambda: svc.cache.get(cache_key))
+    else:
+        result = yield from stream_and_cache()
+    return result, streamed
+
+
+def _stream_analysis(url, truncated_content):
+    """
+    Stream one model call, yielding delta, summary and score events, and return the parsed result.
+
+    Raises:
+        UpstreamUnavailableError: If the model is rate limited or down and retries didn't help
+    """
+    text_response = ""
+    sources = []
+    events = _ProgressEvents()
+    backend = get_backend()
+    prompt = _build_prompt(url, truncated_content)
+    try:
+        for delta, chunk_sources in services().scheduler.stream(lambda: _stream_model(backend, prompt),
+                                                                estimate_tokens(prompt) + ANSWER_TOKENS):
+            sources.extend(s for s in chunk_sources if s not in sources)
+            if delta:
+                text_response += delta
+                yield from events.update(delta, text_response)
+    except UpstreamUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in stream_website_analysis: {str(e)}")
+        return _error_result(e)
+    return _parse_result(text_response, sources)
+
+
+async def stream_website_analysis_async(url, content, use_cache=True):
+    """
+    Async generator version of `stream_website_analysis`, for the ASGI server.
+
+    The model call streams through the backend's async client, so a stream
+    waiting on the model holds no thread.
+    """
+    loop = asyncio.get_running_loop()
+    chunks, reduction = await loop.run_in_executor(None, _prepare_content, content)
+    try:
+        if len(chunks) > 1:
+            result, streamed = await _analyze_prepared_async(url, chunks, reduction, use_cache, 'interactive'), False
+        else:
+            # The analysis may be shared with other requests (and outlive this one), so it
+            # runs as its own task and hands this request's events over through a queue
+            events = asyncio.Queue()
+            analysis = asyncio.ensure_future(
+                _stream_prepared_async(url, chunks[0], reduction, use_cache, events.put_nowait))
+            analysis.add_done_callback(lambda _: events.put_nowait(None))
+            try:
+                while True:
+                    event = await events.get()
+                    if event is None:
+                        break
+                    yield event
+            finally:
+                analysis.cancel()
+            result, streamed = analysis.result()
+    except UpstreamUnavailableError as e:
+        print(f"Analysis service unavailable in stream_website_analysis_async: {str(e)}")
+        yield 'error', {"error": str(e), "retry_after": e.retry_after}
+        return
+    if 'error' in result:
+        yield 'error', result
+        return
+
+    for event in _result_events(result, streamed):
+        yield event
+
+
+async def _stream_prepared_async(url, truncated_content, reduction, use_cache, emit):
+    """Like `_stream_prepared`, passing progress events to `emit` instead of yielding them."""
+    loop = asyncio.get_running_loop()
+    svc = services()
+    cache_key = make_cache_key(url, truncated_content)
+    page_signature = None
+    if svc.near_duplicates.enabled:
+        page_signature = await loop.run_in_executor(None, signature, truncated_content)
+
+    async def lookup():
+        return await loop.run_in_executor(None, svc.cache.get, cache_key)
+
+    if use_cache:
+        result = await lookup()
+        if result is None:
+            result = await loop.run_in_executor(None, _reuse_near_duplicate, cache_key, url, page_signature,
+                                                reduction)
+        if result is not None:
+            return result, False
+
+    streamed = False
+
+    async def stream_and_cache():
+        nonlocal streamed
+        streamed = True
+        CONTENT_COMPRESSION.observe(reduction['compression_ratio'])
+        result = await _stream_analysis_async(url, truncated_content, emit)
+        result['content_reduction'] = reduction
+        return await loop.run_in_executor(None, _store_analysis, cache_key, url, result, page_signature)
+
+    if use_cache:
+        result = await svc.async_flights.run(cache_key, stream_and_cache, lookup=lookup)
+    else:
+        result = await stream_and_cache()
+    return result, streamed
+
+
+async def _stream_analysis_async(url, truncated_content, emit):
+    """Like `_stream_analysis`, passing progress events to `emit`."""
+    text_response = ""
+    sources = []
+    events = _ProgressEvents()
+    backend = get_backend()
+    prompt = _build_prompt(url, truncated_content)
+    try:
+        async for delta, chunk_sources in services().scheduler.astream(lambda: _astream_model(backend, prompt),
+                                                                       estimate_tokens(prompt) + ANSWER_TOKENS):
+            sources.extend(s for s in chunk_sources if s not in sources)
+            if delta:
+                text_response += delta
+                for event in events.update(delta, text_response):
+                    emit(event)
+    except UpstreamUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in stream_website_analysis_async: {str(e)}")
+        return _error_result(e)
+    return _parse_result(text_response, sources)
+
+
+class _ProgressEvents:
+    """The delta, summary and score events of a streamed answer, each field sent once it is complete."""
+
+    def __init__(self):
+        self.summary_sent = False
+        self.score_sent = False
+
+    def update(self, delta, text_response):
+        """Events for a new piece of the answer, given the answer so far."""
+        yield 'delta', {"text": delta}
+        if not self.summary_sent:
+            summary = _partial_string_field(text_response, 'summary')
+            if summary is not None:
+                self.summary_sent = True
+                yield 'summary', {"summary": summary}
+        if not self.score_sent:
+            score = _partial_value_field(text_response, 'misinformation_score')
+            if score is not None:
+                self.score_sent = True
+                yield 'score', {
+                    "misinformation_score": score,
+                    "misinformation_detected": _partial_value_field(text_response, 'misinformation_detected')
+                }
+
+
+def _result_events(result, streamed):
+    """The closing events of a stream; summary and score too if they weren't streamed."""
+    if not streamed:
+        yield 'summary', {"summary": result.get('summary')}
+        yield 'score', {
+            "misinformation_score": result.get('misinformation_score'),
+            "misinformation_detected": result.get('misinformation_detected')
+        }
+    yield 'report', {"report": result.get('report'), "additional_context": result.get('additional_context')}
+    yield 'sources', {"sources": result.get('sources', []), "source_objects": result.get('source_objects', [])}
+    yield 'result', result
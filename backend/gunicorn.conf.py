@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the Pinocchio backend.
+
+Usage:
+    PROMETHEUS_MULTIPROC_DIR=/tmp/pinocchio-metrics gunicorn -w 4 app:app
+    gunicorn -w 4 --preload app:app
+"""
+
+import os
+import glob
+
+
+def on_starting(server):
+    """Clear metric files left by a previous run so /metrics starts from zero."""
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+            os.remove(path)
+
+
+def post_worker_init(worker):
+    """Open the worker's databases and prime its caches before it accepts requests."""
+    app = worker.wsgi
+    if 'pinocchio' in getattr(app, 'extensions', {}) and app.config['WARM_UP']:
+        from app import warm_up
+        worker.log.info("Worker %s warmed up in %.3fs", worker.pid, warm_up(app))
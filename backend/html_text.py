@@ -0,0 +1,71 @@
+import re
+from html.parser import HTMLParser
+
+# Elements whose content is never visible text
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+
+# Elements that start a new block of text
+BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article',
+              'header', 'footer', 'blockquote', 'pre', 'table', 'ul', 'ol', 'title'}
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an HTML document, one line per block."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.title = None
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title':
+            self._in_title = True
+        elif tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title = (self.title or '') + data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    """
+    Extract the visible text of an HTML document.
+
+    Returns:
+        str: The text, with one line per block element and collapsed whitespace
+    """
+    return extract_html(html)[1]
+
+
+def extract_html(html):
+    """
+    Extract the title and visible text of an HTML document.
+
+    Returns:
+        tuple: (title or None, text)
+    """
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        print(f"Error extracting text from HTML: {str(e)}")
+
+    lines = (re.sub(r'[ \t\r\f\v]+', ' ', line).strip() for line in ''.join(parser.parts).split('\n'))
+    title = re.sub(r'\s+', ' ', parser.title).strip() if parser.title else None
+    return title, '\n'.join(line for line in lines if line)
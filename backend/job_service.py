@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from db_service import DATABASE_PATH, ThreadLocalConnections
+
+# Load environment variables
+load_dotenv()
+
+# Job configuration
+JOBS_PATH = os.getenv('ANALYSIS_JOBS_PATH', os.path.join(os.path.dirname(DATABASE_PATH), 'analysis_jobs.db'))
+JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', 4))
+JOB_QUEUE_SIZE = int(os.getenv('ANALYSIS_JOB_QUEUE_SIZE', 100))  # Queued + running jobs per process
+JOB_TIMEOUT = float(os.getenv('ANALYSIS_JOB_TIMEOUT', 120))  # Seconds a job may run, or wait in the queue
+JOB_RETENTION = float(os.getenv('ANALYSIS_JOB_RETENTION', 60 * 60))  # Seconds finished jobs are kept
+
+if not os.path.isabs(JOBS_PATH):
+    JOBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), JOBS_PATH)
+
+# Statuses after which a job never changes again
+FINISHED_STATUSES = ('completed', 'failed', 'timeout')
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobManager:
+    """
+    Run analyses in a bounded background thread pool.
+
+    Job state lives in a SQLite database so that any gunicorn worker can
+    answer status requests for a job accepted by another worker. A job that
+    runs longer than `timeout` seconds, or is still queued `timeout` seconds
+    after it was submitted, is reported as timed out and its late result is
+    discarded. A timed-out analysis gives its pool thread and queue slot back
+    at once, so hung upstream calls can't fill the pool.
+    """
+
+    def __init__(self, analyze_fn, db_path=None, workers=None, queue_size=None, timeout=None, retention=None):
+        self.analyze_fn = analyze_fn
+        self.db_path = db_path or JOBS_PATH
+        self.workers = JOB_WORKERS if workers is None else workers
+        self.queue_size = JOB_QUEUE_SIZE if queue_size is None else queue_size
+        self.timeout = JOB_TIMEOUT if timeout is None else timeout
+        self.retention = JOB_RETENTION if retention is None else retention
+
+        self.connections = ThreadLocalConnections(self.db_path, row_factory=sqlite3.Row)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis-job')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self.init_db()
+
+    def get_connection(self):
+        """Get this thread's connection to the jobs database (reused, do not close)."""
+        return self.connections.get()
+
+    def init_db(self):
+        """Initialize the jobs schema if it doesn't exist."""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.connections.enable_wal()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id TEXT PRIMARY KEY,
+            url TEXT,
+            status TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_jobs_finished ON analysis_jobs (finished_at)')
+        conn.commit()
+
+    def submit(self, url, content, **kwargs):
+        """
+        Queue an analysis.
+
+        Args:
+            url: The URL of the website
+            content: The text content of the website
+            **kwargs: Extra keyword arguments for the analysis function
+
+        Returns:
+            str: The job ID
+
+        Raises:
+            QueueFullError: If the queue already holds `queue_size` jobs
+        """
+        with self._lock:
+            if self._pending >= self.queue_size:
+                raise QueueFullError(f"Analysis queue is full ({self.queue_size} jobs)")
+            self._pending += 1
+
+        job_id = str(uuid.uuid4())
+        now = time.time()
+
+        try:
+            conn = self.get_connection()
+            conn.execute("DELETE FROM analysis_jobs WHERE finished_at < ?", (now - self.retention,))
+            conn.execute(
+                "INSERT INTO analysis_jobs (id, url, status, created_at) VALUES (?, ?, 'queued', ?)",
+                (job_id, url, now)
+            )
+            conn.commit()
+
+            self._executor.submit(self._run, job_id, url, content, kwargs)
+        except Exception:
+            self.get_connection().rollback()
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        return job_id
+
+    def get(self, job_id):
+        """
+        Get the current state of a job.
+
+        Returns:
+            dict or None: Job status, timestamps and the result once completed
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM analysis_jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+
+        if row and self._expired(row):
+            # The worker may have died or the analysis is stuck; stop waiting on it
+            self._finish(conn, job_id, 'timeout', error=self._timeout_error(row['status']))
+            cursor.execute("SELECT * FROM analysis_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        job = {
+            "job_id": row['id'],
+            "url": row['url'],
+            "status": row['status'],
+            "created_at": row['created_at'],
+            "started_at": row['started_at'],
+            "finished_at": row['finished_at'],
+        }
+        if row['result']:
+            job['result'] = json.loads(row['result'])
+        if row['error']:
+            job['error'] = row['error']
+        return job
+
+    def _run(self, job_id, url, content, kwargs):
+        """Execute a job on a pool thread."""
+        try:
+            conn = self.get_connection()
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE analysis_jobs SET status = 'running', started_at = ? "
+                "WHERE id = ? AND status = 'queued' AND created_at >= ?",
+                (now, job_id, now - self.timeout)
+            )
+            conn.commit()
+            if cursor.rowcount == 0:
+                # Waited in the queue past its deadline, or already reported as timed out
+                self._finish(conn, job_id, 'timeout', error=self._timeout_error('queued'))
+                return
+
+            analysis = Future()
+            threading.Thread(target=self._analyze, args=(analysis, url, content, kwargs),
+                             name=f'analysis-job-{job_id[:8]}', daemon=True).start()
+            try:
+                result = analysis.result(timeout=self.timeout)
+                self._finish(conn, job_id, 'completed', result=result)
+            except Exception as e:
+                if not analysis.done():
+                    # A hung model call must not hold this worker and queue slot: the call
+                    # finishes on its own thread and its late result is dropped
+                    self._finish(conn, job_id, 'timeout', error=self._timeout_error('running'))
+                    return
+                print(f"Error in analysis job {job_id}: {str(e)}")
+                print(traceback.format_exc())
+                self._finish(conn, job_id, 'failed', error=f"Analysis failed: {str(e)}")
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error updating analysis job {job_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _analyze(self, analysis, url, content, kwargs):
+        """Run the analysis of a job on a thread of its own, which the job stops waiting for at its deadline."""
+        try:
+            analysis.set_result(self.analyze_fn(url, content, **kwargs))
+        except Exception as e:
+            analysis.set_exception(e)
+
+    def _expired(self, row):
+        """Whether a queued or running job has passed its deadline."""
+        now = time.time()
+        if row['status'] == 'queued':
+            return row['created_at'] + self.timeout < now
+        return row['status'] == 'running' and row['started_at'] + self.timeout < now
+
+    def _timeout_error(self, status):
+        if status == 'queued':
+            return f"Analysis did not start within {self.timeout:g} seconds"
+        return f"Analysis timed out after {self.timeout:g} seconds"
+
+    def _finish(self, conn, job_id, status, result=None, error=None):
+        """Record the outcome of a job unless it already finished (e.g. timed out)."""
+        conn.execute(
+            "UPDATE analysis_jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+            "WHERE id = ? AND status NOT IN ('completed', 'failed', 'timeout')",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+        conn.commit()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the Pinocchio backend.
+
+Usage:
+    python manage.py migrate-storage
+    python manage.py backfill-search
+    python manage.py rebuild-stats
+    python manage.py ingest reports.jsonl
+    python manage.py analyze pages.jsonl --output results.jsonl --save-reports
+"""
+
+import os
+import sys
+import json
+import itertools
+import argparse
+from db_service import ReportDatabase
+from backfill_service import Backfill, Checkpoint, read_corpus
+
+
+def migrate_storage(db, args):
+    """Move plain report files into the compressed, content-addressed store."""
+    migrated = db.migrate_report_files(batch_size=args.batch_size)
+    print(f"Migrated {migrated} reports to {db.store.objects_dir}")
+
+
+def backfill_search(db, args):
+    """Add reports saved before full-text search existed to the search index."""
+    if not db.search_enabled:
+        print("Full-text search is unavailable: this SQLite build lacks FTS5")
+        return
+    indexed = db.backfill_search_index(batch_size=args.batch_size)
+    print(f"Indexed {indexed} reports for search")
+
+
+def rebuild_stats(db, args):
+    """Recompute the per-domain statistics from every report."""
+    buckets = db.rebuild_stats(batch_size=args.batch_size)
+    print(f"Rebuilt statistics for {buckets} domain/day buckets")
+
+
+def read_reports(f, malformed=None):
+    """
+    Read reports from a JSON array or a JSON Lines file, lazily for JSON Lines.
+
+    Blank lines are skipped. Malformed JSON Lines are skipped too, with their
+    line number and error appended to `malformed`; without a list to record
+    them in, the first one raises.
+
+    Raises:
+        json.JSONDecodeError: If the file is malformed and `malformed` is None
+    """
+    line_number = 1
+    first = f.read(1)
+    while first.isspace():
+        line_number += first == '\n'
+        first = f.read(1)
+    if not first:
+        return
+    if first == '[':
+        yield from json.loads(first + f.read())
+        return
+    for line_number, line in enumerate(itertools.chain([first + f.readline()], f), line_number):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            if malformed is None:
+                raise
+            malformed.append((line_number, str(e)))
+
+
+def ingest(db, args):
+    """Bulk-load reports from a JSON array or JSON Lines file ('-' for stdin)."""
+    f = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+    ids_file = open(args.ids_output, 'w', encoding='utf-8') if args.ids_output else None
+    count = 0
+    malformed = []
+    try:
+        for batch in db.ingest_reports(read_reports(f, malformed), batch_size=args.batch_size, workers=args.workers):
+            count += len(batch)
+            if ids_file:
+                ids_file.writelines(saved['report_id'] + '\n' for saved in batch)
+            print(f"Saved {count} reports", file=sys.stderr)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+        if ids_file:
+            ids_file.close()
+    print(f"Ingested {count} reports")
+    if malformed:
+        for line_number, error in malformed:
+            print(f"Line {line_number} is not valid JSON: {error}", file=sys.stderr)
+        sys.exit(f"Skipped {len(malformed)} malformed lines; fix them and ingest those lines again")
+
+
+def analyze(db, args):
+    """Analyze a crawled corpus (JSON Lines, CSV or a directory of HTML files), resuming where the last run stopped."""
+    if not args.output and not args.save_reports:
+        sys.exit("Nothing to write: pass --output and/or --save-reports")
+    checkpoint_path = args.checkpoint or (args.output or os.path.normpath(args.input)) + '.checkpoint'
+    try:
+        checkpoint = Checkpoint(checkpoint_path, os.path.abspath(args.input), retry_errors=args.retry_errors)
+    except ValueError as e:
+        sys.exit(str(e))
+    if checkpoint.done:
+        print(f"Resuming from {checkpoint_path}: {len(checkpoint.done)} pages already done", file=sys.stderr)
+
+    output = open(args.output, 'a', encoding='utf-8') if args.output else None
+    backfill = Backfill(checkpoint, output=output, db=db if args.save_reports else None, workers=args.workers,
+                        use_cache=not args.refresh, max_pauses=args.max_pauses)
+    try:
+        complete = backfill.run(lambda: read_corpus(args.input, args.format, args.url_field, args.content_field,
+                                                    args.base_url))
+    except KeyboardInterrupt:
+        complete = False
+    finally:
+        checkpoint.close()
+        if output:
+            output.close()
+    backfill.report_progress()
+    if not complete:
+        sys.exit(f"Stopped before the end; run the same command again to resume from {checkpoint_path}")
+    print(f"Analyzed every page of {args.input}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pinocchio backend maintenance commands.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate-storage', help=migrate_storage.__doc__)
+    migrate_parser.add_argument('--batch-size', type=int, default=500)
+    migrate_parser.set_defaults(handler=migrate_storage)
+
+    search_parser = subparsers.add_parser('backfill-search', help=backfill_search.__doc__)
+    search_parser.add_argument('--batch-size', type=int, default=500)
+    search_parser.set_defaults(handler=backfill_search)
+
+    stats_parser = subparsers.add_parser('rebuild-stats', help=rebuild_stats.__doc__)
+    stats_parser.add_argument('--batch-size', type=int, default=500)
+    stats_parser.set_defaults(handler=rebuild_stats)
+
+    ingest_parser = subparsers.add_parser('ingest', help=ingest.__doc__)
+    ingest_parser.add_argument('file', help="Reports with url, title, score and html, and optionally id and timestamp")
+    ingest_parser.add_argument('--batch-size', type=int, default=None, help="Reports per transaction")
+    ingest_parser.add_argument('--workers', type=int, default=None, help="Threads writing report files")
+    ingest_parser.add_argument('--ids-output', help="Write the ID of every saved report to this file")
+    ingest_parser.set_defaults(handler=ingest)
+
+    analyze_parser = subparsers.add_parser('analyze', help=analyze.__doc__)
+    analyze_parser.add_argument('input', help="JSON Lines or CSV file of {url, content} records, or a directory of "
+                                              "HTML files")
+    analyze_parser.add_argument('--format', choices=('jsonl', 'csv', 'html'), help="Input format (default: detected)")
+    analyze_parser.add_argument('--url-field', default='url', help="Field holding the URL in JSON Lines and CSV input")
+    analyze_parser.add_argument('--content-field', default='content',
+                                help="Field holding the page text in JSON Lines and CSV input")
+    analyze_parser.add_argument('--base-url', help="URL that HTML file paths are relative to (default: file:// URLs)")
+    analyze_parser.add_argument('--output', help="Append one JSON line per analyzed page to this file")
+    analyze_parser.add_argument('--save-reports', action='store_true', help="Save each analysis as a report")
+    analyze_parser.add_argument('--checkpoint', help="Progress file (default: the output or input name + "
+                                                     "'.checkpoint')")
+    analyze_parser.add_argument('--workers', type=int, default=None, help="Analyses in flight at once")
+    analyze_parser.add_argument('--refresh', action='store_true', help="Ignore cached analyses")
+    analyze_parser.add_argument('--retry-errors', action='store_true', help="Analyze pages that failed before again")
+    analyze_parser.add_argument('--max-pauses', type=int, default=10,
+                                help="Pauses for an unavailable model in a row before giving up")
+    analyze_parser.set_defaults(handler=analyze)
+
+    args = parser.parse_args()
+    args.handler(ReportDatabase(), args)
+
+
+if __name__ == '__main__':
+    main()
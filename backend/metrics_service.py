@@ -0,0 +1,85 @@
+import os
+import functools
+from prometheus_client import (Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST,
+                               generate_latest, multiprocess)
+
+# With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by
+# the workers (before the app is imported); /metrics then aggregates every worker's values
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Bucket boundaries in seconds, sized to each kind of work
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MODEL_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+RATIO_BUCKETS = (1, 1.1, 1.25, 1.5, 2, 3, 4, 6, 8, 12, 16)  # Compression ratios, not seconds
+
+REQUEST_LATENCY = Histogram(
+    'pinocchio_http_request_duration_seconds', 'Time to produce an HTTP response, per route',
+    ['method', 'route', 'status'], buckets=HTTP_BUCKETS)
+MODEL_CALL_LATENCY = Histogram(
+    'pinocchio_model_call_duration_seconds', 'Duration of each call to the analysis model',
+    ['backend', 'mode', 'outcome'], buckets=MODEL_BUCKETS)
+PARSE_LATENCY = Histogram(
+    'pinocchio_parse_duration_seconds', 'Time to extract and parse the JSON answer of the model',
+    buckets=FAST_BUCKETS)
+DB_LATENCY = Histogram(
+    'pinocchio_db_operation_duration_seconds', 'Duration of ReportDatabase operations',
+    ['operation'], buckets=FAST_BUCKETS)
+FILE_IO_LATENCY = Histogram(
+    'pinocchio_file_io_duration_seconds', 'Duration of report file reads, writes and deletes',
+    ['operation'], buckets=FAST_BUCKETS)
+NEAR_DUPLICATE_LATENCY = Histogram(
+    'pinocchio_near_duplicate_lookup_duration_seconds', 'Time to look up near-duplicates of a page',
+    buckets=FAST_BUCKETS)
+CONTENT_COMPRESSION = Histogram(
+    'pinocchio_content_compression_ratio', 'Page tokens before content reduction divided by tokens after',
+    buckets=RATIO_BUCKETS)
+
+CACHE_LOOKUPS = Counter(
+    'pinocchio_analysis_cache_lookups_total', 'Analysis cache lookups by result (memory, sqlite or miss)',
+    ['result'])
+NEAR_DUPLICATE_LOOKUPS = Counter(
+    'pinocchio_near_duplicate_lookups_total', 'Near-duplicate index lookups by result (hit or miss)',
+    ['result'])
+PARSE_FAILURES = Counter(
+    'pinocchio_parse_failures_total', 'Model answers that could not be parsed as JSON')
+PARSE_RESULTS = Counter(
+    'pinocchio_parse_results_total', 'Parsed model answers by outcome (direct, repaired or failed)',
+    ['outcome'])
+FALLBACK_RESPONSES = Counter(
+    'pinocchio_fallback_responses_total', 'Analyses answered with a placeholder result instead of a real one',
+    ['reason'])
+UPSTREAM_ERRORS = Counter(
+    'pinocchio_upstream_errors_total', 'Failed model calls and calls rejected before reaching the model',
+    ['kind'])
+UPSTREAM_RETRIES = Counter(
+    'pinocchio_upstream_retries_total', 'Model calls retried after a transient error')
+
+
+def timed(histogram, **labels):
+    """Decorator recording the duration of every call of a function in a histogram."""
+    def decorator(fn):
+        metric = histogram.labels(**labels) if labels else histogram
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metric.time():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body, content type)
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
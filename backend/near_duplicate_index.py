@@ -0,0 +1,252 @@
+import os
+import re
+import time
+import sqlite3
+import struct
+import hashlib
+from dotenv import load_dotenv
+from db_service import DATABASE_PATH, ThreadLocalConnections
+from metrics_service import NEAR_DUPLICATE_LOOKUPS, NEAR_DUPLICATE_LATENCY
+
+# Load environment variables
+load_dotenv()
+
+# Near-duplicate index configuration
+NEAR_DUPLICATE_ENABLED = os.getenv('NEAR_DUPLICATE_ENABLED', 'True').lower() == 'true'
+NEAR_DUPLICATE_PATH = os.getenv('NEAR_DUPLICATE_PATH',
+                                os.path.join(os.path.dirname(DATABASE_PATH), 'near_duplicates.db'))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.8))  # Minimum Jaccard similarity, 0-1
+NEAR_DUPLICATE_TTL = int(os.getenv('NEAR_DUPLICATE_TTL', os.getenv('ANALYSIS_CACHE_TTL', 24 * 60 * 60)))
+
+if not os.path.isabs(NEAR_DUPLICATE_PATH):
+    NEAR_DUPLICATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), NEAR_DUPLICATE_PATH)
+
+SIGNATURE_SIZE = 64  # MinHash values per page
+BANDS = 16  # LSH bands of SIGNATURE_SIZE / BANDS values; pages sharing any band are compared
+ROWS = SIGNATURE_SIZE // BANDS
+SHINGLE_WORDS = 3
+MIN_WORDS = 100  # Shorter pages share too little text for a reliable signature
+EMPTY = 0xFFFFFFFF  # Value of a signature slot no shingle fell into
+
+WORD = re.compile(r'\w+')
+
+
+def signature(text):
+    """
+    Compute the MinHash signature of a page from its word 3-shingles.
+
+    Uses one-permutation hashing: each shingle hash is assigned to one of
+    SIGNATURE_SIZE slots by its top bits and each slot keeps its minimum, so
+    the signature takes a single pass over the page.
+
+    Returns:
+        tuple or None: The signature, or None if the text is too short to compare
+    """
+    words = WORD.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+
+    slots = [EMPTY] * SIGNATURE_SIZE
+    for i in range(len(words) - SHINGLE_WORDS + 1):
+        shingle = ' '.join(words[i:i + SHINGLE_WORDS]).encode('utf-8')
+        value = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'big')
+        slot = value >> 58
+        value &= EMPTY
+        if value < slots[slot]:
+            slots[slot] = value
+    return tuple(slots)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingles of two pages, from their signatures."""
+    used = [(x, y) for x, y in zip(a, b) if x != EMPTY or y != EMPTY]
+    return sum(x == y for x, y in used) / len(used) if used else 0.0
+
+
+def band_keys(sig):
+    """
+    One 64-bit key per band (signed, as SQLite stores integers).
+
+    Bands whose slots are all EMPTY are skipped: every short page would share
+    their key, and that one bucket would grow with the whole index.
+    """
+    keys = []
+    for band in range(BANDS):
+        values = sig[band * ROWS:(band + 1) * ROWS]
+        if all(value == EMPTY for value in values):
+            continue
+        keys.append(_band_key(band, values))
+    return keys
+
+
+def _band_key(band, values):
+    data = struct.pack(f'>B{ROWS}I', band, *values)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+
+# Keys of bands with no values, held by entries indexed before such bands were skipped
+EMPTY_BAND_KEYS = [_band_key(band, [EMPTY] * ROWS) for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash-LSH index of analyzed pages, for reusing analyses of syndicated content.
+
+    Signatures are split into 16 bands of 4 values and each band is hashed to
+    one indexed key. A lookup fetches the pages sharing at least one band key,
+    then compares full signatures against the threshold. Pages with Jaccard
+    similarity 0.8 share a band 98% of the time, while unrelated pages almost
+    never do, so a lookup reads a handful of rows even with millions of
+    entries. Entries point at the analysis cache key of the page they came
+    from.
+    """
+
+    def __init__(self, db_path=None, threshold=None, ttl=None, enabled=None):
+        self.db_path = db_path or NEAR_DUPLICATE_PATH
+        self.threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+        self.ttl = NEAR_DUPLICATE_TTL if ttl is None else ttl
+        self.enabled = NEAR_DUPLICATE_ENABLED if enabled is None else enabled
+
+        self.connections = ThreadLocalConnections(self.db_path)
+        self._writes_since_trim = 0
+
+        if self.enabled:
+            self.init_db()
+
+    def get_connection(self):
+        """Get this thread's connection to the index database (reused, do not close)."""
+        return self.connections.get()
+
+    def init_db(self):
+        """Initialize the index schema if it doesn't exist."""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.connections.enable_wal()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS near_duplicates (
+            id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL,
+            cache_key TEXT UNIQUE,
+            url TEXT,
+            created_at REAL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS near_duplicate_bands (
+            band_key INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL,
+            PRIMARY KEY (band_key, entry_id)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_near_duplicates_created ON near_duplicates (created_at)')
+        # Empty the shared bucket of empty bands left by earlier versions
+        cursor.executemany('DELETE FROM near_duplicate_bands WHERE band_key = ?', [(key,) for key in EMPTY_BAND_KEYS])
+        conn.commit()
+
+    def find(self, sig, limit=5):
+        """
+        Find indexed pages at least `threshold` similar to a signature.
+
+        Returns:
+            list: Up to `limit` dicts with cache_key, url, similarity and created_at, most similar first
+        """
+        keys = band_keys(sig) if self.enabled and sig is not None else None
+        if not keys:
+            return []
+
+        with NEAR_DUPLICATE_LATENCY.time():
+            try:
+                cursor = self.get_connection().execute(
+                    f'''
+                    SELECT e.signature, e.cache_key, e.url, e.created_at FROM near_duplicates e
+                    WHERE e.id IN (
+                        SELECT entry_id FROM near_duplicate_bands WHERE band_key IN ({', '.join('?' * len(keys))})
+                    ) AND e.created_at >= ?
+                    ''',
+                    (*keys, time.time() - self.ttl)
+                )
+                rows = cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading near-duplicate index: {str(e)}")
+                return []
+
+            matches = []
+            for stored, cache_key, url, created_at in rows:
+                score = similarity(sig, _unpack(stored))
+                if score >= self.threshold:
+                    matches.append({'cache_key': cache_key, 'url': url, 'similarity': round(score, 4),
+                                    'created_at': created_at})
+            matches.sort(key=lambda m: (-m['similarity'], -m['created_at']))
+
+        NEAR_DUPLICATE_LOOKUPS.labels('hit' if matches else 'miss').inc()
+        return matches[:limit]
+
+    def add(self, sig, cache_key, url):
+        """Index the signature of an analyzed page under its analysis cache key."""
+        if not self.enabled or sig is None:
+            return
+
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            self._delete(cursor, 'cache_key = ?', (cache_key,))
+            cursor.execute(
+                'INSERT INTO near_duplicates (signature, cache_key, url, created_at) VALUES (?, ?, ?, ?)',
+                (_pack(sig), cache_key, url, time.time())
+            )
+            entry_id = cursor.lastrowid
+            cursor.executemany('INSERT OR IGNORE INTO near_duplicate_bands (band_key, entry_id) VALUES (?, ?)',
+                               [(key, entry_id) for key in band_keys(sig)])
+            conn.commit()
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error writing near-duplicate index: {str(e)}")
+            return
+
+        self._writes_since_trim += 1
+        if self._writes_since_trim >= 100:
+            self._writes_since_trim = 0
+            self.evict()
+
+    def remove(self, cache_key):
+        """Drop an entry whose analysis is no longer cached."""
+        try:
+            conn = self.get_connection()
+            self._delete(conn.cursor(), 'cache_key = ?', (cache_key,))
+            conn.commit()
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error removing near-duplicate entry: {str(e)}")
+
+    def evict(self):
+        """Remove entries older than the TTL."""
+        try:
+            conn = self.get_connection()
+            self._delete(conn.cursor(), 'created_at < ?', (time.time() - self.ttl,))
+            conn.commit()
+        except sqlite3.Error as e:
+            self.get_connection().rollback()
+            print(f"Error evicting near-duplicate entries: {str(e)}")
+
+    @staticmethod
+    def _delete(cursor, where, params):
+        """Delete the entries matching a condition, with their band keys (recomputed from the signature)."""
+        cursor.execute(f'SELECT id, signature FROM near_duplicates WHERE {where}', params)
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        cursor.executemany('DELETE FROM near_duplicate_bands WHERE band_key = ? AND entry_id = ?',
+                           [(key, entry_id) for entry_id, stored in rows for key in band_keys(_unpack(stored))])
+        cursor.executemany('DELETE FROM near_duplicates WHERE id = ?', [(entry_id,) for entry_id, _ in rows])
+
+
+def _pack(sig):
+    return struct.pack(f'>{SIGNATURE_SIZE}I', *sig)
+
+
+def _unpack(data):
+    return struct.unpack(f'>{SIGNATURE_SIZE}I', data)
@@ -0,0 +1,39 @@
+import os
+import threading
+
+
+class ProcessLocal:
+    """
+    A value created on first use in each process.
+
+    Database handles, API clients and thread pools must not be shared by
+    forked processes (e.g. gunicorn workers started with --preload): each
+    process that calls `get` builds its own with `factory`.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Get this process's value, creating it if needed."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self.factory()
+                    self._pid = os.getpid()
+        return self._value
+
+    def set(self, value):
+        """Replace this process's value."""
+        with self._lock:
+            self._value = value
+            self._pid = os.getpid()
+
+    def reset(self):
+        """Drop the value so the next `get` creates a new one."""
+        with self._lock:
+            self._value = None
+            self._pid = None
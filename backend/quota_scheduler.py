@@ -0,0 +1,422 @@
+import os
+import math
+import time
+import asyncio
+import heapq
+import random
+import itertools
+import threading
+from dotenv import load_dotenv
+from metrics_service import UPSTREAM_ERRORS, UPSTREAM_RETRIES
+
+# Load environment variables
+load_dotenv()
+
+# Upstream quota; 0 disables the limit
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', 2000))
+GEMINI_TPM = float(os.getenv('GEMINI_TPM', 4000000))
+QUOTA_BURST_SECONDS = float(os.getenv('GEMINI_QUOTA_BURST_SECONDS', 10))  # Quota that may be used at once after idling
+
+# Seconds a call may wait for quota before it is rejected, per priority lane
+QUEUE_TIMEOUT = float(os.getenv('SCHEDULER_QUEUE_TIMEOUT', 30))
+BATCH_QUEUE_TIMEOUT = float(os.getenv('SCHEDULER_BATCH_QUEUE_TIMEOUT', 600))
+
+# Retries of transient upstream errors, with full-jitter exponential backoff
+MAX_RETRIES = int(os.getenv('SCHEDULER_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.getenv('SCHEDULER_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.getenv('SCHEDULER_BACKOFF_MAX', 20))
+
+# Circuit breaker: consecutive failures that open it, and seconds before a trial call
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))
+
+# Lower runs first: interactive requests from the extension go ahead of batch work
+PRIORITIES = {
+    'interactive': 0,
+    'batch': 1,
+}
+
+# HTTP status codes worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+# Transport errors (httpx, used by google-genai) worth retrying, by class name
+RETRYABLE_ERRORS = {'ConnectError', 'ConnectTimeout', 'ReadError', 'ReadTimeout', 'WriteError', 'WriteTimeout',
+                    'PoolTimeout', 'RemoteProtocolError'}
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when the model can't be reached: retries are exhausted, quota is saturated or the circuit is open."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+def error_code(e):
+    """The HTTP status code of an upstream error, if it has one."""
+    code = getattr(e, 'code', None) or getattr(e, 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(e):
+    """Whether an upstream error is transient: rate limiting, server errors, timeouts and dropped connections."""
+    code = error_code(e)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    return isinstance(e, (TimeoutError, ConnectionError)) or type(e).__name__ in RETRYABLE_ERRORS
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` tokens a second, holding at most `burst_seconds` worth.
+
+    A limit of 0 or less means unlimited. Not thread-safe; QuotaScheduler
+    serializes access.
+    """
+
+    def __init__(self, per_minute, burst_seconds=None):
+        self.rate = per_minute / 60
+        burst_seconds = QUOTA_BURST_SECONDS if burst_seconds is None else burst_seconds
+        self.capacity = max(self.rate * burst_seconds, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.rate <= 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost, now):
+        """Seconds until `cost` tokens are available (a cost above capacity waits for a full bucket)."""
+        if self.unlimited:
+            return 0
+        self._refill(now)
+        missing = min(cost, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0
+
+    def take(self, cost, now):
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens -= min(cost, self.capacity)
+
+    def drain(self, now):
+        """Empty the bucket, e.g. after upstream reported the quota exhausted."""
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens = min(self.tokens, 0)
+
+
+class CircuitBreaker:
+    """
+    Sheds load while upstream is failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail immediately. After `reset_timeout` seconds one trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = CIRCUIT_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.reset_timeout = CIRCUIT_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go upstream now.
+
+        Returns:
+            bool: True if this call is the trial call of a half-open circuit
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return False
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            UPSTREAM_ERRORS.labels('circuit_open').inc()
+            raise CircuitOpenError("The analysis service is temporarily unavailable", retry_after=max(math.ceil(remaining), 1))
+
+    def cancel_trial(self):
+        """Let another call be the trial call, when the trial never reached upstream."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"Circuit breaker opened after {self.failures} consecutive upstream failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class QuotaScheduler:
+    """
+    Admission control in front of the model backend.
+
+    Each call waits for one request from the RPM bucket and its estimated
+    tokens from the TPM bucket. Waiting calls are admitted strictly in
+    priority order, then arrival order, so interactive requests overtake
+    queued batch work. Transient errors are retried with full-jitter
+    exponential backoff, and a rate-limit response empties the buckets so
+    every caller backs off together. Consecutive failures open a circuit
+    breaker that rejects calls without touching upstream. Threads (`run`,
+    `stream`) and coroutines (`arun`, `astream`) share the same queue and
+    buckets.
+    """
+
+    def __init__(self, rpm=None, tpm=None, burst_seconds=None, max_retries=None, backoff_base=None,
+                 backoff_max=None, breaker=None):
+        self.requests = TokenBucket(GEMINI_RPM if rpm is None else rpm, burst_seconds)
+        self.tokens = TokenBucket(GEMINI_TPM if tpm is None else tpm, burst_seconds)
+        self.max_retries = MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = BACKOFF_MAX if backoff_max is None else backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.queue_timeouts = {'interactive': QUEUE_TIMEOUT, 'batch': BATCH_QUEUE_TIMEOUT}
+
+        self._waiting = []
+        self._async_waiters = set()  # (event loop, asyncio.Event) of calls waiting in `_await_quota`
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def run(self, fn, tokens, priority='interactive'):
+        """
+        Call `fn()` once quota allows, retrying transient errors.
+
+        Args:
+            fn: Makes one upstream call
+            tokens: Estimated tokens the call consumes (prompt and answer)
+            priority: 'interactive' or 'batch'
+
+        Returns:
+            The result of `fn()`
+
+        Raises:
+            UpstreamUnavailableError: If quota wasn't available in time, the circuit is open
+                or transient errors persisted through every retry
+        """
+        for attempt in range(self.max_retries + 1):
+            self._admit(tokens, priority)
+            try:
+                result = fn()
+            except Exception as e:
+                time.sleep(self._handle_error(e, attempt))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def arun(self, fn, tokens, priority='interactive'):
+        """
+        Like `run`, for a coroutine function: `await fn()` makes one upstream call.
+
+        Waiting for quota and backing off happen on the event loop, so
+        thousands of queued calls hold no threads.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._aadmit(tokens, priority)
+            try:
+                result = await fn()
+            except Exception as e:
+                await asyncio.sleep(self._handle_error(e, attempt))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stream(self, make_stream, tokens, priority='interactive'):
+        """
+        Like `run`, for a streaming call: `make_stream()` returns an iterator.
+
+        A call is only retried if it failed before producing any output;
+        failures after that are raised to the caller.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._admit(tokens, priority)
+            started = False
+            try:
+                for item in make_stream():
+                    started = True
+                    yield item
+            except Exception as e:
+                if started:
+                    self._raise_mid_stream(e)
+                time.sleep(self._handle_error(e, attempt))
+                continue
+            self.breaker.record_success()
+            return
+
+    async def astream(self, make_stream, tokens, priority='interactive'):
+        """Like `stream`, for an async iterator: `make_stream()` returns one."""
+        for attempt in range(self.max_retries + 1):
+            await self._aadmit(tokens, priority)
+            started = False
+            try:
+                async for item in make_stream():
+                    started = True
+                    yield item
+            except Exception as e:
+                if started:
+                    self._raise_mid_stream(e)
+                await asyncio.sleep(self._handle_error(e, attempt))
+                continue
+            self.breaker.record_success()
+            return
+
+    def _raise_mid_stream(self, e):
+        """Re-raise the error of a streaming call that already produced output; it can't be retried."""
+        UPSTREAM_ERRORS.labels(str(error_code(e) or type(e).__name__)).inc()
+        if is_retryable(e):
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"Analysis service failed mid-stream: {str(e)}") from e
+        raise e
+
+    def _handle_error(self, e, attempt):
+        """
+        Re-raise a failed call's error, or return the seconds to back off before the next attempt.
+        """
+        UPSTREAM_ERRORS.labels(str(error_code(e) or type(e).__name__)).inc()
+        if not is_retryable(e):
+            # Upstream answered, so it is up; the request itself was bad
+            self.breaker.record_success()
+            raise e
+        self.breaker.record_failure()
+
+        if error_code(e) == 429:
+            with self._cond:
+                now = time.monotonic()
+                self.requests.drain(now)
+                self.tokens.drain(now)
+
+        if attempt >= self.max_retries:
+            raise UpstreamUnavailableError(
+                f"Analysis service unavailable after {attempt + 1} attempts: {str(e)}",
+                retry_after=self.backoff_max
+            ) from e
+
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        UPSTREAM_RETRIES.inc()
+        print(f"Retrying analysis in {delay:.2f}s after upstream error: {str(e)}")
+        return delay
+
+    def _admit(self, tokens, priority):
+        """Block until the breaker, this call's turn and both buckets allow it."""
+        trial = self.breaker.before_call()
+        if self.requests.unlimited and self.tokens.unlimited:
+            return
+        try:
+            self._wait_for_quota(tokens, priority)
+        except UpstreamUnavailableError:
+            if trial:
+                self.breaker.cancel_trial()
+            raise
+
+    async def _aadmit(self, tokens, priority):
+        """Like `_admit`, waiting on the event loop."""
+        trial = self.breaker.before_call()
+        if self.requests.unlimited and self.tokens.unlimited:
+            return
+        try:
+            await self._await_quota(tokens, priority)
+        except (UpstreamUnavailableError, asyncio.CancelledError):
+            if trial:
+                self.breaker.cancel_trial()
+            raise
+
+    def _wait_for_quota(self, tokens, priority):
+        """Block until it is this call's turn and both buckets hold enough tokens."""
+        ticket, deadline = self._ticket(priority)
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = self._poll(ticket, tokens, deadline)
+                    if wait == 0:
+                        return
+                    remaining = deadline - time.monotonic()
+                    self._cond.wait(min(wait, remaining) if wait else remaining)
+            finally:
+                self._dequeue(ticket)
+
+    async def _await_quota(self, tokens, priority):
+        """Like `_wait_for_quota`, sleeping on the event loop until woken by a departing caller."""
+        ticket, deadline = self._ticket(priority)
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._poll(ticket, tokens, deadline)
+                    waiter[1].clear()
+                if wait == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(wait, remaining) if wait else remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                self._dequeue(ticket)
+
+    def _ticket(self, priority):
+        """A place in the queue for a call: priority lane, then arrival order, with its deadline."""
+        ticket = (PRIORITIES.get(priority, PRIORITIES['batch']), next(self._sequence))
+        return ticket, time.monotonic() + self.queue_timeouts.get(priority, BATCH_QUEUE_TIMEOUT)
+
+    def _poll(self, ticket, tokens, deadline):
+        """
+        Take quota for a queued call if it is its turn and the buckets allow it. Hold `_cond`.
+
+        Returns:
+            float or None: 0 once admitted, else the seconds until the buckets refill
+                (None if other calls are ahead of it)
+
+        Raises:
+            UpstreamUnavailableError: If the call can't be admitted before its deadline
+        """
+        now = time.monotonic()
+        wait = None
+        if self._waiting[0] == ticket:
+            wait = max(self.requests.delay(1, now), self.tokens.delay(tokens, now))
+            if wait <= 0:
+                self.requests.take(1, now)
+                self.tokens.take(tokens, now)
+                return 0
+        if now + (wait or 0) > deadline:
+            UPSTREAM_ERRORS.labels('quota_timeout').inc()
+            raise UpstreamUnavailableError("Analysis quota is saturated, try again later",
+                                           retry_after=max(math.ceil(wait or 0), 1))
+        return wait
+
+    def _dequeue(self, ticket):
+        """Remove a call from the queue and wake the others to re-check their turn. Hold `_cond`."""
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
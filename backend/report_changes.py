@@ -0,0 +1,128 @@
+import os
+import json
+import base64
+import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Days changes are kept for delta sync; clients that last synced earlier get a full snapshot
+CHANGE_RETENTION_DAYS = float(os.getenv('REPORT_CHANGE_RETENTION_DAYS', 30))
+
+# Fields of the summary feed, and the ones clients may add with `fields`
+SUMMARY_FIELDS = ('id', 'timestamp', 'title', 'domain', 'score')
+OPTIONAL_SUMMARY_FIELDS = ('url',)
+
+
+def encode_change_cursor(seq):
+    """Encode a position in the change log as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps({'seq': seq}).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_since(since):
+    """
+    Parse the `since` of a feed request: a change cursor or an ISO 8601 timestamp.
+
+    Returns:
+        tuple: ('seq', int) or ('timestamp', str)
+
+    Raises:
+        ValueError: If `since` is neither
+    """
+    try:
+        seq = json.loads(base64.urlsafe_b64decode(since + '=' * (-len(since) % 4)))['seq']
+        if isinstance(seq, int) and not isinstance(seq, bool) and seq >= 0:
+            return 'seq', seq
+    except (TypeError, ValueError, KeyError, UnicodeDecodeError, base64.binascii.Error):
+        pass
+    try:
+        return 'timestamp', datetime.datetime.fromisoformat(since).isoformat()
+    except ValueError:
+        raise ValueError("Invalid 'since', expected a cursor or an ISO 8601 timestamp")
+
+
+class ReportChanges:
+    """
+    Append-only log of saved and deleted reports, for delta sync.
+
+    Every save and delete appends a row inside the transaction that makes
+    the change, so the log's sequence numbers order changes exactly as they
+    were committed. Deletes stay in the log as tombstones. A client that
+    remembers the last sequence number it saw fetches only the reports saved
+    or deleted after it. Rows older than the retention period are pruned,
+    except the newest one, which keeps the current position.
+    """
+
+    def init_schema(self, conn):
+        """Create the change log if it doesn't exist."""
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS report_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id TEXT NOT NULL,
+            deleted INTEGER NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_report_changes_changed ON report_changes (changed_at)')
+
+    def record(self, conn, report_ids, deleted=False):
+        """Log saved or deleted reports, within the caller's transaction."""
+        changed_at = datetime.datetime.now().isoformat()
+        conn.executemany("INSERT INTO report_changes (report_id, deleted, changed_at) VALUES (?, ?, ?)",
+                         [(report_id, int(deleted), changed_at) for report_id in report_ids])
+
+    def position(self, conn):
+        """The sequence number of the latest change, or 0 if nothing was logged yet."""
+        return conn.execute("SELECT IFNULL(MAX(seq), 0) FROM report_changes").fetchone()[0]
+
+    def start_of(self, conn, since):
+        """
+        The sequence number after which changes since `since` start.
+
+        Returns:
+            int or None: None if changes that old were already pruned
+        """
+        kind, value = since
+        first = conn.execute("SELECT MIN(seq), MIN(changed_at) FROM report_changes").fetchone()
+        if kind == 'seq':
+            # The change right after `value` must still be in the log (or not have happened yet)
+            if first[0] is not None and value < first[0] - 1:
+                return None
+            return value
+        if first[0] is None:
+            return 0
+        if value < first[1]:
+            return None
+        row = conn.execute("SELECT MAX(seq) FROM report_changes WHERE changed_at < ?", (value,)).fetchone()
+        return row[0] or first[0] - 1
+
+    def changes(self, conn, after, fields, limit):
+        """
+        The net changes after a sequence number, oldest first.
+
+        A report saved and later deleted in the range is only a tombstone.
+
+        Returns:
+            tuple: (saved report dicts, deleted report IDs, last sequence number read, whether more remain)
+        """
+        rows = conn.execute(f'''
+            SELECT c.seq, c.report_id, r.id IS NOT NULL AS present, {', '.join(f'r.{f}' for f in fields)}
+            FROM report_changes c LEFT JOIN reports r ON r.id = c.report_id
+            WHERE c.seq > ? ORDER BY c.seq LIMIT ?
+        ''', (after, limit)).fetchall()
+
+        latest = {}
+        for row in rows:
+            latest.pop(row['report_id'], None)
+            latest[row['report_id']] = {f: row[f] for f in fields} if row['present'] else None
+        saved = [report for report in latest.values() if report is not None]
+        deleted = [report_id for report_id, report in latest.items() if report is None]
+        return saved, deleted, rows[-1]['seq'] if rows else after, len(rows) == limit
+
+    def prune(self, conn, retention_days=None):
+        """Remove changes older than the retention period, within the caller's transaction."""
+        days = CHANGE_RETENTION_DAYS if retention_days is None else retention_days
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
+        conn.execute("DELETE FROM report_changes WHERE changed_at < ? AND seq < (SELECT MAX(seq) FROM report_changes)",
+                     (cutoff,))
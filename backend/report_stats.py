@@ -0,0 +1,280 @@
+import datetime
+
+# Scores are bucketed into 11 histogram bins, one per whole score 0-10
+HISTOGRAM_BINS = 11
+
+# Time intervals daily aggregates can be rolled up to
+INTERVALS = ('day', 'week', 'month')
+
+# Ways to group aggregates in query results
+GROUPINGS = ('domain', 'bucket', 'domain,bucket', 'total')
+
+
+def score_bin(score):
+    """The histogram bin of a score, clamped to 0-10."""
+    return min(max(int(round(score)), 0), HISTOGRAM_BINS - 1)
+
+
+def bucket_of(timestamp, interval='day'):
+    """
+    The time bucket of an ISO timestamp.
+
+    Days are `YYYY-MM-DD`, weeks are named after their Monday and months are `YYYY-MM`.
+    """
+    day = timestamp[:10]
+    if interval == 'month':
+        return day[:7]
+    if interval == 'week':
+        date = datetime.date.fromisoformat(day)
+        return (date - datetime.timedelta(days=date.weekday())).isoformat()
+    return day
+
+
+class ReportStats:
+    """
+    Materialized per-domain, per-day report aggregates.
+
+    `report_stats` holds the count, score sum, minimum and maximum for every
+    (domain, day) pair and `report_stats_histogram` the number of reports per
+    score bin. Both are updated inside the transaction that saves or deletes a
+    report, so reading statistics costs one row per bucket instead of a scan
+    over every report. Weeks and months are rolled up from days on read.
+    """
+
+    def init_schema(self, conn):
+        """
+        Create the aggregate tables if they don't exist.
+
+        Returns:
+            bool: True if the tables were just created and need a rebuild
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'report_stats'"
+        ).fetchone()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS report_stats (
+            domain TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            score_sum REAL NOT NULL,
+            score_min REAL,
+            score_max REAL,
+            PRIMARY KEY (domain, bucket)
+        ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_report_stats_bucket ON report_stats (bucket)')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS report_stats_histogram (
+            domain TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            bin INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (domain, bucket, bin)
+        ) WITHOUT ROWID
+        ''')
+        return not exists
+
+    def add(self, conn, domain, timestamp, score):
+        """Count a newly saved report, within the caller's transaction."""
+        self.add_many(conn, [(domain, timestamp, score)])
+
+    def add_many(self, conn, reports):
+        """
+        Count newly saved reports, within the caller's transaction.
+
+        Reports are aggregated first, so a batch costs one upsert per bucket
+        rather than one per report.
+
+        Args:
+            conn: A connection to the reports database
+            reports: Iterable of (domain, timestamp, score) tuples
+        """
+        buckets, bins = {}, {}
+        for domain, timestamp, score in reports:
+            score = _as_score(score)
+            if score is None:
+                continue
+            key = (domain or '', bucket_of(timestamp))
+            count, score_sum, score_min, score_max = buckets.get(key, (0, 0.0, score, score))
+            buckets[key] = (count + 1, score_sum + score, min(score_min, score), max(score_max, score))
+            bins[key + (score_bin(score),)] = bins.get(key + (score_bin(score),), 0) + 1
+
+        conn.executemany('''
+            INSERT INTO report_stats (domain, bucket, count, score_sum, score_min, score_max)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (domain, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                score_sum = score_sum + excluded.score_sum,
+                score_min = MIN(score_min, excluded.score_min),
+                score_max = MAX(score_max, excluded.score_max)
+        ''', [key + values for key, values in buckets.items()])
+        conn.executemany('''
+            INSERT INTO report_stats_histogram (domain, bucket, bin, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (domain, bucket, bin) DO UPDATE SET count = count + excluded.count
+        ''', [key + (count,) for key, count in bins.items()])
+
+    def remove(self, conn, domain, timestamp, score):
+        """
+        Uncount a deleted report, within the caller's transaction.
+
+        Must run after the report row is deleted: if the report held the
+        bucket's minimum or maximum, they are recomputed from the reports of
+        that day.
+        """
+        score = _as_score(score)
+        if score is None:
+            return
+        domain, bucket = domain or '', bucket_of(timestamp)
+        row = conn.execute(
+            "SELECT count, score_min, score_max FROM report_stats WHERE domain = ? AND bucket = ?",
+            (domain, bucket)
+        ).fetchone()
+        if row is None:
+            return
+
+        if row[0] <= 1:
+            conn.execute("DELETE FROM report_stats WHERE domain = ? AND bucket = ?", (domain, bucket))
+            conn.execute("DELETE FROM report_stats_histogram WHERE domain = ? AND bucket = ?", (domain, bucket))
+            return
+
+        conn.execute(
+            "UPDATE report_stats SET count = count - 1, score_sum = score_sum - ? WHERE domain = ? AND bucket = ?",
+            (score, domain, bucket)
+        )
+        if score <= row[1] or score >= row[2]:
+            next_day = (datetime.date.fromisoformat(bucket) + datetime.timedelta(days=1)).isoformat()
+            conn.execute('''
+                UPDATE report_stats SET (score_min, score_max) = (
+                    SELECT MIN(score), MAX(score) FROM reports
+                    WHERE timestamp >= ? AND timestamp < ? AND IFNULL(domain, '') = ?
+                )
+                WHERE domain = ? AND bucket = ?
+            ''', (bucket, next_day, domain, domain, bucket))
+
+        conn.execute(
+            "UPDATE report_stats_histogram SET count = count - 1 WHERE domain = ? AND bucket = ? AND bin = ?",
+            (domain, bucket, score_bin(score))
+        )
+        conn.execute(
+            "DELETE FROM report_stats_histogram WHERE domain = ? AND bucket = ? AND bin = ? AND count <= 0",
+            (domain, bucket, score_bin(score))
+        )
+
+    def rebuild(self, conn):
+        """
+        Recompute every aggregate from the reports table, within the caller's transaction.
+
+        Returns:
+            int: The number of (domain, day) buckets written
+        """
+        conn.execute("DELETE FROM report_stats")
+        conn.execute("DELETE FROM report_stats_histogram")
+        # Scores that aren't numbers are left out, as in add()
+        scored = "FROM reports WHERE typeof(score) IN ('integer', 'real') AND timestamp IS NOT NULL"
+        conn.execute(f'''
+            INSERT INTO report_stats (domain, bucket, count, score_sum, score_min, score_max)
+            SELECT IFNULL(domain, ''), substr(timestamp, 1, 10), COUNT(*), SUM(score), MIN(score), MAX(score)
+            {scored}
+            GROUP BY 1, 2
+        ''')
+        conn.execute(f'''
+            INSERT INTO report_stats_histogram (domain, bucket, bin, count)
+            SELECT IFNULL(domain, ''), substr(timestamp, 1, 10),
+                   MIN(MAX(CAST(ROUND(score) AS INTEGER), 0), {HISTOGRAM_BINS - 1}), COUNT(*)
+            {scored}
+            GROUP BY 1, 2, 3
+        ''')
+        return conn.execute("SELECT COUNT(*) FROM report_stats").fetchone()[0]
+
+    def query(self, conn, group_by='domain,bucket', interval='day', domain=None, since=None, until=None,
+              order_by=None, min_count=1, limit=None):
+        """
+        Read aggregates, rolled up to the requested grouping and interval.
+
+        Args:
+            conn: A connection to the reports database
+            group_by: 'domain', 'bucket', 'domain,bucket' or 'total'
+            interval: Bucket size, 'day', 'week' or 'month'
+            domain: Only include this domain
+            since: Only include days on or after this date (YYYY-MM-DD)
+            until: Only include days on or before this date (YYYY-MM-DD)
+            order_by: 'mean' or 'count' to sort descending (worst or busiest first), else by key
+            min_count: Leave out groups with fewer reports
+            limit: Maximum number of groups to return
+
+        Returns:
+            list: One dict per group with count, mean, min, max and histogram
+
+        Raises:
+            ValueError: If an argument is not one of the accepted values
+        """
+        if group_by not in GROUPINGS:
+            raise ValueError(f"group_by must be one of {', '.join(GROUPINGS)}")
+        if interval not in INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+        if order_by not in (None, 'mean', 'count'):
+            raise ValueError("order_by must be 'mean' or 'count'")
+        for value in (since, until):
+            if value is not None:
+                try:
+                    datetime.date.fromisoformat(value)
+                except ValueError:
+                    raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+        where, params = [], []
+        if domain is not None:
+            where.append("domain = ?")
+            params.append(domain)
+        if since:
+            where.append("bucket >= ?")
+            params.append(since)
+        if until:
+            where.append("bucket <= ?")
+            params.append(until)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        def key_of(row_domain, row_bucket):
+            key = {}
+            if 'domain' in group_by:
+                key['domain'] = row_domain or None
+            if 'bucket' in group_by:
+                key['bucket'] = bucket_of(row_bucket, interval)
+            return tuple(key.items())
+
+        groups = {}
+        for row_domain, row_bucket, count, score_sum, score_min, score_max in conn.execute(
+                f"SELECT domain, bucket, count, score_sum, score_min, score_max FROM report_stats {clause}", params):
+            group = groups.setdefault(key_of(row_domain, row_bucket), {
+                'count': 0, 'score_sum': 0.0, 'min': None, 'max': None, 'histogram': [0] * HISTOGRAM_BINS
+            })
+            group['count'] += count
+            group['score_sum'] += score_sum
+            group['min'] = score_min if group['min'] is None else min(group['min'], score_min)
+            group['max'] = score_max if group['max'] is None else max(group['max'], score_max)
+
+        for row_domain, row_bucket, bin, count in conn.execute(
+                f"SELECT domain, bucket, bin, count FROM report_stats_histogram {clause}", params):
+            group = groups.get(key_of(row_domain, row_bucket))
+            if group:
+                group['histogram'][bin] += count
+
+        results = []
+        for key, group in groups.items():
+            if group['count'] < min_count:
+                continue
+            score_sum = group.pop('score_sum')
+            results.append(dict(key, mean=round(score_sum / group['count'], 3), **group))
+
+        if order_by:
+            results.sort(key=lambda r: (-r[order_by], r.get('domain') or '', r.get('bucket') or ''))
+        else:
+            results.sort(key=lambda r: (r.get('domain') or '', r.get('bucket') or ''))
+        return results[:limit] if limit else results
+
+
+def _as_score(score):
+    """The score as a float, or None if it isn't a number."""
+    try:
+        return float(score)
+    except (TypeError, ValueError):
+        return None
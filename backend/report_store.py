@@ -0,0 +1,156 @@
+import os
+import gzip
+import hashlib
+import tempfile
+from dotenv import load_dotenv
+from metrics_service import FILE_IO_LATENCY, timed
+
+# zstandard is optional; without it reports are stored gzip-compressed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Load environment variables
+load_dotenv()
+
+# Compression for newly stored reports: "gzip", "zstd" or "none"
+REPORT_COMPRESSION = os.getenv('REPORT_COMPRESSION', 'gzip').lower()
+REPORT_COMPRESSION_LEVEL = os.getenv('REPORT_COMPRESSION_LEVEL')
+
+# File extension -> HTTP Content-Encoding of the stored bytes
+ENCODINGS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+
+
+class ReportStore:
+    """
+    Content-addressed, compressed storage for report HTML.
+
+    Reports are stored once per distinct payload under
+    `objects/<aa>/<bb>/<sha256>.html.<ext>`, so identical reports share a file
+    and no directory grows unbounded. Files are written compressed and can be
+    served as-is to clients that accept their Content-Encoding. Files written
+    before the store existed (plain `report_<id>.html`) remain readable.
+    """
+
+    def __init__(self, reports_dir, compression=None, level=None):
+        self.reports_dir = reports_dir
+        self.objects_dir = os.path.join(reports_dir, 'objects')
+        self.compression = compression or REPORT_COMPRESSION
+        level = level if level is not None else REPORT_COMPRESSION_LEVEL
+
+        if self.compression == 'zstd' and zstandard is None:
+            print("zstandard is not installed, storing reports gzip-compressed instead")
+            self.compression = 'gzip'
+        if self.compression == 'zstd':
+            self.level = int(level) if level else 19
+        else:
+            self.level = int(level) if level else 9
+
+    def path_for(self, digest):
+        """Path of the stored object for a SHA-256 hex digest."""
+        extension = {'gzip': '.html.gz', 'zstd': '.html.zst'}.get(self.compression, '.html')
+        return os.path.join(self.objects_dir, digest[:2], digest[2:4], digest + extension)
+
+    @timed(FILE_IO_LATENCY, operation='write')
+    def put(self, html_content):
+        """
+        Store report HTML, reusing the existing file if the payload was stored before.
+
+        Returns:
+            str: The path of the stored object
+        """
+        data = html_content.encode('utf-8')
+        file_path = self.path_for(hashlib.sha256(data).hexdigest())
+        if os.path.exists(file_path):
+            return file_path
+
+        if self.compression == 'gzip':
+            data = gzip.compress(data, compresslevel=self.level, mtime=0)
+        elif self.compression == 'zstd':
+            data = zstandard.ZstdCompressor(level=self.level).compress(data)
+
+        # Write to a temporary file first so readers never see a partial object
+        directory = os.path.dirname(file_path)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        except FileNotFoundError:
+            # Shard directories are created on first use only; checking every time is costly in bulk
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return file_path
+
+    @staticmethod
+    def encoding_of(file_path):
+        """The Content-Encoding of a stored file, or None if it is plain HTML."""
+        return ENCODINGS.get(os.path.splitext(file_path)[1])
+
+    @staticmethod
+    @timed(FILE_IO_LATENCY, operation='read')
+    def read_bytes(file_path):
+        """Read a stored file without decompressing it."""
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+    def read_text(self, file_path):
+        """Read and decompress a stored file."""
+        data = self.read_bytes(file_path)
+        encoding = self.encoding_of(file_path)
+        if encoding == 'gzip':
+            data = gzip.decompress(data)
+        elif encoding == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd-compressed reports")
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data.decode('utf-8')
+
+    def iter_text(self, file_path, chunk_size=64 * 1024):
+        """Yield the decompressed bytes of a stored file in chunks, without loading it whole."""
+        encoding = self.encoding_of(file_path)
+        if encoding == 'gzip':
+            f = gzip.open(file_path, 'rb')
+        elif encoding == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd-compressed reports")
+            f = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        else:
+            f = open(file_path, 'rb')
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    @staticmethod
+    def etag_of(file_path):
+        """
+        A strong ETag for a stored file.
+
+        Content-addressed files are named after the SHA-256 of their content;
+        older files never change once written, so their size and modification
+        time identify them.
+        """
+        name = os.path.basename(file_path).split('.', 1)[0]
+        if len(name) == 64 and all(c in '0123456789abcdef' for c in name):
+            return name
+        stat = os.stat(file_path)
+        return hashlib.sha256(f"{name}-{stat.st_size}-{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    @timed(FILE_IO_LATENCY, operation='delete')
+    def delete(file_path):
+        """Delete a stored file if it exists."""
+        if os.path.exists(file_path):
+            os.remove(file_path)
@@ -0,0 +1,206 @@
+import re
+import json
+
+# Fields of an analysis result and the JSON schema the model is asked to follow
+RESULT_FIELDS = ('summary', 'misinformation_detected', 'misinformation_score', 'report', 'additional_context',
+                 'sources')
+
+RESULT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'summary': {'type': 'STRING', 'description': 'Brief summary of the content (max 50 words)'},
+        'misinformation_detected': {'type': 'BOOLEAN'},
+        'misinformation_score': {
+            'type': 'NUMBER', 'minimum': 0, 'maximum': 10,
+            'description': '0 means completely accurate and 10 means highly misleading'
+        },
+        'report': {'type': 'STRING', 'description': 'Detailed report comparing this content with other sources'},
+        'additional_context': {'type': 'STRING', 'description': 'Additional context about the topic'},
+        'sources': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+    },
+    'required': ['summary', 'misinformation_detected', 'misinformation_score', 'report', 'sources'],
+    'property_ordering': list(RESULT_FIELDS),
+}
+
+_decoder = json.JSONDecoder()
+
+FENCE = re.compile(r'```(?:json)?\s*', re.IGNORECASE)
+# The start of the JSON object in a fenced code block
+FENCED_OBJECT = re.compile(r'```(?:json)?\s*(\{)', re.IGNORECASE)
+TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+JSON_ESCAPES = set('"\\/bfnrtu')
+ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+# An object key at the end of truncated output, with its colon but no value
+DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+class ResultParseError(ValueError):
+    """Raised when a model answer contains no usable analysis, even after repair."""
+
+
+def parse_analysis(text):
+    """
+    Parse and validate the model's answer.
+
+    The JSON object is looked for in a code fence first, then at the first
+    brace, so prose before the fence may contain braces. A strict single
+    pass handles well-formed answers (schema-constrained output, or JSON in
+    a code fence or surrounded by prose). Anything else goes through the
+    repair parser, which fixes the usual defects of model output: trailing
+    commas, Python literals, unescaped newlines and truncation.
+
+    Returns:
+        tuple: (result, outcome) where outcome is 'direct' or 'repaired'
+
+    Raises:
+        ResultParseError: If no JSON object can be recovered
+    """
+    starts = _object_starts(text)
+    if not starts:
+        raise ResultParseError("No JSON object in the response")
+
+    for start in starts:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return validate_result(value), 'direct'
+        except (ValueError, TypeError):
+            pass
+
+    error = None
+    for start in starts:
+        try:
+            value, _ = _decoder.raw_decode(repair_json(text[start:]))
+            return validate_result(value), 'repaired'
+        except (ValueError, TypeError) as e:
+            error = error or e
+    raise ResultParseError(f"Could not repair the JSON in the response: {str(error)}")
+
+
+def _object_starts(text):
+    """Where the JSON object may start: each fenced block's object, then the first brace."""
+    starts = [match.start(1) for match in FENCED_OBJECT.finditer(text)]
+    first = text.find('{')
+    if first != -1 and first not in starts:
+        starts.append(first)
+    return starts
+
+
+def validate_result(value):
+    """
+    Check and coerce a decoded answer to the result schema.
+
+    Booleans and numbers given as strings are converted, the score is
+    clamped to 0-10 and missing fields are set to None (or [] for sources).
+
+    Raises:
+        TypeError: If the value isn't an object or the score isn't a number
+    """
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    if not isinstance(value, dict):
+        raise TypeError("The response is not a JSON object")
+
+    result = dict(value)
+    score = result.get('misinformation_score')
+    if isinstance(score, str):
+        try:
+            score = float(score.strip().split('/')[0])
+        except ValueError:
+            raise TypeError(f"misinformation_score is not a number: {score!r}")
+    if score is not None:
+        if isinstance(score, bool) or not isinstance(score, (int, float)):
+            raise TypeError(f"misinformation_score is not a number: {score!r}")
+        score = min(max(score, 0), 10)
+        result['misinformation_score'] = int(score) if float(score).is_integer() else score
+
+    detected = result.get('misinformation_detected')
+    if isinstance(detected, str):
+        result['misinformation_detected'] = {'true': True, 'yes': True, 'false': False, 'no': False}.get(
+            detected.strip().lower())
+
+    for field in ('summary', 'report', 'additional_context'):
+        if result.get(field) is not None and not isinstance(result[field], str):
+            result[field] = json.dumps(result[field])
+
+    sources = result.get('sources')
+    if isinstance(sources, str):
+        sources = [sources]
+    result['sources'] = [s if isinstance(s, str) else s.get('url') for s in sources or []
+                         if isinstance(s, str) or (isinstance(s, dict) and s.get('url'))]
+
+    for field in RESULT_FIELDS:
+        result.setdefault(field, None)
+    return result
+
+
+def repair_json(text):
+    """
+    Best-effort repair of a malformed JSON object.
+
+    Walks the text once, tracking strings and open brackets, to drop code
+    fences, escape raw newlines and stray quotes inside strings, turn
+    single-quoted strings and Python literals into JSON, remove trailing
+    commas and close whatever a truncated answer left open.
+    """
+    text = FENCE.sub('', text)
+    out = []
+    stack = []
+    quote = None  # The quote character of the string being read, if any
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == '\\' and i + 1 < len(text):
+                escaped = text[i + 1]
+                if escaped == "'":
+                    out.append("'")
+                elif escaped in JSON_ESCAPES:
+                    out.append(text[i:i + 2])
+                else:
+                    out.append('\\\\' + escaped)
+                i += 2
+                continue
+            if c == quote and _closes_string(text, i + 1):
+                quote = None
+                out.append('"')
+            elif c == '"':
+                out.append('\\"')
+            else:
+                out.append(ESCAPES.get(c, c))
+        elif c in '"\'':
+            quote = c
+            out.append('"')
+        elif c in '{[':
+            stack.append('}' if c == '{' else ']')
+            out.append(c)
+        elif c in '}]':
+            if stack and stack[-1] == c:
+                stack.pop()
+            out.append(c)
+            if not stack:
+                break
+        elif c.isalpha():
+            word = re.match(r'[A-Za-z]+', text[i:]).group(0)
+            out.append(PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    # Close a truncated answer: the open string, then drop a key left without a value, then the brackets
+    if quote:
+        out.append('"')
+    repaired = ''.join(out).rstrip()
+    if stack and stack[-1] == '}':
+        repaired = DANGLING_KEY.sub(r'\1', repaired)
+    repaired = repaired.rstrip().rstrip(',') + ''.join(reversed(stack))
+    return TRAILING_COMMA.sub(r'\1', repaired)
+
+
+def _closes_string(text, i):
+    """Whether a quote followed by text[i:] ends a string, rather than being a stray quote inside it."""
+    rest = text[i:].lstrip()
+    return not rest or rest[0] in ',:}]'
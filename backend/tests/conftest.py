@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# The backend modules are imported by name, as the app does when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time: keep the databases out of the tree and the model offline
+DATA_DIR = tempfile.mkdtemp(prefix='pinocchio-tests-')
+os.environ.update({
+    'DATABASE_PATH': os.path.join(DATA_DIR, 'reports.db'),
+    'REPORTS_DIR': os.path.join(DATA_DIR, 'reports'),
+    'ANALYSIS_CACHE_PATH': os.path.join(DATA_DIR, 'analysis_cache.db'),
+    'ANALYSIS_JOBS_PATH': os.path.join(DATA_DIR, 'analysis_jobs.db'),
+    'NEAR_DUPLICATE_PATH': os.path.join(DATA_DIR, 'near_duplicates.db'),
+    'CASSETTE_PATH': os.path.join(DATA_DIR, 'cassettes.db'),
+    'ANALYSIS_BACKEND': 'stub',
+    'STUB_LATENCY_DIST': 'fixed',
+    'STUB_LATENCY_MS': '0',
+    'STUB_ERROR_RATE': '0',
+    'APP_WARM_UP': 'False',
+})
@@ -0,0 +1,48 @@
+import os
+import threading
+import pytest
+from cache_service import AnalysisCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # No in-process tier, so every lookup reads the SQLite store
+    return AnalysisCache(os.path.join(tmp_path, 'cache.db'), memory_items=0, enabled=True, access_interval=60)
+
+
+def accessed_at(cache, key):
+    return cache.get_connection().execute("SELECT accessed_at FROM analysis_cache WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_within_the_access_interval_do_not_write(cache):
+    cache.set('key', 'https://example.com', {'summary': 'ok'})
+    stored = accessed_at(cache, 'key')
+    assert cache.get('key') == {'summary': 'ok'}
+    assert accessed_at(cache, 'key') == stored
+    assert not cache.get_connection().in_transaction
+
+
+def test_hits_after_the_access_interval_record_the_access(cache):
+    cache.set('key', 'https://example.com', {'summary': 'ok'})
+    conn = cache.get_connection()
+    conn.execute("UPDATE analysis_cache SET accessed_at = accessed_at - 120 WHERE key = ?", ('key',))
+    conn.commit()
+    stale = accessed_at(cache, 'key')
+    assert cache.get('key') == {'summary': 'ok'}
+    assert accessed_at(cache, 'key') > stale + 100
+
+
+def test_concurrent_writes_trim_once_per_hundred(cache, monkeypatch):
+    trims = []
+    monkeypatch.setattr(cache, 'evict', lambda: trims.append(1))
+
+    def write(n):
+        for i in range(50):
+            cache.set(f'{n}:{i}', 'https://example.com', {'n': i})
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(trims) == 4
@@ -0,0 +1,86 @@
+import json
+import asyncio
+from asgi import app, wsgi_environ
+
+# One loop for every request, as under uvicorn: closing a loop shuts down the app's thread pool
+loop = asyncio.new_event_loop()
+
+
+def request(method, path, body=None, query=b''):
+    """Send one HTTP request through the ASGI app and return (status, headers, body chunks)."""
+    data = json.dumps(body).encode() if body is not None else b''
+    messages = [{'type': 'http.request', 'body': data}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]
+    scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'path': path, 'root_path': '',
+             'query_string': query, 'headers': headers,
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+    loop.run_until_complete(app(scope, receive, send))
+    start = sent[0]
+    chunks = [m.get('body', b'') for m in sent[1:]]
+    assert sent[-1]['type'] == 'http.response.body' and not sent[-1].get('more_body')
+    return start['status'], dict(start['headers']), chunks
+
+
+def test_flask_routes_are_served_through_the_bridge():
+    status, _, chunks = request('POST', '/api/reports', {'url': 'https://example.com/a', 'title': 'A', 'score': 3,
+                                                         'html': '<p>Report</p>'})
+    assert status == 200
+    report_id = json.loads(b''.join(chunks))['report_id']
+
+    status, headers, chunks = request('GET', f'/api/reports/{report_id}')
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'application/json')
+    assert json.loads(b''.join(chunks))['id'] == report_id
+
+
+def test_stream_route_is_served_natively(monkeypatch):
+    async def no_bridge(scope, receive, send):
+        raise AssertionError(f"{scope['path']} went through the Flask bridge")
+
+    monkeypatch.setattr(app, 'flask', no_bridge)
+    status, headers, chunks = request('POST', '/api/analyze/stream', {'url': 'https://example.com/s',
+                                                                      'content': 'Some page text. ' * 50})
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/event-stream')
+    events = b''.join(chunks).decode()
+    assert 'event: delta' in events and 'event: result' in events
+    assert len([c for c in chunks if c]) > 1
+
+
+def test_streamed_flask_response_arrives_in_pieces():
+    status, _, chunks = request('POST', '/api/analyze', {'url': 'https://example.com/job', 'content': 'Job text.'},
+                                query=b'async=1')
+    assert status == 202
+    job_id = json.loads(b''.join(chunks))['job_id']
+
+    status, headers, chunks = request('GET', f'/api/jobs/{job_id}/events')
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/event-stream')
+    assert b'event: result' in chunks[-2]
+
+
+def test_wsgi_environ():
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'path': '/api/reports', 'root_path': '/api',
+             'query_string': b'limit=5', 'server': ('testserver', 8080), 'client': ('127.0.0.1', 1234),
+             'headers': [(b'cookie', b'a=1'), (b'cookie', b'b=2'), (b'accept', b'text/html'),
+                         (b'accept', b'application/json'), (b'content-type', b'application/json')]}
+    environ = wsgi_environ(scope, b'{}')
+    assert environ['SCRIPT_NAME'] == '/api' and environ['PATH_INFO'] == '/reports'
+    assert environ['QUERY_STRING'] == 'limit=5' and environ['SERVER_PORT'] == '8080'
+    assert environ['HTTP_COOKIE'] == 'a=1; b=2'
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    assert environ['CONTENT_TYPE'] == 'application/json' and 'CONTENT_LENGTH' not in environ
+    assert environ['wsgi.input'].read() == b'{}'
+
+
+def test_unknown_route_is_a_flask_404():
+    status, _, _ = request('GET', '/api/nope')
+    assert status == 404
@@ -0,0 +1,126 @@
+import io
+import os
+import json
+import pytest
+from backfill_service import Backfill, Checkpoint, read_corpus, render_report_html
+from batch_service import BatchItemError
+from db_service import ReportDatabase
+from quota_scheduler import UpstreamUnavailableError
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def pages(n):
+    return [(str(i), {'url': f'https://example.com/{i}', 'content': f'Page {i} says the sky is blue.', 'title': None})
+            for i in range(n)]
+
+
+def test_read_jsonl_keys_by_line(tmp_path):
+    path = write(os.path.join(tmp_path, 'pages.jsonl'),
+                 '{"url": "https://a", "content": "A"}\n\nnot json\n{"link": "https://b", "text": "B"}\n')
+    corpus = list(read_corpus(path, url_field='link', content_field='text'))
+    assert [key for key, _ in corpus] == ['1', '3', '4']
+    assert corpus[0][1] == {'url': None, 'content': None, 'title': None}
+    assert isinstance(corpus[1][1], BatchItemError)
+    assert corpus[2][1] == {'url': 'https://b', 'content': 'B', 'title': None}
+
+
+def test_read_csv_keys_by_row(tmp_path):
+    path = write(os.path.join(tmp_path, 'pages.csv'), 'url,content,title\nhttps://a,"A, with comma",T\n')
+    assert list(read_corpus(path)) == [('2', {'url': 'https://a', 'content': 'A, with comma', 'title': 'T'})]
+
+
+def test_read_html_directory(tmp_path):
+    root = os.path.join(tmp_path, 'site')
+    write(os.path.join(root, 'b', 'page.html'), '<title>B</title><p>Second</p>')
+    write(os.path.join(root, 'a.htm'), '<title>A</title><p>First</p>')
+    write(os.path.join(root, 'notes.txt'), 'skipped')
+    corpus = list(read_corpus(root, base_url='https://site.example/'))
+    assert [key for key, _ in corpus] == ['a.htm', 'b/page.html']
+    assert corpus[1][1]['url'] == 'https://site.example/b/page.html'
+    assert corpus[1][1]['title'] == 'B' and 'Second' in corpus[1][1]['content']
+
+
+def test_checkpoint_resumes_and_ignores_a_torn_last_line(tmp_path):
+    path = os.path.join(tmp_path, 'pages.checkpoint')
+    checkpoint = Checkpoint(path, 'pages.jsonl')
+    checkpoint.mark('1', 'ok')
+    checkpoint.mark('2', 'error')
+    checkpoint.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"key": "3", "sta')
+
+    checkpoint = Checkpoint(path, 'pages.jsonl')
+    assert checkpoint.done == {'1': 'ok', '2': 'error'}
+    checkpoint.mark('3', 'ok')
+    checkpoint.close()
+    assert Checkpoint(path, 'pages.jsonl', retry_errors=True).done == {'1': 'ok', '3': 'ok'}
+
+    with pytest.raises(ValueError):
+        Checkpoint(path, 'other.jsonl')
+
+
+def test_backfill_writes_outcomes_and_resumes(tmp_path):
+    checkpoint_path = os.path.join(tmp_path, 'pages.checkpoint')
+    db = ReportDatabase(os.path.join(tmp_path, 'reports.db'), os.path.join(tmp_path, 'reports'))
+    corpus = pages(3) + [('3', BatchItemError('Invalid JSON on line 4'))]
+
+    checkpoint, output = Checkpoint(checkpoint_path, 'pages.jsonl'), io.StringIO()
+    backfill = Backfill(checkpoint, output=output, db=db, workers=2, use_cache=False)
+    assert backfill.run(lambda: iter(corpus[:2]))
+    checkpoint.close()
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(r['key'] for r in records) == ['0', '1']
+    assert all(r['status'] == 'ok' and r['report_id'] for r in records)
+    assert db.get_report_html(records[0]['report_id']).startswith('<!DOCTYPE html>')
+
+    checkpoint, output = Checkpoint(checkpoint_path, 'pages.jsonl'), io.StringIO()
+    backfill = Backfill(checkpoint, output=output, db=db, workers=2, use_cache=False)
+    assert backfill.run(lambda: iter(corpus))
+    checkpoint.close()
+    assert sorted(json.loads(line)['key'] for line in output.getvalue().splitlines()) == ['2', '3']
+    assert backfill.counts == {'succeeded': 1, 'failed': 1, 'cached': 0, 'skipped': 2, 'saved': 1}
+
+
+def test_backfill_pauses_while_the_model_is_unavailable(tmp_path):
+    checkpoint = Checkpoint(os.path.join(tmp_path, 'pages.checkpoint'), 'pages.jsonl')
+    backfill = Backfill(checkpoint, workers=1, use_cache=False)
+    analyze = backfill.analyzer.analyze_fn
+    calls = []
+
+    def unavailable_once(url, content, **kwargs):
+        calls.append(url)
+        if len(calls) == 2:
+            raise UpstreamUnavailableError("Analysis quota is saturated", retry_after=0)
+        return analyze(url, content, **kwargs)
+
+    backfill.analyzer.analyze_fn = unavailable_once
+    assert backfill.run(lambda: iter(pages(3)))
+    checkpoint.close()
+    assert set(checkpoint.done) == {'0', '1', '2'}
+    assert backfill.counts['succeeded'] == 3 and backfill._passes == 2
+
+
+def test_backfill_gives_up_after_max_pauses(tmp_path):
+    checkpoint = Checkpoint(os.path.join(tmp_path, 'pages.checkpoint'), 'pages.jsonl')
+    backfill = Backfill(checkpoint, workers=1, use_cache=False, max_pauses=0)
+
+    def unavailable(url, content, **kwargs):
+        raise UpstreamUnavailableError("Circuit open", retry_after=0)
+
+    backfill.analyzer.analyze_fn = unavailable
+    assert not backfill.run(lambda: iter(pages(2)))
+    checkpoint.close()
+    assert checkpoint.done == {}
+
+
+def test_render_report_html_escapes_fields():
+    html = render_report_html('https://a/?q=<x>', '<script>', {'misinformation_score': 9, 'summary': 'a & b',
+                                                               'sources': ['https://s/"']})
+    assert '<script>' not in html and '&lt;script&gt;' in html
+    assert 'a &amp; b' in html and 'Likely Unreliable' in html and 'https://s/&quot;' in html
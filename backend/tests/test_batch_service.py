@@ -0,0 +1,36 @@
+import asyncio
+from batch_service import AsyncBatchAnalyzer, BatchAnalyzer, BatchItemError
+
+
+def items(n):
+    return [{'url': f'https://example.com/{i}', 'content': f'Page {i}'} for i in range(n)]
+
+
+def analyze(url, content, use_cache=True):
+    return {'summary': content, 'misinformation_score': 1}
+
+
+async def aanalyze(url, content, use_cache=True):
+    return analyze(url, content, use_cache)
+
+
+def test_batch_counts_each_outcome():
+    outcomes = list(BatchAnalyzer(analyze, workers=2).run(items(2) + [BatchItemError('Invalid JSON on line 3')]))
+    assert sorted(o['index'] for o in outcomes[:-1]) == [0, 1, 2]
+    assert outcomes[-1] == {'done': True, 'total': 3, 'succeeded': 2, 'failed': 1, 'cached': 0}
+
+
+def test_items_over_the_limit_are_not_counted():
+    outcomes = list(BatchAnalyzer(analyze, workers=2, max_items=2).run(items(5)))
+    errors = [o for o in outcomes[:-1] if o['status'] == 'error']
+    assert errors == [{'index': 2, 'url': None, 'status': 'error', 'error': 'Batch is limited to 2 items'}]
+    assert outcomes[-1] == {'done': True, 'total': 2, 'succeeded': 2, 'failed': 0, 'cached': 0}
+
+
+def test_async_items_over_the_limit_are_not_counted():
+    async def run():
+        return [o async for o in AsyncBatchAnalyzer(aanalyze, workers=2, max_items=2).run(items(5))]
+
+    outcomes = asyncio.run(run())
+    assert [o['error'] for o in outcomes[:-1] if o['status'] == 'error'] == ['Batch is limited to 2 items']
+    assert outcomes[-1] == {'done': True, 'total': 2, 'succeeded': 2, 'failed': 0, 'cached': 0}
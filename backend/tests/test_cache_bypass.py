@@ -0,0 +1,79 @@
+import threading
+import pytest
+import app as app_module
+import gemini_service
+from analysis_backends import StubBackend, get_backend, set_backend
+
+
+@pytest.fixture
+def flask_app():
+    return app_module.create_app()
+
+
+@pytest.mark.parametrize('path,body,headers,expected', [
+    ('/api/analyze', {}, {}, True),
+    ('/api/analyze', {'refresh': True}, {}, False),
+    ('/api/analyze?cache=0', {}, {}, False),
+    ('/api/analyze', {}, {'Cache-Control': 'no-cache'}, False),
+    ('/api/analyze/batch', [{}], {'Cache-Control': 'no-cache'}, False),
+])
+def test_wants_cache(flask_app, path, body, headers, expected):
+    with flask_app.test_request_context(path, method='POST', json=body, headers=headers):
+        assert app_module.wants_cache(body) is expected
+
+
+def test_stream_honors_cache_control(flask_app, monkeypatch):
+    calls = []
+
+    def fake_stream(url, content, use_cache=True):
+        calls.append(use_cache)
+        yield 'result', {}
+
+    monkeypatch.setattr(app_module, 'stream_website_analysis', fake_stream)
+    response = flask_app.test_client().post('/api/analyze/stream', json={'url': 'https://example.com', 'content': 'x'},
+                                            headers={'Cache-Control': 'no-cache'})
+    response.get_data()
+    assert calls == [False]
+
+
+def test_chunked_stream_reduces_content_once(monkeypatch):
+    reduction = {'compression_ratio': 1.0}
+    prepared = []
+
+    def fake_prepare(content):
+        prepared.append(content)
+        return ['first half', 'second half'], reduction
+
+    monkeypatch.setattr(gemini_service, '_prepare_content', fake_prepare)
+    monkeypatch.setattr(gemini_service, '_run_chunked_analysis',
+                        lambda url, chunks, priority: {'summary': ' '.join(chunks), 'misinformation_score': 0})
+    events = dict(gemini_service.stream_website_analysis('https://example.com/long', 'long page', use_cache=False))
+    assert prepared == ['long page']
+    assert events['result']['summary'] == 'first half second half'
+
+
+def test_concurrent_streams_share_one_model_call():
+    backend = StubBackend(latency_dist='fixed', latency_ms=300, error_rate=0)
+    calls = []
+    generate_stream = backend.generate_stream
+    backend.generate_stream = lambda prompt: calls.append(prompt) or generate_stream(prompt)
+    previous = get_backend()
+    set_backend(backend)
+    streams = [[] for _ in range(3)]
+
+    def consume(events):
+        events.extend(gemini_service.stream_website_analysis('https://example.com/shared', 'A shared page.'))
+
+    try:
+        threads = [threading.Thread(target=consume, args=(events,)) for events in streams]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        set_backend(previous)
+
+    assert len(calls) == 1
+    results = [dict(events)['result'] for events in streams]
+    assert results[0] == results[1] == results[2]
+    assert sorted(any(event == 'delta' for event, _ in events) for events in streams) == [False, False, True]
@@ -0,0 +1,53 @@
+import pytest
+from content_chunker import split_content, merge_results, estimate_tokens
+from gemini_service import _merge_chunk_results
+from quota_scheduler import UpstreamUnavailableError
+
+
+def result(report, score=2, detected=False, sources=()):
+    return {'summary': f'Summary of {report}', 'misinformation_detected': detected, 'misinformation_score': score,
+            'report': report, 'additional_context': None, 'sources': list(sources), 'source_objects': []}
+
+
+def test_content_within_budget_is_one_chunk():
+    assert split_content('Short page.', 100, 4) == ['Short page.']
+
+
+def test_chunks_break_on_paragraphs_and_fit_the_budget():
+    paragraphs = [f'Paragraph {n}. ' + 'word ' * 60 for n in range(10)]
+    chunks = split_content('\n\n'.join(paragraphs), 100, 8)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.startswith('Paragraph') for chunk in chunks)
+
+
+def test_content_beyond_max_chunks_is_dropped():
+    chunks = split_content('\n\n'.join('word ' * 70 for _ in range(10)), 100, 3)
+    assert len(chunks) == 3
+
+
+def test_merge_blends_mean_and_max_scores():
+    results = [result('a', 0), result('b', 10, detected=True, sources=['s1']), result('c', 2, sources=['s1'])]
+    merged = merge_results(results, [1, 1, 2])
+    assert merged['misinformation_score'] == pytest.approx((3.5 + 10) / 2, abs=0.05)
+    assert merged['misinformation_detected'] is True
+    assert merged['sources'] == ['s1']
+    assert merged['report'].startswith('Part 1 of 3: a')
+
+
+def test_merge_labels_parts_by_their_position_on_the_page():
+    merged = merge_results([result('first'), result('third')], [1, 1], parts=[1, 3], total=4)
+    assert merged['report'] == 'Part 1 of 4: first\n\nPart 3 of 4: third'
+
+
+def test_failed_chunks_keep_the_labels_of_the_others():
+    chunks = ['one', 'two', 'three', 'four']
+    results = [result('first'), UpstreamUnavailableError('down'), result('third'), result('fourth')]
+    merged = _merge_chunk_results(chunks, results)
+    assert merged['report'].split('\n\n') == ['Part 1 of 4: first', 'Part 3 of 4: third', 'Part 4 of 4: fourth']
+    assert merged['chunks_analyzed'] == 4 and merged['chunks_failed'] == 1
+
+
+def test_page_fails_only_if_every_chunk_is_unavailable():
+    with pytest.raises(UpstreamUnavailableError):
+        _merge_chunk_results(['one', 'two'], [UpstreamUnavailableError('down'), UpstreamUnavailableError('down')])
@@ -0,0 +1,47 @@
+from content_reducer import reduce_content
+
+ARTICLE = """Regulators fined the company after it stored cookies without asking users for consent.
+The ministry claims that 90 percent of sites now ask for consent before setting cookies.
+Critics say the privacy settings offered to users are misleading.
+The paper urged readers to subscribe to its newsletter to follow the investigation.
+Officials said anyone who tried to log in or sign up after March lost their data.
+Read more about the ruling in the court's published decision.
+The company denies that it shared the data with advertisers."""
+
+
+def test_sentences_mentioning_boilerplate_words_are_kept():
+    text, stats = reduce_content(ARTICLE)
+    assert text.split('\n') == ARTICLE.split('\n')
+    assert stats['compression_ratio'] == 1.0
+
+
+def test_page_chrome_is_dropped():
+    page = "Sign in | Subscribe\nAccept all cookies\n" + ARTICLE + "\nShare this article\n© 2025 Example Media. All rights reserved."
+    text, _ = reduce_content(page)
+    assert text.split('\n') == ARTICLE.split('\n')
+
+
+def test_bulleted_claim_list_is_kept():
+    claims = "The post makes five claims:\n\n" + "\n".join([
+        "Vaccines cause autism",
+        "5G spreads viruses",
+        "The moon landing was staged",
+        "Climate change is a hoax",
+        "Fluoride lowers IQ",
+    ])
+    text, _ = reduce_content(claims)
+    assert text == claims
+
+
+def test_claim_repeated_later_on_the_page_is_kept():
+    page = ("The senator said crime fell by half.\n\n"
+            "Police data shows a 3 percent drop.\n\n"
+            "The senator said crime fell by half.")
+    text, _ = reduce_content(page)
+    assert text == page
+
+
+def test_navigation_menu_is_dropped():
+    menu = "\n".join(["Home", "World", "Politics", "Business", "Health & Science", "Sign In"])
+    text, _ = reduce_content(menu + "\n\nThe report was published on Monday.")
+    assert text == "The report was published on Monday."
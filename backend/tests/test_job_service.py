@@ -0,0 +1,62 @@
+import os
+import time
+import threading
+from job_service import JobManager
+
+
+def test_queued_job_times_out_from_creation(tmp_path):
+    analyzed = []
+    jobs = JobManager(lambda url, content: analyzed.append(url), db_path=os.path.join(tmp_path, 'jobs.db'),
+                      timeout=0.2)
+    # The worker that should have run the job died before starting it
+    submitted = []
+    jobs._executor.submit = lambda *args: submitted.append(args)
+    queued = jobs.submit('https://example.com/stuck', '')
+    time.sleep(0.3)
+
+    job = jobs.get(queued)
+    assert job['status'] == 'timeout'
+    assert 'did not start' in job['error']
+
+    # A worker picking the job up after its deadline doesn't run it
+    jobs._run(*submitted[0][1:])
+    assert analyzed == []
+    assert jobs.get(queued)['status'] == 'timeout'
+
+
+def test_job_within_deadline_completes(tmp_path):
+    jobs = JobManager(lambda url, content: {'summary': content}, db_path=os.path.join(tmp_path, 'jobs.db'), timeout=5)
+    job_id = jobs.submit('https://example.com', 'text')
+    jobs._executor.shutdown(wait=True)
+    job = jobs.get(job_id)
+    assert job['status'] == 'completed' and job['result'] == {'summary': 'text'}
+
+
+def test_hung_job_frees_its_worker_and_slot(tmp_path):
+    release = threading.Event()
+    results = []
+
+    def analyze(url, content):
+        if url == 'https://example.com/hung':
+            release.wait(5)
+        results.append(url)
+        return {'summary': url}
+
+    jobs = JobManager(analyze, db_path=os.path.join(tmp_path, 'jobs.db'), workers=1, queue_size=1, timeout=0.2)
+    hung = jobs.submit('https://example.com/hung', '')
+    time.sleep(0.4)
+    assert jobs.get(hung)['status'] == 'timeout'
+
+    # The queue slot and the pool thread are free again while the hung call is still running
+    job_id = jobs.submit('https://example.com/next', '')
+    deadline = time.time() + 2
+    while jobs.get(job_id)['status'] != 'completed' and time.time() < deadline:
+        time.sleep(0.02)
+    assert jobs.get(job_id)['status'] == 'completed'
+
+    release.set()
+    deadline = time.time() + 2
+    while len(results) < 2 and time.time() < deadline:
+        time.sleep(0.02)
+    job = jobs.get(hung)
+    assert job['status'] == 'timeout' and 'result' not in job
@@ -0,0 +1,45 @@
+import io
+import os
+import json
+import argparse
+import pytest
+from db_service import ReportDatabase
+from manage import read_reports, ingest
+
+
+def test_read_reports_skips_blank_lines():
+    assert list(read_reports(io.StringIO(''))) == []
+    assert list(read_reports(io.StringIO('\n\n'))) == []
+    assert list(read_reports(io.StringIO('{"url": "a"}\n\n{"url": "b"}\n\n'))) == [{'url': 'a'}, {'url': 'b'}]
+
+
+def test_read_reports_records_malformed_lines():
+    malformed = []
+    f = io.StringIO('\n{"url": "a"}\n{"url": \n{"url": "b"}\n')
+    assert list(read_reports(f, malformed)) == [{'url': 'a'}, {'url': 'b'}]
+    assert [line for line, _ in malformed] == [3]
+
+
+def test_read_reports_raises_on_malformed_lines_by_default():
+    with pytest.raises(json.JSONDecodeError):
+        list(read_reports(io.StringIO('{"url": "a"}\nnot json\n')))
+
+
+def test_read_reports_reads_json_array():
+    assert list(read_reports(io.StringIO(' [{"url": "a"}]'))) == [{'url': 'a'}]
+
+
+def test_ingest_fails_the_run_on_malformed_lines(tmp_path, capsys):
+    report = {'url': 'https://example.com/a', 'title': 'A', 'score': 2, 'html': '<p>A</p>'}
+    path = os.path.join(tmp_path, 'reports.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report) + '\n{"url": \n' + json.dumps(dict(report, url='https://example.com/b')) + '\n')
+    db = ReportDatabase(os.path.join(tmp_path, 'reports.db'), os.path.join(tmp_path, 'reports'))
+    args = argparse.Namespace(file=path, ids_output=None, batch_size=None, workers=None)
+
+    with pytest.raises(SystemExit) as exit_info:
+        ingest(db, args)
+    assert exit_info.value.code != 0
+    output = capsys.readouterr()
+    assert 'Ingested 2 reports' in output.out
+    assert 'Line 2 is not valid JSON' in output.err
@@ -0,0 +1,61 @@
+import os
+import random
+import pytest
+from near_duplicate_index import (NearDuplicateIndex, signature, band_keys, EMPTY, EMPTY_BAND_KEYS, BANDS, ROWS,
+                                  MIN_WORDS)
+
+VOCABULARY = [f'word{n}' for n in range(5000)]
+
+
+def page(seed, words=400):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(os.path.join(tmp_path, 'near_duplicates.db'), threshold=0.8, enabled=True)
+
+
+def test_short_pages_have_no_signature():
+    assert signature(page(1, MIN_WORDS - 1)) is None
+
+
+def test_empty_bands_have_no_key():
+    sig = (EMPTY,) * ROWS + (1,) * (ROWS * (BANDS - 1))
+    keys = band_keys(sig)
+    assert len(keys) == BANDS - 1
+    assert not set(keys) & set(EMPTY_BAND_KEYS)
+
+
+def test_finds_a_lightly_edited_copy(index):
+    text = page(1)
+    index.add(signature(text), 'original', 'https://example.com/original')
+    copy = text.replace(text.split()[10], 'edited', 1)
+    matches = index.find(signature(copy))
+    assert [m['cache_key'] for m in matches] == ['original']
+    assert index.find(signature(page(2))) == []
+
+
+def test_short_pages_do_not_share_an_empty_band_bucket(index):
+    # 100-word pages leave some signature slots empty; find pages where a whole band is empty
+    short = [sig for sig in (signature(page(seed, MIN_WORDS)) for seed in range(300))
+             if any(all(v == EMPTY for v in sig[b * ROWS:(b + 1) * ROWS]) for b in range(BANDS))]
+    assert len(short) >= 2
+    for n, sig in enumerate(short):
+        index.add(sig, f'page{n}', f'https://example.com/{n}')
+    placeholders = ', '.join('?' * len(EMPTY_BAND_KEYS))
+    rows = index.get_connection().execute(
+        f'SELECT COUNT(*) FROM near_duplicate_bands WHERE band_key IN ({placeholders})', EMPTY_BAND_KEYS
+    ).fetchone()[0]
+    assert rows == 0
+
+
+def test_init_removes_empty_band_rows_of_earlier_versions(tmp_path):
+    path = os.path.join(tmp_path, 'near_duplicates.db')
+    index = NearDuplicateIndex(path, enabled=True)
+    conn = index.get_connection()
+    conn.execute('INSERT INTO near_duplicate_bands (band_key, entry_id) VALUES (?, 1)', (EMPTY_BAND_KEYS[0],))
+    conn.commit()
+    index = NearDuplicateIndex(path, enabled=True)
+    assert index.get_connection().execute('SELECT COUNT(*) FROM near_duplicate_bands').fetchone()[0] == 0
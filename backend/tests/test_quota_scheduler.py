@@ -0,0 +1,174 @@
+import time
+import asyncio
+import threading
+import pytest
+from quota_scheduler import (CircuitBreaker, CircuitOpenError, QuotaScheduler, TokenBucket,
+                             UpstreamUnavailableError, is_retryable)
+
+
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def flaky(failures, code=503, result='ok'):
+    """A call that fails `failures` times with `code`, then returns `result`."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise UpstreamError(code)
+        return result
+    return fn, calls
+
+
+def scheduler(**kwargs):
+    kwargs = {'rpm': 0, 'tpm': 0, 'backoff_base': 0, 'breaker': CircuitBreaker(100, 30), **kwargs}
+    return QuotaScheduler(**kwargs)
+
+
+def test_is_retryable():
+    assert is_retryable(UpstreamError(429)) and is_retryable(UpstreamError(503))
+    assert not is_retryable(UpstreamError(400))
+    assert is_retryable(TimeoutError()) and is_retryable(ConnectionResetError())
+    assert not is_retryable(ValueError())
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(600, burst_seconds=1)
+    assert bucket.capacity == 10
+    now = bucket.updated
+    bucket.take(10, now)
+    assert bucket.delay(1, now) == pytest.approx(0.1)
+    assert bucket.delay(50, now) == pytest.approx(1)  # Costs above capacity wait for a full bucket
+    assert bucket.delay(5, now + 5) == 0
+    assert bucket.tokens == 10
+    assert TokenBucket(0).delay(10 ** 9, now) == 0
+
+
+def test_run_retries_transient_errors():
+    fn, calls = flaky(2)
+    assert scheduler(max_retries=3).run(fn, tokens=1) == 'ok'
+    assert len(calls) == 3
+
+
+def test_run_raises_bad_requests_without_retrying():
+    fn, calls = flaky(1, code=400)
+    with pytest.raises(UpstreamError):
+        scheduler(max_retries=3).run(fn, tokens=1)
+    assert len(calls) == 1
+
+
+def test_run_gives_up_after_max_retries():
+    fn, calls = flaky(10)
+    with pytest.raises(UpstreamUnavailableError):
+        scheduler(max_retries=2).run(fn, tokens=1)
+    assert len(calls) == 3
+
+
+def test_interactive_calls_overtake_queued_batch_calls():
+    quota = scheduler(rpm=600, burst_seconds=0.1)
+    quota.requests.drain(time.monotonic())
+    admitted = []
+
+    def call(priority):
+        quota.run(lambda: admitted.append(priority), tokens=0, priority=priority)
+
+    batch = threading.Thread(target=call, args=('batch',))
+    batch.start()
+    while not quota._waiting:
+        time.sleep(0.001)
+    interactive = threading.Thread(target=call, args=('interactive',))
+    interactive.start()
+    batch.join()
+    interactive.join()
+    assert admitted == ['interactive', 'batch']
+
+
+def test_saturated_quota_rejects_after_the_queue_timeout():
+    quota = scheduler(rpm=1, burst_seconds=1)
+    quota.queue_timeouts['interactive'] = 0.05
+    quota.run(lambda: None, tokens=0)
+    with pytest.raises(UpstreamUnavailableError) as e:
+        quota.run(lambda: None, tokens=0)
+    assert e.value.retry_after >= 1
+    assert not quota._waiting
+
+
+def test_rate_limit_drains_the_buckets():
+    quota = scheduler(rpm=6000, tpm=6000)
+    fn, _ = flaky(1, code=429)
+    quota.run(fn, tokens=1)
+    assert quota.requests.tokens < 1 and quota.tokens.tokens < 1
+
+
+def test_circuit_breaker_opens_and_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    quota = scheduler(max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError):
+            quota.run(flaky(1)[0], tokens=1)
+    assert breaker.state == 'open'
+
+    fn, calls = flaky(0)
+    with pytest.raises(CircuitOpenError):
+        quota.run(fn, tokens=1)
+    assert calls == []
+
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert quota.run(fn, tokens=1) == 'ok' and breaker.state == 'closed'
+
+
+def test_stream_retries_only_before_the_first_item():
+    attempts = []
+
+    def make_stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise UpstreamError(503)
+        yield 'a'
+        raise UpstreamError(503)
+
+    items = []
+    with pytest.raises(UpstreamUnavailableError):
+        for item in scheduler(max_retries=3).stream(make_stream, tokens=1):
+            items.append(item)
+    assert items == ['a'] and len(attempts) == 2
+
+
+def test_astream_retries_and_yields_every_item():
+    attempts = []
+
+    async def make_stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise UpstreamError(429)
+        for item in ('a', 'b'):
+            yield item
+
+    async def consume():
+        return [item async for item in scheduler(rpm=6000, max_retries=3).astream(make_stream, tokens=1)]
+
+    assert asyncio.run(consume()) == ['a', 'b']
+    assert len(attempts) == 2
+
+
+def test_arun_shares_the_queue_with_threads():
+    quota = scheduler(rpm=600, burst_seconds=0.1)
+    quota.requests.drain(time.monotonic())
+
+    async def call():
+        return await quota.arun(lambda: asyncio.sleep(0, 'ok'), tokens=0)
+
+    blocked = threading.Thread(target=quota.run, args=(lambda: None, 0))
+    blocked.start()
+    started = time.monotonic()
+    assert asyncio.run(call()) == 'ok'
+    blocked.join()
+    assert time.monotonic() - started >= 0.1
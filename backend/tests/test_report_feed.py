@@ -0,0 +1,102 @@
+import os
+import pytest
+import app as app_module
+from db_service import ReportDatabase
+from report_changes import decode_since, encode_change_cursor
+
+
+@pytest.fixture
+def db(tmp_path):
+    return ReportDatabase(os.path.join(tmp_path, 'reports.db'), os.path.join(tmp_path, 'reports'))
+
+
+def save(db, n):
+    return db.save_report(f'https://example.com/{n}', f'Report {n}', n, f'<p>{n}</p>')['report_id']
+
+
+def test_decode_since():
+    assert decode_since(encode_change_cursor(42)) == ('seq', 42)
+    assert decode_since('2024-03-05T10:00:00') == ('timestamp', '2024-03-05T10:00:00')
+    for since in ('yesterday', encode_change_cursor(-1), encode_change_cursor(True)):
+        with pytest.raises(ValueError):
+            decode_since(since)
+
+
+def test_snapshot_then_delta(db):
+    first, second = save(db, 1), save(db, 2)
+    snapshot = db.get_report_feed()
+    assert snapshot['reset'] and not snapshot['has_more']
+    assert [r['id'] for r in snapshot['reports']] == [second, first]
+    assert set(snapshot['reports'][0]) == {'id', 'timestamp', 'title', 'domain', 'score'}
+
+    third = save(db, 3)
+    db.delete_report(first)
+    delta = db.get_report_feed(snapshot['cursor'])
+    assert not delta['reset']
+    assert [r['id'] for r in delta['reports']] == [third]
+    assert delta['deleted'] == [first]
+
+    unchanged = db.get_report_feed(delta['cursor'])
+    assert (unchanged['reports'], unchanged['deleted'], unchanged['cursor']) == ([], [], delta['cursor'])
+
+
+def test_report_saved_and_deleted_since_is_only_a_tombstone(db):
+    cursor = db.get_report_feed()['cursor']
+    report_id = save(db, 1)
+    db.delete_report(report_id)
+    delta = db.get_report_feed(cursor)
+    assert delta['reports'] == [] and delta['deleted'] == [report_id]
+
+
+def test_delta_pages_with_has_more(db):
+    cursor = db.get_report_feed()['cursor']
+    saved = [save(db, n) for n in range(5)]
+    seen = []
+    while True:
+        delta = db.get_report_feed(cursor, limit=2, fields=['url'])
+        seen.extend(r['id'] for r in delta['reports'])
+        assert all(set(r) == {'id', 'url'} for r in delta['reports'])
+        cursor = delta['cursor']
+        if not delta['has_more']:
+            break
+    assert seen == saved
+
+
+def test_pruned_cursor_gets_a_snapshot(db):
+    cursor = db.get_report_feed()['cursor']
+    save(db, 1)
+    save(db, 2)
+    with db.get_connection() as conn:
+        db.changes.prune(conn, retention_days=0)
+    feed = db.get_report_feed(cursor)
+    assert feed['reset'] and len(feed['reports']) == 2
+    assert not db.get_report_feed(feed['cursor'])['reset']
+
+
+def test_since_timestamp(db):
+    save(db, 1)
+    assert db.get_report_feed('2000-01-01')['reset']
+    assert db.get_report_feed('2999-01-01')['reports'] == []
+
+
+def test_invalid_fields(db):
+    with pytest.raises(ValueError):
+        db.get_report_feed(fields=['html'])
+
+
+def test_summary_endpoint_etag(tmp_path):
+    flask_app = app_module.create_app({'DATABASE_PATH': os.path.join(tmp_path, 'reports.db'),
+                                       'REPORTS_DIR': os.path.join(tmp_path, 'reports')})
+    client = flask_app.test_client()
+    save(flask_app.extensions['pinocchio'].db, 1)
+
+    response = client.get('/api/reports/summary')
+    assert response.status_code == 200 and len(response.get_json()['reports']) == 1
+    etag = response.headers['ETag']
+    assert client.get('/api/reports/summary', headers={'If-None-Match': etag}).status_code == 304
+
+    save(flask_app.extensions['pinocchio'].db, 2)
+    response = client.get('/api/reports/summary', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and len(response.get_json()['reports']) == 2
+    assert client.get('/api/reports/summary?since=yesterday').status_code == 400
+    assert client.get('/api/reports/summary?fields=html').status_code == 400
@@ -0,0 +1,39 @@
+import os
+import datetime
+import pytest
+from db_service import ReportDatabase, normalize_timestamp
+
+
+@pytest.fixture
+def db(tmp_path):
+    return ReportDatabase(os.path.join(tmp_path, 'reports.db'), os.path.join(tmp_path, 'reports'))
+
+
+def report(n, timestamp):
+    return {'url': f'https://example.com/{n}', 'title': str(n), 'score': 1, 'html': f'<p>{n}</p>',
+            'timestamp': timestamp}
+
+
+def test_normalize_timestamp():
+    assert normalize_timestamp('2024-03-05') == '2024-03-05T00:00:00.000000'
+    assert normalize_timestamp('2024-03-05 10:30:00') == '2024-03-05T10:30:00.000000'
+    assert normalize_timestamp('2024-03-05T10:30:00.25') == '2024-03-05T10:30:00.250000'
+    local = datetime.datetime(2024, 3, 5, 10, 30, tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None)
+    assert normalize_timestamp('2024-03-05T10:30:00+00:00') == local.isoformat(timespec='microseconds')
+    with pytest.raises(ValueError):
+        normalize_timestamp('yesterday')
+    with pytest.raises(ValueError):
+        normalize_timestamp(1709634600)
+
+
+def test_ingested_timestamps_sort_as_text(db):
+    timestamps = ['2024-03-05 09:00:00', '2024-03-05T08:00:00.5', '2024-03-04', '2024-03-05T10:00:00']
+    list(db.ingest_reports(report(n, t) for n, t in enumerate(timestamps)))
+    stored = [row[0] for row in db.get_connection().execute("SELECT timestamp FROM reports ORDER BY timestamp")]
+    assert stored == ['2024-03-04T00:00:00.000000', '2024-03-05T08:00:00.500000', '2024-03-05T09:00:00.000000',
+                      '2024-03-05T10:00:00.000000']
+
+
+def test_ingest_rejects_invalid_timestamps(db):
+    with pytest.raises(ValueError, match='Report 0 has an invalid timestamp'):
+        list(db.ingest_reports([report(0, 'not a date')]))
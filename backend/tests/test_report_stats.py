@@ -0,0 +1,99 @@
+import os
+import pytest
+import app as app_module
+from db_service import ReportDatabase
+from report_stats import bucket_of, score_bin
+
+
+@pytest.fixture
+def db(tmp_path):
+    return ReportDatabase(os.path.join(tmp_path, 'reports.db'), os.path.join(tmp_path, 'reports'))
+
+
+def report(url, score, timestamp):
+    return {'url': url, 'title': url, 'score': score, 'html': f'<p>{url} {score}</p>', 'timestamp': timestamp}
+
+
+@pytest.mark.parametrize('timestamp,interval,expected', [
+    ('2024-03-06T10:30:00.000000', 'day', '2024-03-06'),
+    ('2024-03-06T10:30:00.000000', 'week', '2024-03-04'),
+    ('2024-03-04T00:00:00.000000', 'week', '2024-03-04'),
+    ('2024-03-10T23:59:59.999999', 'week', '2024-03-04'),
+    ('2024-03-06T10:30:00.000000', 'month', '2024-03'),
+])
+def test_bucket_of(timestamp, interval, expected):
+    assert bucket_of(timestamp, interval) == expected
+
+
+def test_score_bin_is_clamped():
+    assert [score_bin(s) for s in (-1, 0, 4.4, 4.6, 10, 12)] == [0, 0, 4, 5, 10, 10]
+
+
+def test_stats_per_domain_and_day(db):
+    db.save_reports([
+        report('https://www.example.com/a', 2, '2024-03-04T09:00:00'),
+        report('https://example.com/b', 8, '2024-03-04T18:00:00'),
+        report('https://example.com/c', 5, '2024-03-05T09:00:00'),
+        report('https://other.org/', 'n/a', '2024-03-05T09:00:00'),
+    ])
+    stats = db.get_stats()
+    assert [(s['domain'], s['bucket'], s['count']) for s in stats] == [
+        ('example.com', '2024-03-04', 2), ('example.com', '2024-03-05', 1)
+    ]
+    assert stats[0]['mean'] == 5.0 and (stats[0]['min'], stats[0]['max']) == (2, 8)
+    assert stats[0]['histogram'][2] == stats[0]['histogram'][8] == 1
+
+    [week] = db.get_stats(group_by='bucket', interval='week')
+    assert (week['bucket'], week['count'], week['mean']) == ('2024-03-04', 3, 5.0)
+
+
+def test_delete_recomputes_min_and_max(db):
+    saved = db.save_reports([
+        report('https://example.com/a', 2, '2024-03-04T09:00:00'),
+        report('https://example.com/b', 8, '2024-03-04T10:00:00'),
+        report('https://example.com/c', 5, '2024-03-04T11:00:00'),
+    ])
+    db.delete_report(saved[1]['report_id'])
+    [day] = db.get_stats()
+    assert (day['count'], day['min'], day['max'], day['mean']) == (2, 2, 5, 3.5)
+    assert day['histogram'][8] == 0
+
+    for saved_report in (saved[0], saved[2]):
+        db.delete_report(saved_report['report_id'])
+    assert db.get_stats() == []
+
+
+def test_rebuild_matches_incremental_stats(db):
+    db.save_reports([report(f'https://site{n % 3}.com/{n}', n % 11, f'2024-03-{1 + n % 5:02d}T12:00:00')
+                     for n in range(40)])
+    incremental = db.get_stats()
+    db.rebuild_stats()
+    assert db.get_stats() == incremental
+
+
+def test_stats_filters(db):
+    db.save_reports([
+        report('https://example.com/a', 9, '2024-03-04T09:00:00'),
+        report('https://example.com/b', 1, '2024-03-08T09:00:00'),
+        report('https://other.org/a', 3, '2024-03-08T09:00:00'),
+        report('https://other.org/b', 5, '2024-03-09T09:00:00'),
+    ])
+    assert [s['domain'] for s in db.get_stats(group_by='domain', order_by='mean')] == ['example.com', 'other.org']
+    assert [s['domain'] for s in db.get_stats(group_by='domain', order_by='count', limit=1)] == ['example.com']
+    assert [s['bucket'] for s in db.get_stats(domain='other.org', since='2024-03-09')] == ['2024-03-09']
+    assert [s['count'] for s in db.get_stats(group_by='total', until='2024-03-08')] == [3]
+    assert db.get_stats(group_by='domain', min_count=3) == []
+
+
+def test_stats_endpoint(tmp_path):
+    flask_app = app_module.create_app({'DATABASE_PATH': os.path.join(tmp_path, 'reports.db'),
+                                       'REPORTS_DIR': os.path.join(tmp_path, 'reports')})
+    flask_app.extensions['pinocchio'].db.save_reports([report('https://example.com/a', 4, '2024-03-04T09:00:00')])
+    client = flask_app.test_client()
+
+    response = client.get('/api/stats?group_by=domain')
+    assert response.status_code == 200
+    assert response.get_json()['stats'][0] == {'domain': 'example.com', 'count': 1, 'mean': 4.0, 'min': 4, 'max': 4,
+                                               'histogram': [0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0]}
+    for query in ('group_by=url', 'interval=year', 'order_by=domain', 'since=March'):
+        assert client.get(f'/api/stats?{query}').status_code == 400
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import pytest
+from db_service import ReportDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    return ReportDatabase(os.path.join(tmp_path, 'reports.db'), os.path.join(tmp_path, 'reports'))
+
+
+def test_identical_reports_share_one_file(db):
+    first = db.save_report('https://example.com/a', 'A', 1, '<p>same</p>')
+    second = db.save_report('https://example.com/b', 'B', 2, '<p>same</p>')
+    other = db.save_report('https://example.com/c', 'C', 3, '<p>other</p>')
+    assert first['file_path'] == second['file_path'] != other['file_path']
+    assert db.get_report_html(second['report_id']) == '<p>same</p>'
+
+
+def test_shared_file_is_deleted_with_its_last_report(db):
+    first = db.save_report('https://example.com/a', 'A', 1, '<p>same</p>')
+    second = db.save_report('https://example.com/b', 'B', 2, '<p>same</p>')
+
+    assert db.delete_report(first['report_id'])
+    assert os.path.exists(first['file_path'])
+    assert db.get_report_html(second['report_id']) == '<p>same</p>'
+
+    assert db.delete_report(second['report_id'])
+    assert not os.path.exists(first['file_path'])
+    assert not db.delete_report(second['report_id'])
+
+
+def test_failed_delete_keeps_the_report_file(db, monkeypatch):
+    saved = db.save_report('https://example.com/a', 'A', 1, '<p>kept</p>')
+
+    def fail(conn, report_ids, deleted=False):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(db.changes, 'record', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        db.delete_report(saved['report_id'])
+
+    assert db.get_report(saved['report_id']) is not None
+    assert db.get_report_html(saved['report_id']) == '<p>kept</p>'
+
+
+def test_migrate_report_files_with_wildcards_in_path(tmp_path):
+    # `%` and `_` in the reports directory must not make legacy files look migrated
+    reports_dir = os.path.join(tmp_path, 'reports_%')
+    db = ReportDatabase(os.path.join(tmp_path, 'reports.db'), reports_dir)
+    legacy_dir = os.path.join(reports_dir, 'old', 'objects')
+    os.makedirs(legacy_dir)
+    legacy_path = os.path.join(legacy_dir, 'report_1.html')
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        f.write('<p>legacy</p>')
+    saved = db.save_report('https://example.com/a', 'A', 1, '<p>new</p>')
+    with db.get_connection() as conn:
+        conn.execute("UPDATE reports SET file_path = ? WHERE id = ?", (legacy_path, saved['report_id']))
+
+    assert db.migrate_report_files() == 1
+    file_path = db.get_report(saved['report_id'])['file_path']
+    assert file_path.startswith(db.store.objects_dir + os.sep)
+    assert not os.path.exists(legacy_path)
+    assert db.get_report_html(saved['report_id']) == '<p>legacy</p>'
+    assert db.migrate_report_files() == 0
@@ -0,0 +1,25 @@
+from result_parser import parse_analysis
+
+ANSWER = ('{"summary": "A claim about rates", "misinformation_detected": true, "misinformation_score": 7, '
+          '"report": "Rates did not change.", "additional_context": "", "sources": ["https://example.org"]}')
+
+
+def test_fenced_block_after_prose_with_braces():
+    text = f"Here is the analysis. The page uses {{placeholders}} in its template.\n```json\n{ANSWER}\n```"
+    result, outcome = parse_analysis(text)
+    assert outcome == 'direct'
+    assert result['misinformation_score'] == 7
+    assert result['sources'] == ['https://example.org']
+
+
+def test_truncated_fenced_block_after_prose_with_braces_is_repaired():
+    text = f"Note: {{x}} is not JSON.\n```json\n{ANSWER[:-40]}"
+    result, outcome = parse_analysis(text)
+    assert outcome == 'repaired'
+    assert result['misinformation_score'] == 7
+
+
+def test_unfenced_object():
+    result, outcome = parse_analysis(f"Result: {ANSWER} Done.")
+    assert outcome == 'direct'
+    assert result['summary'] == 'A claim about rates'
@@ -0,0 +1,49 @@
+import os
+import time
+import threading
+from cache_service import AnalysisCache, SingleFlight
+
+
+def worker_flights(tmp_path):
+    """SingleFlights of two workers sharing one cache database."""
+    path = os.path.join(tmp_path, 'cache.db')
+    return [SingleFlight(AnalysisCache(path), wait_timeout=30) for _ in range(2)]
+
+
+def test_followers_share_a_failed_result(tmp_path):
+    leader, follower = worker_flights(tmp_path)
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.2)
+        return {'error': 'Analysis failed'}
+
+    thread = threading.Thread(target=leader.run, args=('key', fail, lambda: leader.cache.get('key')))
+    thread.start()
+    started.wait()
+
+    start = time.time()
+    result = follower.run('key', lambda: {'error': 'computed twice'}, lambda: follower.cache.get('key'))
+    thread.join()
+    assert result == {'error': 'Analysis failed'}
+    assert time.time() - start < 5
+
+
+def test_failed_result_expires(tmp_path):
+    leader, follower = worker_flights(tmp_path)
+    leader.failure_ttl = 0
+    leader.run('key', lambda: {'error': 'Analysis failed'}, lambda: leader.cache.get('key'))
+    time.sleep(0.01)
+    assert follower.run('key', lambda: {'summary': 'ok'}, lambda: follower.cache.get('key')) == {'summary': 'ok'}
+
+
+def test_cached_result_is_not_shared_as_failure(tmp_path):
+    leader, follower = worker_flights(tmp_path)
+
+    def analyze():
+        leader.cache.set('key', 'https://example.com', {'summary': 'ok'})
+        return {'summary': 'ok'}
+
+    leader.run('key', analyze, lambda: leader.cache.get('key'))
+    assert follower._failed_result('key') is None
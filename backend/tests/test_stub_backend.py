@@ -0,0 +1,11 @@
+import json
+from analysis_backends import StubBackend
+from gemini_service import _build_prompt
+
+
+def test_stub_summary_is_page_text():
+    prompt = _build_prompt('https://example.com', 'Officials confirmed the bridge reopened on Monday.')
+    text, _ = StubBackend(latency_dist='fixed', latency_ms=0, error_rate=0).answer(prompt)
+    result = json.loads(text.strip('`').removeprefix('json'))
+    assert result['summary'] == 'Officials confirmed the bridge reopened on Monday.'
+    assert 'Please analyze' not in result['report']
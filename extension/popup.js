@@ -42,6 +42,7 @@ document.addEventListener('DOMContentLoaded', function() {
       resultsDiv.style.display = 'none';
       errorDiv.style.display = 'none';
       loadingDiv.style.display = 'flex';
+      document.getElementById('loading-message').textContent = 'Carving out the truth...';
       websiteTitleElement.textContent = 'Analyzing page...';
       
       // Force a new analysis
@@ -177,8 +178,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Store the source text - EXPLICITLY SET SOURCE
         storeSourceText(content, "page content");
         
-        // Send the content to our backend server - UPDATED SERVER ADDRESS
-        fetch('http://172.105.18.148:8080/api/analyze', {
+        // Send the content to our backend server and stream progress as it arrives
+        fetch('http://172.105.18.148:8080/api/analyze/stream', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json'
@@ -186,14 +187,15 @@ document.addEventListener('DOMContentLoaded', function() {
           body: JSON.stringify({
             url: tab.url,
             title: tab.title,
-            content: content
+            content: content,
+            refresh: !!forceRefresh
           })
         })
         .then(response => {
           if (!response.ok) {
             throw new Error(`Server responded with status: ${response.status}`);
           }
-          return response.json();
+          return readAnalysisStream(response);
         })
         .then(data => {
           console.log("Analysis complete, results:", data);
@@ -227,6 +229,62 @@ document.addEventListener('DOMContentLoaded', function() {
       });
     }
     
+    // Read Server-Sent Events from the streaming endpoint, showing partial results
+    // while the analysis is generated. Resolves with the final result.
+    function readAnalysisStream(response) {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const loadingMessage = document.getElementById('loading-message');
+      let buffer = '';
+      let result = null;
+      
+      function handleEvent(rawEvent) {
+        let eventName = 'message';
+        let eventData = '';
+        rawEvent.split('\n').forEach(line => {
+          if (line.startsWith('event:')) {
+            eventName = line.slice(6).trim();
+          } else if (line.startsWith('data:')) {
+            eventData += line.slice(5).trim();
+          }
+        });
+        if (!eventData) {
+          return;
+        }
+        
+        const payload = JSON.parse(eventData);
+        if (eventName === 'summary' && loadingMessage) {
+          loadingMessage.textContent = payload.summary;
+        } else if (eventName === 'score' && loadingMessage) {
+          loadingMessage.textContent += ` (score: ${payload.misinformation_score}/10)`;
+        } else if (eventName === 'result' || eventName === 'error') {
+          result = payload;
+        }
+      }
+      
+      function pump() {
+        return reader.read().then(({done, value}) => {
+          if (value) {
+            buffer += decoder.decode(value, {stream: true});
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+              handleEvent(buffer.slice(0, boundary));
+              buffer = buffer.slice(boundary + 2);
+            }
+          }
+          if (done) {
+            if (!result) {
+              throw new Error('Analysis stream ended without a result');
+            }
+            return result;
+          }
+          return pump();
+        });
+      }
+      
+      return pump();
+    }
+    
     function displayResults(data) {
       console.log("Displaying results:", data);
       